@@ -0,0 +1,125 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m app.cli rebuild-analytics [--bot-id ID]
+    python -m app.cli reindex-knowledge [--bot-id ID]
+    python -m app.cli archive-messages [--bot-id ID]
+    python -m app.cli vacuum
+    python -m app.cli reconcile-webhooks [--bot-id ID] [--dry-run]
+"""
+import argparse
+import asyncio
+
+from app.database import init_db
+
+
+async def _rebuild_analytics(args: argparse.Namespace) -> None:
+    from app.services.analytics import analytics_service
+    
+    await init_db()
+    buckets = await analytics_service.rebuild(bot_id=args.bot_id)
+    print(f"Rebuilt {buckets} hourly buckets")
+
+
+async def _reindex_knowledge(args: argparse.Namespace) -> None:
+    from sqlalchemy import select
+    from app.database import async_session_maker
+    from app.models.bot import TelegramBot
+    from app.models.knowledge import KnowledgeDocument
+    from app.services.knowledge import knowledge_service
+    
+    await init_db()
+    await knowledge_service.ensure_index()
+    
+    async with async_session_maker() as db:
+        query = select(TelegramBot)
+        if args.bot_id is not None:
+            query = query.where(TelegramBot.id == args.bot_id)
+        bots = (await db.execute(query)).scalars().all()
+        
+        documents = 0
+        for bot in bots:
+            # Index long descriptions of bots created before the knowledge base existed
+            await knowledge_service.sync_description(db, bot)
+            result = await db.execute(select(KnowledgeDocument).where(KnowledgeDocument.bot_id == bot.id))
+            for document in result.scalars().all():
+                await knowledge_service.save_document(
+                    db, bot.id, document.title, document.content,
+                    document=document, source=document.source, force=True
+                )
+                documents += 1
+            await db.commit()
+    
+    print(f"Reindexed {documents} documents of {len(bots)} bots")
+
+
+async def _archive_messages(args: argparse.Namespace) -> None:
+    from app.services.retention import retention_service
+    
+    await init_db()
+    archived = await retention_service.run_all(bot_id=args.bot_id, force=True)
+    print(f"Archived {archived} messages, vacuumed {retention_service.vacuumed_pages} pages")
+
+
+async def _vacuum(args: argparse.Namespace) -> None:
+    from app.services.retention import retention_service
+    
+    await init_db()
+    await retention_service.enable_incremental_vacuum()
+    print("Database rebuilt with auto_vacuum=INCREMENTAL")
+
+
+async def _reconcile_webhooks(args: argparse.Namespace) -> None:
+    from app.services.telegram import telegram_service
+    from app.services.webhooks import webhook_reconciler
+    
+    await init_db()
+    results = await webhook_reconciler.reconcile(
+        bot_ids=[args.bot_id] if args.bot_id is not None else None,
+        repair=not args.dry_run
+    )
+    await telegram_service.close()
+    for result in results:
+        if result["state"] != "ok":
+            print(
+                f"Bot {result['bot_id']} ({result['name']}): {result['state']} "
+                f"{result['drift'] or ''} {result['error'] or ''}".rstrip()
+            )
+    backlog = sum(r["pending_update_count"] or 0 for r in results)
+    print(f"Checked {len(results)} bots, {backlog} updates pending at Telegram")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Businessly maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = subparsers.add_parser("rebuild-analytics", help="Regenerate analytics rollups from raw data")
+    rebuild.add_argument("--bot-id", type=int, default=None, help="Only rebuild this bot")
+    rebuild.set_defaults(handler=_rebuild_analytics)
+    
+    reindex = subparsers.add_parser("reindex-knowledge", help="Re-chunk and reindex knowledge base documents")
+    reindex.add_argument("--bot-id", type=int, default=None, help="Only reindex this bot")
+    reindex.set_defaults(handler=_reindex_knowledge)
+    
+    archive = subparsers.add_parser("archive-messages", help="Run retention policies now, ignoring their schedule")
+    archive.add_argument("--bot-id", type=int, default=None, help="Only archive this bot")
+    archive.set_defaults(handler=_archive_messages)
+    
+    vacuum = subparsers.add_parser(
+        "vacuum",
+        help="Rebuild the database once so freed pages can be returned with incremental vacuum"
+    )
+    vacuum.set_defaults(handler=_vacuum)
+    
+    webhooks = subparsers.add_parser("reconcile-webhooks", help="Make Telegram webhooks match the bots' active flags")
+    webhooks.add_argument("--bot-id", type=int, default=None, help="Only check this bot")
+    webhooks.add_argument("--dry-run", action="store_true", help="Report drift without changing webhooks")
+    webhooks.set_defaults(handler=_reconcile_webhooks)
+    
+    args = parser.parse_args(argv)
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
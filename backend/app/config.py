@@ -16,9 +16,114 @@ class Settings(BaseSettings):
     gigachat_scope: str = "GIGACHAT_API_PERS"
     gigachat_oauth_url: str = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
     gigachat_api_url: str = "https://gigachat.devices.sberbank.ru/api/v1"
+    gigachat_model: str = "GigaChat"
+    gigachat_timeout: float = 60.0
+    
+    # LLM providers
+    llm_provider: str = "gigachat"  # gigachat | mock (offline, deterministic)
+    llm_deadline_seconds: float = 30.0  # End-to-end budget from webhook receipt
+    llm_backup_model: str = ""  # Hedge target; empty disables hedging
+    llm_backup_api_url: str = ""  # Defaults to gigachat_api_url
+    llm_hedge_default_delay: float = 5.0  # Used until enough latency samples exist
+    
+    # Knowledge base
+    kb_top_k: int = 4  # Chunks added to the prompt per question
+    kb_chunk_size: int = 800  # Characters per chunk
+    kb_description_prompt_limit: int = 1500  # Longer descriptions are indexed instead
+    kb_max_document_bytes: int = 2_000_000
+    
+    # Pre-classifier (handoff rules and canned answers before the LLM)
+    preclassifier_enabled: bool = True
+    canned_match_threshold: float = 0.85  # Minimum similarity for a canned answer
+    canned_cache_ttl_seconds: float = 60.0
+    
+    # GigaChat circuit breaker
+    gigachat_breaker_failure_rate: float = 0.5
+    gigachat_breaker_window_seconds: float = 30.0
+    gigachat_breaker_minimum_calls: int = 5
+    gigachat_breaker_open_seconds: float = 30.0
+    
+    # Sent while the AI is unavailable; the question is answered once it recovers
+    llm_holding_reply: str = "Спасибо за сообщение! Мы ответим вам в ближайшее время."
+    deferred_reply_max_size: int = 10000
+    deferred_reply_max_age_seconds: int = 3600
     
     # Telegram
     webhook_base_url: str = ""
+    telegram_api_url: str = "https://api.telegram.org"
+    update_dedup_window: int = 10000  # Recent update_ids remembered in memory
+    conversation_cache_size: int = 10000  # Active chats whose conversation state is kept in memory
+    webhook_reconcile_interval: float = 3600.0  # Seconds between webhook checks of all bots; 0 checks at startup only
+    webhook_concurrency: int = 20  # Parallel Bot API calls when checking or (de)activating many bots
+    
+    # Health probes behind /ready and /live
+    health_probe_interval: float = 15.0
+    health_probe_timeout: float = 5.0
+    readiness_probes: str = "database,gigachat,telegram"  # Probes that must pass for /ready
+    warmup_max_bots: int = 500  # Active bots whose caches are primed on startup
+    
+    # Process roles: "all" handles webhooks in-process; with the supervisor,
+    # "api" workers queue updates and "ingest" workers process their shards
+    app_role: str = "all"
+    coordination_db_path: str = "./coordination.db"
+    shard_count: int = 256  # Fixed shards, assigned to ingest workers by consistent hashing
+    worker_lease_seconds: float = 10.0
+    ingest_poll_interval: float = 0.2
+    ingest_batch_size: int = 100
+    ingest_concurrency: int = 32  # Chats processed in parallel per ingest worker
+    ingest_max_attempts: int = 5  # Claims of an update that keeps failing before it is set aside
+    ingest_retry_backoff_seconds: float = 5.0  # Wait before the second claim of a failed update, doubling after each
+    
+    # Background bot deletion
+    deletion_batch_size: int = 2000  # Rows per delete transaction
+    deletion_batch_pause: float = 0.05  # Seconds between batches, lets other writers in
+    
+    # Message retention: per-bot policies move old messages to compressed archive files
+    archive_dir: str = "./archive"
+    retention_interval_seconds: float = 86400.0  # Minimum time between two runs of a policy
+    archive_batch_size: int = 2000  # Messages archived per transaction
+    archive_batch_pause: float = 0.05
+    vacuum_pages_per_step: int = 1000  # Pages freed per incremental vacuum step
+    
+    # Customer media (photos, voice notes, documents), stored once per content hash
+    media_dir: str = "./media"
+    media_max_bytes: int = 20_000_000  # Larger files are not downloaded; the Bot API serves up to 20 MB
+    media_download_workers: int = 4  # Concurrent downloads per process, apart from the reply path
+    media_queue_size: int = 1000  # Queued downloads; the rest wait for the next sweep
+    media_chunk_bytes: int = 65536  # Downloads are streamed to disk in chunks of this size
+    media_download_timeout: float = 120.0
+    
+    # Owner broadcasts to all active conversations of a bot
+    broadcast_rate_per_second: float = 25.0  # Telegram allows about 30 messages per second per bot
+    broadcast_concurrency: int = 5  # Sends in flight per broadcast
+    broadcast_batch_size: int = 100  # Conversations read, and messages saved, per transaction
+    
+    # Sampling profiler: off until enabled with PROFILER_ENABLED, POST /api/admin/profiler or SIGUSR2
+    profiler_enabled: bool = False
+    profiler_sample_rate: float = 0.01  # Fraction of requests and background tasks profiled
+    profiler_interval_ms: float = 5.0  # Time between two stack samples
+    profiler_slow_request_ms: float = 1000.0  # Slower requests flag their route for full capture
+    profiler_slow_task_ms: float = 15000.0  # Same for background tasks, e.g. message processing
+    profiler_slow_capture: int = 5  # Runs of a flagged route or task profiled in full
+    profiler_dir: str = "./profiles"  # Collapsed-stack files, newest profiler_max_files kept
+    profiler_max_files: int = 500
+    admin_token: str = ""  # Sent as X-Admin-Token to /api/admin; empty disables the admin API
+    
+    # Tracing of updates from webhook to reply; recent traces at /api/admin/traces
+    tracing_enabled: bool = True
+    tracing_buffer_size: int = 1000  # Finished traces kept in memory
+    tracing_max_spans: int = 500  # Spans kept per trace
+    tracing_export_path: str = ""  # JSONL file of finished spans; empty keeps them in memory only
+    
+    # Capture of raw webhook updates for `python -m loadtest.replay`: off until
+    # enabled with CAPTURE_ENABLED or POST /api/admin/capture
+    capture_enabled: bool = False
+    capture_path: str = "./captures/updates.jsonl.gz"  # Bot tokens are replaced by a hash
+    capture_max_bytes: int = 500_000_000  # Recording stops at this file size
+    
+    # Shutdown
+    shutdown_drain_seconds: float = 20.0  # In-flight work still running after this is saved for the next start
+    shutdown_retry_after_seconds: int = 5  # Retry-After sent to Telegram while draining
     
     class Config:
         env_file = ".env"
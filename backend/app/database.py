@@ -1,5 +1,8 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import inspect, text, event
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.exc import DatabaseError
 from app.config import get_settings
 
 settings = get_settings()
@@ -10,6 +13,18 @@ engine = create_async_engine(
     future=True
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets API and ingest worker processes read while one writes
+        cursor = dbapi_connection.cursor()
+        # Only takes effect on a new database file; lets retention return
+        # freed pages with incremental vacuum
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -33,6 +48,86 @@ async def get_db():
             await session.close()
 
 
+async def get_read_db():
+    """
+    Connection for endpoints that only read: no ORM session, so no
+    identity map, autoflush or commit. Core selects of the needed columns
+    return plain rows; the implicit transaction is rolled back on exit.
+    """
+    async with engine.connect() as conn:
+        yield conn
+
+
+def _sync_schema(conn):
+    """
+    Bring tables created by older versions up to date.
+    
+    `create_all` only creates missing tables, so nullable columns and
+    indexes added to existing models are created here, and SQLite tables
+    that have since asked for AUTOINCREMENT are rebuilt with it.
+    """
+    inspector = inspect(conn)
+    
+    for table in Base.metadata.sorted_tables:
+        if table.kwargs.get("sqlite_autoincrement") and conn.dialect.name == "sqlite":
+            sql = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar()
+            if sql and "AUTOINCREMENT" not in sql.upper():
+                _rebuild_table(conn, table, {c["name"] for c in inspector.get_columns(table.name)})
+                continue
+        
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not (column.nullable or column.server_default is not None):
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            default = ""
+            if column.server_default is not None:
+                default = " DEFAULT '{}'".format(str(column.server_default.arg).replace("'", "''"))
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}{default}')
+        
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(conn)
+            except DatabaseError as e:
+                # e.g. a unique index over rows that are already duplicated
+                print(f"Could not create index {index.name}: {e}")
+
+
+def _rebuild_table(conn, table, existing_columns):
+    """
+    Recreate a SQLite table from its model, keeping rows and ids: the way
+    to add AUTOINCREMENT, which ALTER TABLE cannot. Triggers on the table
+    are dropped with it and must be created again by their owners.
+    """
+    print(f"Rebuilding table {table.name}, this may take a while")
+    staging = f"{table.name}_rebuild"
+    create = str(CreateTable(table).compile(conn)).replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {staging} (", 1)
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {staging}")
+    conn.exec_driver_sql(create)
+    columns = ", ".join(f'"{c.name}"' for c in table.columns if c.name in existing_columns)
+    conn.exec_driver_sql(f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table.name}")
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {staging} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(conn)
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_sync_schema)
+
+
+async def check_db() -> bool:
+    """Check that the database answers a trivial query."""
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
@@ -1,9 +1,26 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 
-from app.database import init_db
-from app.routers import auth_router, bots_router, conversations_router, telegram_router
+from app.database import check_db
+from app.routers import (
+    auth_router,
+    bots_router,
+    conversations_router,
+    telegram_router,
+    search_router,
+    analytics_router,
+    knowledge_router,
+    admin_router
+)
+from app.services.gigachat import gigachat_service
+from app.services.telegram import telegram_service
+from app.services.lifecycle import lifecycle
+from app.services.health import health_monitor
+from app.services.conversation_cache import conversation_cache
+from app.services.profiler import profiler, ProfilerMiddleware
+from app.runtime import startup, warm_up, shutdown
 from app.config import get_settings
 
 settings = get_settings()
@@ -11,18 +28,27 @@ settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await init_db()
+    # Startup; API workers under the supervisor only queue updates
+    process_messages = settings.app_role != "api"
+    await startup(process_messages)
+    lifecycle.on_close(health_monitor.stop)
+    
+    health_monitor.add_probe("database", check_db)
+    health_monitor.add_probe("telegram", telegram_service.check_health)
+    if process_messages:
+        health_monitor.add_probe("gigachat", gigachat_service.check_health)
+    health_monitor.start(warm_up=lambda: warm_up(process_messages))
     yield
     # Shutdown
-    pass
+    await shutdown()
 
 
 app = FastAPI(
     title="Businessly API",
     description="AI-powered business automation platform for Telegram",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration
@@ -37,11 +63,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Times every request while the profiler is on; cheap pass-through otherwise
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(bots_router)
 app.include_router(conversations_router)
 app.include_router(telegram_router)
+app.include_router(search_router)
+app.include_router(analytics_router)
+app.include_router(knowledge_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
@@ -55,4 +88,18 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {"status": "healthy", "conversation_cache": conversation_cache.snapshot()}
+
+
+@app.get("/live")
+async def live():
+    """Liveness: the process and its background probe loop are running."""
+    alive, body = health_monitor.live()
+    return JSONResponse(body, status_code=200 if alive else 503)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness from cached probe results; 503 while warming up, degraded or draining."""
+    is_ready, body = health_monitor.ready(draining=lifecycle.draining)
+    return JSONResponse(body, status_code=200 if is_ready else 503)
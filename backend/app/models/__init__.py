@@ -2,5 +2,22 @@ from app.models.user import User
 from app.models.bot import TelegramBot
 from app.models.conversation import Conversation
 from app.models.message import Message
+from app.models.analytics import HandoffEvent, BotStatsHourly, BotStatsDaily
+from app.models.knowledge import KnowledgeDocument, KnowledgeChunk
+from app.models.routing import CannedAnswer, RoutingDecision
+from app.models.pending import PendingWork
+from app.models.inbound import InboundUpdate
+from app.models.deletion import BotDeletion
+from app.models.retention import RetentionPolicy, ArchiveSegment
+from app.models.media import MediaFile, MessageAttachment
+from app.models.broadcast import Broadcast
 
-__all__ = ["User", "TelegramBot", "Conversation", "Message"]
+__all__ = [
+    "User", "TelegramBot", "Conversation", "Message",
+    "HandoffEvent", "BotStatsHourly", "BotStatsDaily",
+    "KnowledgeDocument", "KnowledgeChunk",
+    "CannedAnswer", "RoutingDecision",
+    "PendingWork", "InboundUpdate", "BotDeletion",
+    "RetentionPolicy", "ArchiveSegment",
+    "MediaFile", "MessageAttachment", "Broadcast"
+]
@@ -0,0 +1,60 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, Date, Float, ForeignKey, BigInteger, UniqueConstraint
+from app.database import Base
+
+
+class HandoffEvent(Base):
+    """Raw record of a conversation escalated to the owner on low AI confidence."""
+    __tablename__ = "handoff_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    confidence = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<HandoffEvent {self.id} - Conversation {self.conversation_id}>"
+
+
+class _BotStatsCounters:
+    """Additive counters shared by all rollup granularities."""
+    user_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    assistant_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    owner_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    new_conversations = Column(Integer, nullable=False, default=0, server_default="0")
+    handoffs = Column(Integer, nullable=False, default=0, server_default="0")
+    ai_latency_ms_total = Column(BigInteger, nullable=False, default=0, server_default="0")
+    ai_latency_samples = Column(Integer, nullable=False, default=0, server_default="0")
+    routed_llm = Column(Integer, nullable=False, default=0, server_default="0")
+    routed_canned = Column(Integer, nullable=False, default=0, server_default="0")
+    routed_handoffs = Column(Integer, nullable=False, default=0, server_default="0")
+    routing_latency_us_total = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+
+class BotStatsHourly(_BotStatsCounters, Base):
+    __tablename__ = "bot_stats_hourly"
+    __table_args__ = (
+        UniqueConstraint("bot_id", "bucket_start", name="uq_bot_stats_hourly_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)  # Start of the UTC hour
+    
+    def __repr__(self):
+        return f"<BotStatsHourly bot={self.bot_id} {self.bucket_start}>"
+
+
+class BotStatsDaily(_BotStatsCounters, Base):
+    __tablename__ = "bot_stats_daily"
+    __table_args__ = (
+        UniqueConstraint("bot_id", "bucket_start", name="uq_bot_stats_daily_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False)
+    bucket_start = Column(Date, nullable=False)  # UTC day
+    
+    def __repr__(self):
+        return f"<BotStatsDaily bot={self.bot_id} {self.bucket_start}>"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, BigInteger
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -8,13 +8,16 @@ class TelegramBot(Base):
     __tablename__ = "telegram_bots"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     token = Column(String(255), unique=True, nullable=False)
     bot_id = Column(String(50), nullable=True)  # Telegram bot ID
     bot_username = Column(String(100), nullable=True)  # @username
     name = Column(String(100), nullable=False)  # Display name
     business_description = Column(Text, nullable=False)  # Business context for AI
     is_active = Column(Boolean, default=False)
+    last_update_id = Column(BigInteger, nullable=True)  # Highest processed Telegram update_id
+    last_update_at = Column(DateTime, nullable=True)  # When last_update_id was raised
+    deleted_at = Column(DateTime, nullable=True)  # Set when deletion starts; rows are removed in the background
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
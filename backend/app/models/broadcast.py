@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
+from app.database import Base
+
+
+class Broadcast(Base):
+    """An owner announcement sent to every active conversation of a bot, and its progress."""
+    __tablename__ = "broadcasts"
+    __table_args__ = (
+        Index("ix_broadcasts_bot_created", "bot_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, cancelled, failed
+    total = Column(Integer, nullable=True)  # Conversations targeted, counted when the job starts
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    cursor = Column(Integer, nullable=False, default=0)  # Conversations up to this id are done
+    last_error = Column(Text, nullable=True)  # Latest Telegram error of a failed send
+    error = Column(Text, nullable=True)  # Why the job itself failed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Heartbeat while running
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<Broadcast {self.id} bot={self.bot_id} {self.status}>"
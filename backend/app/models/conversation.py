@@ -1,11 +1,15 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, BigInteger, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Webhook lookup of a chat, per-bot lists and conversation counts
+        Index("ix_conversations_bot_chat", "bot_id", "telegram_chat_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False)
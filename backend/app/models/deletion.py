@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text
+from app.database import Base
+
+
+class BotDeletion(Base):
+    """Progress of a background bot deletion; outlives the bot row."""
+    __tablename__ = "bot_deletions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, nullable=False, index=True)  # No FK: the bot row is deleted last
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    bot_name = Column(String(100), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    step = Column(String(50), nullable=True)  # Table currently being emptied
+    total_rows = Column(BigInteger, nullable=True)  # Counted when the job starts
+    deleted_rows = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Heartbeat while running
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<BotDeletion bot={self.bot_id} {self.status}>"
@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Index
+from app.database import Base
+
+
+class InboundUpdate(Base):
+    """Webhook update queued by an API worker for the ingest worker owning its shard."""
+    __tablename__ = "inbound_updates"
+    __table_args__ = (
+        Index("ix_inbound_updates_shard_claim", "shard", "claimed_by", "id"),
+        Index("ix_inbound_updates_chat", "bot_token", "chat_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    shard = Column(Integer, nullable=False)
+    bot_token = Column(String(255), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON arguments of process_message
+    claimed_by = Column(String(100), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    not_before = Column(DateTime, nullable=True)  # Retry backoff after a failed attempt; holds back its chat
+    failed_at = Column(DateTime, nullable=True)  # Set aside after ingest_max_attempts; never claimed again
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<InboundUpdate {self.id} shard={self.shard}>"
@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+
+class KnowledgeDocument(Base):
+    __tablename__ = "knowledge_documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    title = Column(String(255), nullable=False)
+    source = Column(String(20), nullable=False, default="upload")  # upload, description
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)  # sha256, skips reindexing unchanged uploads
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    chunks = relationship("KnowledgeChunk", back_populates="document", cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"<KnowledgeDocument {self.title}>"
+
+
+class KnowledgeChunk(Base):
+    __tablename__ = "knowledge_chunks"
+    
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("knowledge_documents.id"), nullable=False, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False)
+    position = Column(Integer, nullable=False)  # Order within the document
+    content = Column(Text, nullable=False)
+    
+    # Relationships
+    document = relationship("KnowledgeDocument", back_populates="chunks")
+    
+    def __repr__(self):
+        return f"<KnowledgeChunk {self.document_id}#{self.position}>"
@@ -0,0 +1,48 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class MediaFile(Base):
+    """A stored file, kept once per content hash however often it was sent."""
+    __tablename__ = "media_files"
+    
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    path = Column(String(200), nullable=False)  # Relative to settings.media_dir
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<MediaFile {self.sha256[:12]} {self.size_bytes}B>"
+
+
+class MessageAttachment(Base):
+    """Photo, voice note, document... sent by a customer with a message."""
+    __tablename__ = "message_attachments"
+    __table_args__ = (
+        Index("ix_message_attachments_message", "message_id"),
+        # The download sweep looks for unfinished attachments
+        Index("ix_message_attachments_status", "status", "claimed_at"),
+        # The same Telegram file sent again is not downloaded again
+        Index("ix_message_attachments_unique_id", "telegram_file_unique_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    kind = Column(String(20), nullable=False)  # photo, voice, audio, video, video_note, document, sticker
+    telegram_file_id = Column(String(255), nullable=False)  # For getFile
+    telegram_file_unique_id = Column(String(100), nullable=True)  # Same file across bots and resends
+    file_name = Column(String(255), nullable=True)
+    mime_type = Column(String(100), nullable=True)
+    size_bytes = Column(BigInteger, nullable=True)  # As announced by Telegram until stored
+    status = Column(String(20), nullable=False, default="pending")  # pending, downloading, stored, too_large, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    claimed_at = Column(DateTime, nullable=True)  # Set when a download starts
+    media_file_id = Column(Integer, ForeignKey("media_files.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<MessageAttachment {self.id} {self.kind} {self.status}>"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Index, text
 from sqlalchemy.orm import relationship
 import enum
 from app.database import Base
@@ -13,6 +13,21 @@ class MessageRole(str, enum.Enum):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # History and export reads walk a conversation in time order
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        # A redelivered Telegram update must not store the user message twice
+        Index(
+            "uq_messages_user_telegram_id",
+            "conversation_id",
+            "telegram_message_id",
+            unique=True,
+            sqlite_where=text("role = 'user'")
+        ),
+        # Ids of archived and deleted messages are never handed out again,
+        # so archive segments and attachments cannot match a newer message
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from app.database import Base
+
+
+class PendingWork(Base):
+    """Work interrupted by a shutdown, resumed on the next start."""
+    __tablename__ = "pending_work"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)  # update, reply
+    payload = Column(Text, nullable=False)  # JSON arguments for the resume handler
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PendingWork {self.id} {self.kind}>"
@@ -0,0 +1,44 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Index
+from app.database import Base
+
+
+class RetentionPolicy(Base):
+    """How long a bot's messages stay in the `messages` table before archiving."""
+    __tablename__ = "retention_policies"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, unique=True)
+    archive_after_days = Column(Integer, nullable=True)  # Archive messages older than this
+    inactive_after_days = Column(Integer, nullable=True)  # Archive whole conversations idle this long
+    enabled = Column(Boolean, default=True)
+    last_run_at = Column(DateTime, nullable=True)  # Set when a run starts; doubles as its claim
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<RetentionPolicy bot={self.bot_id}>"
+
+
+class ArchiveSegment(Base):
+    """A gzip-compressed NDJSON file holding archived messages of one conversation."""
+    __tablename__ = "archive_segments"
+    __table_args__ = (
+        # Scrolling back walks a conversation's segments newest first
+        Index("ix_archive_segments_conversation_last", "conversation_id", "last_message_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    path = Column(String(500), nullable=False)  # Relative to settings.archive_dir
+    message_count = Column(Integer, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime, nullable=True)
+    last_created_at = Column(DateTime, nullable=True)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ArchiveSegment {self.id} - Conversation {self.conversation_id}>"
@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from app.database import Base
+
+
+class CannedAnswer(Base):
+    """Owner-provided answer sent without calling the LLM when a question matches."""
+    __tablename__ = "canned_answers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<CannedAnswer {self.id}>"
+
+
+class RoutingDecision(Base):
+    """Raw log of the pre-classifier decision for an incoming message."""
+    __tablename__ = "routing_decisions"
+    
+    id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, ForeignKey("telegram_bots.id"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    decision = Column(String(20), nullable=False)  # llm, canned, handoff
+    rule = Column(String(100), nullable=True)  # Matched rule name or canned answer id
+    latency_us = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<RoutingDecision {self.decision} - Conversation {self.conversation_id}>"
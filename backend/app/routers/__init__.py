@@ -2,5 +2,12 @@ from app.routers.auth import router as auth_router
 from app.routers.bots import router as bots_router
 from app.routers.conversations import router as conversations_router
 from app.routers.telegram import router as telegram_router
+from app.routers.search import router as search_router
+from app.routers.analytics import router as analytics_router
+from app.routers.knowledge import router as knowledge_router
+from app.routers.admin import router as admin_router
 
-__all__ = ["auth_router", "bots_router", "conversations_router", "telegram_router"]
+__all__ = [
+    "auth_router", "bots_router", "conversations_router", "telegram_router",
+    "search_router", "analytics_router", "knowledge_router", "admin_router"
+]
@@ -0,0 +1,105 @@
+import hmac
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+
+from app.schemas.admin import (
+    ProfilerUpdate, ProfilerStatus, TraceResponse, WebhookReconcilerStatus, CaptureUpdate, CaptureStatus
+)
+from app.schemas.bot import WebhookStatusResponse
+from app.services.profiler import profiler
+from app.services.tracing import tracer
+from app.services.webhooks import webhook_reconciler
+from app.services.capture import update_recorder
+from app.config import get_settings
+
+settings = get_settings()
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Operator endpoints are keyed by ADMIN_TOKEN, not user accounts."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+def _profiler_status() -> ProfilerStatus:
+    return ProfilerStatus(pid=os.getpid(), **profiler.snapshot())
+
+
+@router.get("/profiler", response_model=ProfilerStatus, dependencies=[Depends(require_admin)])
+async def get_profiler():
+    """Profiler state of the process that answers."""
+    return _profiler_status()
+
+
+@router.post("/profiler", response_model=ProfilerStatus, dependencies=[Depends(require_admin)])
+async def update_profiler(profiler_data: ProfilerUpdate):
+    """
+    Switch the sampling profiler on or off in the process that answers.
+    Under the supervisor, send SIGUSR2 to each worker instead.
+    """
+    if profiler_data.enabled:
+        profiler.enable(
+            sample_rate=profiler_data.sample_rate,
+            slow_request_ms=profiler_data.slow_request_ms,
+            slow_task_ms=profiler_data.slow_task_ms
+        )
+    else:
+        profiler.disable()
+    return _profiler_status()
+
+
+@router.get("/traces", response_model=List[TraceResponse], dependencies=[Depends(require_admin)])
+async def list_slowest_traces(
+    limit: int = Query(20, ge=1, le=200),
+    name: Optional[str] = Query(None, description="Root span, e.g. webhook or process_message"),
+    spans: bool = False
+):
+    """Slowest of the recent traces kept in memory by the process that answers."""
+    return [trace.as_dict(spans=spans) for trace in tracer.slowest(limit, name)]
+
+
+@router.get("/traces/{trace_id}", response_model=List[TraceResponse], dependencies=[Depends(require_admin)])
+async def get_trace(trace_id: str):
+    """All spans of a trace recorded by this process, one entry per root span."""
+    traces = tracer.find(trace_id)
+    if not traces:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    return [trace.as_dict() for trace in traces]
+
+
+@router.get("/webhooks", response_model=WebhookReconcilerStatus, dependencies=[Depends(require_admin)])
+async def get_webhook_reconciler():
+    """Background webhook reconciler of the process that answers, with its last pass."""
+    return WebhookReconcilerStatus(pid=os.getpid(), **webhook_reconciler.snapshot())
+
+
+@router.post("/webhooks/reconcile", response_model=List[WebhookStatusResponse], dependencies=[Depends(require_admin)])
+async def reconcile_all_webhooks(repair: bool = True):
+    """
+    Compare every bot's webhook with its is_active flag now, e.g. after
+    changing WEBHOOK_BASE_URL. With `repair=false` drift is only reported.
+    """
+    return await webhook_reconciler.reconcile(repair=repair)
+
+
+@router.get("/capture", response_model=CaptureStatus, dependencies=[Depends(require_admin)])
+async def get_capture():
+    """Webhook update capture of the process that answers."""
+    return CaptureStatus(pid=os.getpid(), **update_recorder.snapshot())
+
+
+@router.post("/capture", response_model=CaptureStatus, dependencies=[Depends(require_admin)])
+async def update_capture(capture_data: CaptureUpdate):
+    """
+    Start or stop recording webhook updates to CAPTURE_PATH in the
+    process that answers; replay the file with `python -m loadtest.replay`.
+    """
+    if capture_data.enabled:
+        update_recorder.enable()
+    else:
+        await update_recorder.disable()
+    return CaptureStatus(pid=os.getpid(), **update_recorder.snapshot())
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy import select
+from typing import Optional
+from datetime import datetime, time, timedelta
+
+from app.database import get_read_db
+from app.models.bot import TelegramBot
+from app.schemas.analytics import AnalyticsBucket, AnalyticsSummary, BotAnalyticsResponse
+from app.security import get_current_user_row
+from app.services.analytics import analytics_service
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+# Default window when no start date is given
+DEFAULT_RANGE = {
+    "hour": timedelta(hours=48),
+    "day": timedelta(days=30),
+}
+
+
+def _ratio(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+@router.get("/bots/{bot_id}", response_model=BotAnalyticsResponse)
+async def get_bot_analytics(
+    bot_id: int,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """Get message volume, AI share, handoff rate, AI latency and pre-classifier routing for a bot."""
+    result = await db.execute(
+        select(TelegramBot.id).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    
+    end = end or datetime.utcnow()
+    start = start or end - DEFAULT_RANGE[granularity]
+    
+    rows = await analytics_service.get_series(db, bot_id, granularity, start, end)
+    
+    buckets = []
+    totals = {name: 0 for name in analytics_service.COUNTERS}
+    for row in rows:
+        for name in analytics_service.COUNTERS:
+            totals[name] += getattr(row, name)
+        
+        bucket_start = row.bucket_start
+        if not isinstance(bucket_start, datetime):
+            bucket_start = datetime.combine(bucket_start, time.min)
+        
+        buckets.append(AnalyticsBucket(
+            bucket_start=bucket_start,
+            user_messages=row.user_messages,
+            assistant_messages=row.assistant_messages,
+            owner_messages=row.owner_messages,
+            new_conversations=row.new_conversations,
+            handoffs=row.handoffs,
+            avg_ai_latency_ms=_ratio(row.ai_latency_ms_total, row.ai_latency_samples),
+            routed_llm=row.routed_llm,
+            routed_canned=row.routed_canned,
+            routed_handoffs=row.routed_handoffs
+        ))
+    
+    routed = totals["routed_llm"] + totals["routed_canned"] + totals["routed_handoffs"]
+    summary = AnalyticsSummary(
+        user_messages=totals["user_messages"],
+        assistant_messages=totals["assistant_messages"],
+        owner_messages=totals["owner_messages"],
+        new_conversations=totals["new_conversations"],
+        handoffs=totals["handoffs"],
+        ai_reply_share=_ratio(
+            totals["assistant_messages"],
+            totals["assistant_messages"] + totals["owner_messages"]
+        ),
+        handoff_rate=_ratio(
+            totals["handoffs"],
+            totals["handoffs"] + totals["assistant_messages"]
+        ),
+        avg_ai_latency_ms=_ratio(totals["ai_latency_ms_total"], totals["ai_latency_samples"]),
+        routed_llm=totals["routed_llm"],
+        routed_canned=totals["routed_canned"],
+        routed_handoffs=totals["routed_handoffs"],
+        llm_absorbed_share=_ratio(
+            totals["routed_canned"] + totals["routed_handoffs"],
+            routed
+        ),
+        avg_routing_latency_us=_ratio(totals["routing_latency_us_total"], routed)
+    )
+    
+    return BotAnalyticsResponse(
+        bot_id=bot_id,
+        granularity=granularity,
+        start=start,
+        end=end,
+        summary=summary,
+        buckets=buckets
+    )
@@ -11,7 +11,7 @@ from app.security import (
     get_password_hash,
     verify_password,
     create_access_token,
-    get_current_user,
+    get_current_user_row,
     sanitize_input
 )
 from app.config import get_settings
@@ -79,6 +79,6 @@ async def login(
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user=Depends(get_current_user_row)):
     """Get current user info."""
     return current_user
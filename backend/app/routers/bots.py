@@ -1,18 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy import select, func, update
+from typing import List, Optional
+from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User
 from app.models.bot import TelegramBot
 from app.models.conversation import Conversation
-from app.schemas.bot import BotCreate, BotUpdate, BotResponse, BotListResponse
-from app.security import get_current_user, sanitize_input
+from app.models.retention import RetentionPolicy
+from app.schemas.bot import (
+    BotCreate, BotUpdate, BotResponse, BotListResponse, BotDeletionResponse,
+    RetentionPolicyUpdate, RetentionPolicyResponse, BotActivationUpdate, WebhookStatusResponse,
+    BroadcastCreate, BroadcastResponse
+)
+from app.security import get_current_user, get_current_user_row, sanitize_input
+from app.serialization import rows_response
 from app.services.telegram import telegram_service
+from app.services.export import export_service
+from app.services.dedup import update_deduplicator
+from app.services.prompts import prompt_cache
+from app.services.knowledge import knowledge_service
+from app.services.preclassifier import preclassifier
+from app.services.deletion import bot_deletion_service
+from app.services.retention import retention_service
+from app.services.lifecycle import lifecycle
+from app.services.conversation_cache import conversation_cache
+from app.services.webhooks import webhook_reconciler, BOT_COLUMNS
+from app.services.broadcast import broadcast_service
 
 router = APIRouter(prefix="/api/bots", tags=["Bots"])
 
+BOT_LIST_FIELDS = tuple(BotListResponse.model_fields)
+
+
+def _conversations_count():
+    """Correlated count of a bot's conversations, selected next to its columns."""
+    return (
+        select(func.count(Conversation.id))
+        .where(Conversation.bot_id == TelegramBot.id)
+        .scalar_subquery()
+        .label("conversations_count")
+    )
+
 
 @router.post("/", response_model=BotResponse, status_code=status.HTTP_201_CREATED)
 async def create_bot(
@@ -53,6 +84,8 @@ async def create_bot(
         is_active=False
     )
     db.add(bot)
+    await db.flush()
+    await knowledge_service.sync_description(db, bot)
     await db.commit()
     await db.refresh(bot)
     
@@ -69,45 +102,69 @@ async def create_bot(
 
 @router.get("/", response_model=List[BotListResponse])
 async def list_bots(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
 ):
     """Get all bots for current user."""
     result = await db.execute(
-        select(TelegramBot).where(TelegramBot.user_id == current_user.id)
-    )
-    bots = result.scalars().all()
-    
-    response = []
-    for bot in bots:
-        # Count conversations
-        conv_result = await db.execute(
-            select(func.count(Conversation.id)).where(Conversation.bot_id == bot.id)
+        select(
+            TelegramBot.id,
+            TelegramBot.name,
+            TelegramBot.bot_username,
+            TelegramBot.is_active,
+            _conversations_count()
+        ).where(
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
-        conv_count = conv_result.scalar() or 0
-        
-        response.append(BotListResponse(
-            id=bot.id,
-            name=bot.name,
-            bot_username=bot.bot_username,
-            is_active=bot.is_active,
-            conversations_count=conv_count
-        ))
+    )
     
-    return response
+    return rows_response(result.all(), BOT_LIST_FIELDS)
 
 
 @router.get("/{bot_id}", response_model=BotResponse)
 async def get_bot(
     bot_id: int,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """Get bot details."""
+    result = await db.execute(
+        select(
+            TelegramBot.id,
+            TelegramBot.name,
+            TelegramBot.bot_username,
+            TelegramBot.business_description,
+            TelegramBot.is_active,
+            TelegramBot.created_at,
+            _conversations_count()
+        ).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    row = result.first()
+    
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    
+    return row._asdict()
+
+
+@router.put("/{bot_id}", response_model=BotResponse)
+async def update_bot(
+    bot_id: int,
+    bot_data: BotUpdate,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get bot details."""
+    """Update bot name or business description."""
     result = await db.execute(
         select(TelegramBot).where(
             TelegramBot.id == bot_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     bot = result.scalar_one_or_none()
@@ -115,6 +172,18 @@ async def get_bot(
     if not bot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
     
+    if bot_data.name is not None:
+        bot.name = sanitize_input(bot_data.name)
+    if bot_data.business_description is not None:
+        bot.business_description = sanitize_input(bot_data.business_description)
+        await knowledge_service.sync_description(db, bot)
+    
+    await db.commit()
+    await db.refresh(bot)
+    
+    # The system prompt embeds the business description
+    prompt_cache.invalidate(bot.id)
+    
     # Count conversations
     conv_result = await db.execute(
         select(func.count(Conversation.id)).where(Conversation.bot_id == bot.id)
@@ -132,6 +201,39 @@ async def get_bot(
     )
 
 
+@router.get("/{bot_id}/export")
+async def export_bot_history(
+    bot_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    updated_since: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream all conversations and messages of a bot as NDJSON or CSV."""
+    result = await db.execute(
+        select(TelegramBot.id).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    
+    if format == "csv":
+        body = export_service.iter_csv(bot_id, updated_since)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        body = export_service.iter_ndjson(bot_id, updated_since)
+        media_type = "application/x-ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="bot_{bot_id}_export.{format}"'}
+    )
+
+
 @router.put("/{bot_id}/toggle")
 async def toggle_bot(
     bot_id: int,
@@ -142,7 +244,8 @@ async def toggle_bot(
     result = await db.execute(
         select(TelegramBot).where(
             TelegramBot.id == bot_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     bot = result.scalar_one_or_none()
@@ -169,17 +272,277 @@ async def toggle_bot(
     return {"is_active": bot.is_active}
 
 
-@router.delete("/{bot_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.post("/activation", response_model=List[WebhookStatusResponse])
+async def set_bots_active(
+    activation_data: BotActivationUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Start or stop many bots at once. Webhooks are set or deleted in
+    parallel; each result says whether Telegram accepted the change and
+    how many updates it holds for the bot. A bot whose webhook could not
+    be set stays inactive; deactivation always applies, like the toggle.
+    """
+    query = select(*BOT_COLUMNS).where(
+        TelegramBot.user_id == current_user.id,
+        TelegramBot.deleted_at.is_(None)
+    )
+    if activation_data.bot_ids is not None:
+        query = query.where(TelegramBot.id.in_(activation_data.bot_ids))
+    bots = (await db.execute(query.order_by(TelegramBot.id))).all()
+    
+    results = await webhook_reconciler.set_active(bots, activation_data.is_active)
+    
+    if activation_data.is_active:
+        changed = [r["bot_id"] for r in results if r["state"] == "ok"]
+    else:
+        changed = [bot.id for bot in bots]
+    if changed:
+        await db.execute(
+            update(TelegramBot)
+            .where(TelegramBot.id.in_(changed))
+            .values(is_active=activation_data.is_active)
+        )
+        await db.commit()
+    for result in results:
+        if result["bot_id"] in changed:
+            result["is_active"] = activation_data.is_active
+    
+    return results
+
+
+@router.post("/webhooks/reconcile", response_model=List[WebhookStatusResponse])
+async def reconcile_webhooks(
+    repair: bool = True,
+    current_user=Depends(get_current_user_row)
+):
+    """
+    Check that Telegram delivers to every active bot and to no inactive
+    one, and fix what differs; with `repair=false` only report it.
+    """
+    return await webhook_reconciler.reconcile(user_id=current_user.id, repair=repair)
+
+
+async def _retention_response(db: AsyncSession, bot_id: int, policy: Optional[RetentionPolicy]) -> RetentionPolicyResponse:
+    stats = await retention_service.archive_stats(db, bot_id)
+    if policy is None:
+        return RetentionPolicyResponse(bot_id=bot_id, **stats)
+    return RetentionPolicyResponse(
+        bot_id=bot_id,
+        archive_after_days=policy.archive_after_days,
+        inactive_after_days=policy.inactive_after_days,
+        enabled=policy.enabled,
+        last_run_at=policy.last_run_at,
+        **stats
+    )
+
+
+async def _get_retention_policy(db: AsyncSession, bot_id: int, user_id: int) -> Optional[RetentionPolicy]:
+    """The bot's policy (None if it has none); 404 unless the user owns the bot."""
+    result = await db.execute(
+        select(TelegramBot.id, RetentionPolicy)
+        .outerjoin(RetentionPolicy, RetentionPolicy.bot_id == TelegramBot.id)
+        .where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == user_id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    row = result.first()
+    
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    
+    return row[1]
+
+
+@router.get("/{bot_id}/retention", response_model=RetentionPolicyResponse)
+async def get_retention_policy(
+    bot_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the message retention policy of a bot and the size of its archive."""
+    policy = await _get_retention_policy(db, bot_id, current_user.id)
+    return await _retention_response(db, bot_id, policy)
+
+
+@router.put("/{bot_id}/retention", response_model=RetentionPolicyResponse)
+async def update_retention_policy(
+    bot_id: int,
+    policy_data: RetentionPolicyUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Set when messages are moved to the archive: after `archive_after_days`,
+    or for whole conversations idle for `inactive_after_days`.
+    """
+    policy = await _get_retention_policy(db, bot_id, current_user.id)
+    if policy is None:
+        policy = RetentionPolicy(bot_id=bot_id)
+        db.add(policy)
+    
+    policy.archive_after_days = policy_data.archive_after_days
+    policy.inactive_after_days = policy_data.inactive_after_days
+    policy.enabled = policy_data.enabled
+    await db.commit()
+    await db.refresh(policy)
+    
+    return await _retention_response(db, bot_id, policy)
+
+
+@router.post("/{bot_id}/retention/run", response_model=RetentionPolicyResponse, status_code=status.HTTP_202_ACCEPTED)
+async def run_retention_policy(
+    bot_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Archive the bot's due messages now instead of at the next scheduled run."""
+    policy = await _get_retention_policy(db, bot_id, current_user.id)
+    if policy is None or not policy.enabled:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Retention policy is not enabled")
+    
+    lifecycle.spawn(retention_service.run_all(bot_id=bot_id, force=True))
+    
+    return await _retention_response(db, bot_id, policy)
+
+
+def _broadcast_response(job) -> BroadcastResponse:
+    progress = None
+    if job.total is not None:
+        progress = round(min((job.sent + job.failed) / job.total, 1.0), 4) if job.total else 1.0
+    return BroadcastResponse(
+        id=job.id,
+        bot_id=job.bot_id,
+        content=job.content,
+        status=job.status,
+        total=job.total,
+        sent=job.sent,
+        failed=job.failed,
+        progress=progress,
+        last_error=job.last_error,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
+    )
+
+
+@router.post("/{bot_id}/broadcasts", response_model=BroadcastResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_broadcast(
+    bot_id: int,
+    broadcast_data: BroadcastCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Send a message as the business owner to every active conversation of
+    the bot. It goes out in the background at a rate Telegram accepts;
+    follow it with GET /{bot_id}/broadcasts/{broadcast_id}.
+    """
+    result = await db.execute(
+        select(TelegramBot).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    bot = result.scalar_one_or_none()
+    
+    if not bot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    
+    if await broadcast_service.active_job(db, bot.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A broadcast of this bot is in progress")
+    
+    job = broadcast_service.create(db, bot, current_user.id, sanitize_input(broadcast_data.content))
+    await db.commit()
+    await db.refresh(job)
+    broadcast_service.start(job.id)
+    
+    return _broadcast_response(job)
+
+
+@router.get("/{bot_id}/broadcasts", response_model=List[BroadcastResponse])
+async def list_broadcasts(
+    bot_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Recent broadcasts of a bot, newest first."""
+    jobs = await broadcast_service.list_jobs(db, bot_id, current_user.id, limit)
+    return [_broadcast_response(job) for job in jobs]
+
+
+@router.get("/{bot_id}/broadcasts/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast(
+    bot_id: int,
+    broadcast_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the progress of a broadcast."""
+    job = await broadcast_service.get_job(db, bot_id, broadcast_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    return _broadcast_response(job)
+
+
+@router.post("/{bot_id}/broadcasts/{broadcast_id}/cancel", response_model=BroadcastResponse)
+async def cancel_broadcast(
+    bot_id: int,
+    broadcast_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stop a broadcast; messages already sent stay sent."""
+    job = await broadcast_service.get_job(db, bot_id, broadcast_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    if job.status not in ("pending", "running"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Broadcast has already finished")
+    
+    broadcast_service.cancel(job)
+    await db.commit()
+    
+    return _broadcast_response(job)
+
+
+def _deletion_response(job) -> BotDeletionResponse:
+    progress = None
+    if job.total_rows:
+        progress = round(min(job.deleted_rows / job.total_rows, 1.0), 4)
+    return BotDeletionResponse(
+        bot_id=job.bot_id,
+        bot_name=job.bot_name,
+        status=job.status,
+        step=job.step,
+        total_rows=job.total_rows,
+        deleted_rows=job.deleted_rows,
+        progress=progress,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
+    )
+
+
+@router.delete("/{bot_id}", response_model=BotDeletionResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_bot(
     bot_id: int,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Delete a bot."""
+    """
+    Delete a bot. The bot disappears at once; its conversations and
+    messages are removed in the background (see GET /{bot_id}/deletion).
+    """
     result = await db.execute(
         select(TelegramBot).where(
             TelegramBot.id == bot_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     bot = result.scalar_one_or_none()
@@ -191,5 +554,48 @@ async def delete_bot(
     if bot.is_active:
         await telegram_service.delete_webhook(bot.token)
     
-    await db.delete(bot)
+    token = bot.token
+    job = await bot_deletion_service.mark(db, bot)
     await db.commit()
+    await db.refresh(job)
+    
+    update_deduplicator.forget_bot(token)
+    prompt_cache.invalidate(bot.id)
+    preclassifier.invalidate(bot.id)
+    await conversation_cache.forget_bot(bot.id)
+    bot_deletion_service.start(job.id)
+    
+    return _deletion_response(job)
+
+
+@router.get("/{bot_id}/deletion", response_model=BotDeletionResponse)
+async def get_bot_deletion(
+    bot_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the progress of a bot deletion."""
+    job = await bot_deletion_service.get_job(db, bot_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion not found")
+    return _deletion_response(job)
+
+
+@router.post("/{bot_id}/deletion/retry", response_model=BotDeletionResponse)
+async def retry_bot_deletion(
+    bot_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Restart a failed bot deletion where it stopped."""
+    job = await bot_deletion_service.get_job(db, bot_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Deletion has not failed")
+    
+    bot_deletion_service.retry(job)
+    await db.commit()
+    bot_deletion_service.start(job.id)
+    
+    return _deletion_response(job)
@@ -1,90 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy import select, desc, func, literal
+from typing import List, Optional
+from datetime import datetime
+from urllib.parse import quote
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User
 from app.models.bot import TelegramBot
 from app.models.conversation import Conversation
 from app.models.message import Message
+from app.models.media import MediaFile, MessageAttachment
 from app.schemas.conversation import ConversationResponse, ConversationListResponse, ControlToggle
 from app.schemas.message import MessageCreate, MessageResponse, MessagesListResponse
-from app.security import get_current_user, sanitize_input
+from app.security import get_current_user, get_current_user_row, sanitize_input
+from app.serialization import rows_response, ORJSONResponse
 from app.services.telegram import telegram_service
+from app.services.analytics import analytics_service
+from app.services.retention import retention_service
+from app.services.conversation_cache import conversation_cache, ConversationState
+from app.services.media import media_service
 
 router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 
+MESSAGE_FIELDS = tuple(field for field in MessageResponse.model_fields if hasattr(Message, field))
+MESSAGE_COLUMNS = [getattr(Message, field) for field in MESSAGE_FIELDS]
+CONVERSATION_LIST_FIELDS = tuple(ConversationListResponse.model_fields)
+CONVERSATION_COLUMNS = [getattr(Conversation, field) for field in ConversationResponse.model_fields if hasattr(Conversation, field)]
+
+
+def _last_message(column, label: str):
+    """A column of the conversation's latest message, selected next to the conversation."""
+    return (
+        select(column)
+        .where(Message.conversation_id == Conversation.id)
+        .order_by(desc(Message.created_at), desc(Message.id))
+        .limit(1)
+        .scalar_subquery()
+        .label(label)
+    )
+
 
 @router.get("/", response_model=List[ConversationListResponse])
 async def list_conversations(
     bot_id: int = None,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
 ):
     """Get all conversations for user's bots."""
-    # Get user's bots
-    if bot_id:
-        bot_query = select(TelegramBot).where(
-            TelegramBot.id == bot_id,
-            TelegramBot.user_id == current_user.id
+    query = (
+        select(
+            Conversation.id,
+            Conversation.telegram_username,
+            Conversation.telegram_first_name,
+            Conversation.is_ai_controlled,
+            _last_message(func.substr(Message.content, 1, 50), "last_message"),
+            _last_message(Message.created_at, "last_message_at"),
+            literal(0).label("unread_count")
+        )
+        .join(TelegramBot)
+        .where(
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
-    else:
-        bot_query = select(TelegramBot).where(TelegramBot.user_id == current_user.id)
-    
-    bots_result = await db.execute(bot_query)
-    bots = bots_result.scalars().all()
-    bot_ids = [b.id for b in bots]
-    
-    if not bot_ids:
-        return []
-    
-    # Get conversations
-    result = await db.execute(
-        select(Conversation)
-        .where(Conversation.bot_id.in_(bot_ids))
         .order_by(desc(Conversation.updated_at))
     )
-    conversations = result.scalars().all()
-    
-    response = []
-    for conv in conversations:
-        # Get last message
-        msg_result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conv.id)
-            .order_by(desc(Message.created_at))
-            .limit(1)
-        )
-        last_msg = msg_result.scalar_one_or_none()
-        
-        response.append(ConversationListResponse(
-            id=conv.id,
-            telegram_username=conv.telegram_username,
-            telegram_first_name=conv.telegram_first_name,
-            is_ai_controlled=conv.is_ai_controlled,
-            last_message=last_msg.content[:50] if last_msg else None,
-            last_message_at=last_msg.created_at if last_msg else None,
-            unread_count=0
-        ))
+    if bot_id:
+        query = query.where(Conversation.bot_id == bot_id)
+    
+    result = await db.execute(query)
     
-    return response
+    return rows_response(result.all(), CONVERSATION_LIST_FIELDS)
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
 ):
     """Get conversation details."""
     # Get conversation with bot check
     result = await db.execute(
-        select(Conversation, TelegramBot)
+        select(*CONVERSATION_COLUMNS)
         .join(TelegramBot)
         .where(
             Conversation.id == conversation_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     row = result.first()
@@ -92,63 +96,140 @@ async def get_conversation(
     if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
     
-    conv, bot = row
-    
-    return ConversationResponse(
-        id=conv.id,
-        telegram_chat_id=conv.telegram_chat_id,
-        telegram_username=conv.telegram_username,
-        telegram_first_name=conv.telegram_first_name,
-        telegram_last_name=conv.telegram_last_name,
-        is_ai_controlled=conv.is_ai_controlled,
-        is_active=conv.is_active,
-        created_at=conv.created_at,
-        updated_at=conv.updated_at
-    )
+    return row._asdict()
 
 
 @router.get("/{conversation_id}/messages", response_model=MessagesListResponse)
 async def get_messages(
     conversation_id: int,
     limit: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    before_id: Optional[int] = None,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
 ):
-    """Get messages for a conversation."""
+    """
+    Get the latest `limit` messages of a conversation, oldest first.
+    Pass the id of the first message as `before_id` to scroll back;
+    messages moved out by the retention policy are read from the archive.
+    """
     # Verify ownership
     result = await db.execute(
-        select(Conversation, TelegramBot)
+        select(Conversation.id, Conversation.is_ai_controlled)
         .join(TelegramBot)
         .where(
             Conversation.id == conversation_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
-    row = result.first()
+    conv = result.first()
     
-    if not row:
+    if not conv:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
     
-    conv, bot = row
-    
     # Get messages
+    query = select(*MESSAGE_COLUMNS).where(Message.conversation_id == conversation_id)
+    if before_id is not None:
+        query = query.where(Message.id < before_id)
     msg_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-        .limit(limit)
+        query.order_by(desc(Message.created_at), desc(Message.id)).limit(limit + 1)
     )
-    messages = msg_result.scalars().all()
+    messages = [row._asdict() for row in reversed(msg_result.all())]
     
-    return MessagesListResponse(
-        conversation_id=conv.id,
-        is_ai_controlled=conv.is_ai_controlled,
-        messages=[MessageResponse(
-            id=m.id,
-            role=m.role,
-            content=m.content,
-            created_at=m.created_at
-        ) for m in messages]
+    has_more = len(messages) > limit
+    if has_more:
+        messages = messages[1:]
+    else:
+        # Older messages may have been moved to the archive
+        archived, has_more = await retention_service.get_messages(
+            db,
+            conv.id,
+            before_id=messages[0]["id"] if messages else before_id,
+            limit=limit - len(messages)
+        )
+        messages = [{field: m[field] for field in MESSAGE_FIELDS} for m in archived] + messages
+    
+    # Attachments outlive archiving, so archived messages keep theirs
+    attachments = await media_service.attachments_for(db, conv.id, [m["id"] for m in messages])
+    for message in messages:
+        message["attachment"] = attachments.get(message["id"])
+    
+    return ORJSONResponse({
+        "conversation_id": conv.id,
+        "is_ai_controlled": conv.is_ai_controlled,
+        "messages": messages,
+        "has_more": has_more
+    })
+
+
+@router.get("/{conversation_id}/attachments/{attachment_id}")
+async def get_attachment(
+    conversation_id: int,
+    attachment_id: int,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """
+    A file sent by the customer, streamed from disk. Supports single
+    byte ranges, so voice notes and videos can be seeked; files are
+    content-addressed and never change, so clients may cache them.
+    Only allowlisted image, audio and video types are served inline.
+    """
+    result = await db.execute(
+        select(MessageAttachment.mime_type, MessageAttachment.file_name, MediaFile.path, MediaFile.size_bytes, MediaFile.sha256)
+        .join(MediaFile, MediaFile.id == MessageAttachment.media_file_id)
+        .join(TelegramBot, TelegramBot.id == MessageAttachment.bot_id)
+        .where(
+            MessageAttachment.id == attachment_id,
+            MessageAttachment.conversation_id == conversation_id,
+            MessageAttachment.status == "stored",
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    row = result.first()
+    
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    
+    size = row.size_bytes
+    media_type, disposition = media_service.content_type(row.mime_type)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{row.sha256}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": f"{disposition}; filename*=UTF-8''{quote(row.file_name or row.sha256[:16])}",
+        # The file comes from a customer: never sniffed, never run as a page
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "sandbox",
+    }
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        byte_range = media_service.parse_range(range, size)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    status_code = status.HTTP_200_OK
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        media_service.iter_file(row.path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
     )
 
 
@@ -166,7 +247,8 @@ async def send_message(
         .join(TelegramBot)
         .where(
             Conversation.id == conversation_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     row = result.first()
@@ -197,9 +279,11 @@ async def send_message(
         conversation_id=conv.id,
         role="owner",
         content=content,
-        telegram_message_id=tg_result.get("message_id")
+        telegram_message_id=tg_result.get("message_id"),
+        created_at=datetime.utcnow()
     )
     db.add(message)
+    await analytics_service.record_message(db, bot.id, "owner", at=message.created_at)
     await db.commit()
     await db.refresh(message)
     
@@ -225,7 +309,8 @@ async def toggle_control(
         .join(TelegramBot)
         .where(
             Conversation.id == conversation_id,
-            TelegramBot.user_id == current_user.id
+            TelegramBot.user_id == current_user.id,
+            TelegramBot.deleted_at.is_(None)
         )
     )
     row = result.first()
@@ -236,5 +321,6 @@ async def toggle_control(
     conv, bot = row
     conv.is_ai_controlled = control_data.is_ai_controlled
     await db.commit()
+    await conversation_cache.store(ConversationState.from_conversation(conv))
     
     return {"is_ai_controlled": conv.is_ai_controlled}
@@ -0,0 +1,352 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy import select, func
+from typing import List, Optional
+
+from app.database import get_db, get_read_db
+from app.models.user import User
+from app.models.bot import TelegramBot
+from app.models.knowledge import KnowledgeDocument, KnowledgeChunk
+from app.models.routing import CannedAnswer
+from app.schemas.knowledge import (
+    KnowledgeDocumentCreate,
+    KnowledgeDocumentUpdate,
+    KnowledgeDocumentResponse,
+    KnowledgeSearchResponse,
+    CannedAnswerCreate,
+    CannedAnswerUpdate,
+    CannedAnswerResponse,
+    RoutePreviewResponse
+)
+from app.security import get_current_user, get_current_user_row, sanitize_input, sanitize_html
+from app.serialization import rows_response
+from app.services.knowledge import knowledge_service
+from app.services.preclassifier import preclassifier
+from app.config import get_settings
+
+settings = get_settings()
+router = APIRouter(prefix="/api/knowledge", tags=["Knowledge Base"])
+
+DOCUMENT_FIELDS = tuple(KnowledgeDocumentResponse.model_fields)
+CANNED_FIELDS = tuple(CannedAnswerResponse.model_fields)
+CANNED_COLUMNS = [getattr(CannedAnswer, field) for field in CANNED_FIELDS]
+
+
+async def _get_owned_bot(db: AsyncSession, bot_id: int, user: User) -> TelegramBot:
+    result = await db.execute(
+        select(TelegramBot).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == user.id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    bot = result.scalar_one_or_none()
+    if not bot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+    return bot
+
+
+async def _check_owned_bot(db: AsyncConnection, bot_id: int, user_id: int) -> None:
+    """Ownership check for read-only endpoints; loads no bot columns."""
+    result = await db.execute(
+        select(TelegramBot.id).where(
+            TelegramBot.id == bot_id,
+            TelegramBot.user_id == user_id,
+            TelegramBot.deleted_at.is_(None)
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot not found")
+
+
+async def _get_document(db: AsyncSession, bot_id: int, document_id: int) -> KnowledgeDocument:
+    result = await db.execute(
+        select(KnowledgeDocument).where(
+            KnowledgeDocument.id == document_id,
+            KnowledgeDocument.bot_id == bot_id
+        )
+    )
+    document = result.scalar_one_or_none()
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    return document
+
+
+async def _document_response(db: AsyncSession, document: KnowledgeDocument) -> KnowledgeDocumentResponse:
+    result = await db.execute(
+        select(func.count(KnowledgeChunk.id)).where(KnowledgeChunk.document_id == document.id)
+    )
+    return KnowledgeDocumentResponse(
+        id=document.id,
+        title=document.title,
+        source=document.source,
+        size=len(document.content),
+        chunks_count=result.scalar() or 0,
+        created_at=document.created_at,
+        updated_at=document.updated_at
+    )
+
+
+@router.get("/bots/{bot_id}/documents", response_model=List[KnowledgeDocumentResponse])
+async def list_documents(
+    bot_id: int,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """Get all knowledge base documents of a bot."""
+    await _check_owned_bot(db, bot_id, current_user.id)
+    
+    result = await db.execute(
+        select(
+            KnowledgeDocument.id,
+            KnowledgeDocument.title,
+            KnowledgeDocument.source,
+            func.length(KnowledgeDocument.content).label("size"),
+            KnowledgeDocument.created_at,
+            KnowledgeDocument.updated_at,
+            select(func.count(KnowledgeChunk.id))
+            .where(KnowledgeChunk.document_id == KnowledgeDocument.id)
+            .scalar_subquery()
+            .label("chunks_count")
+        )
+        .where(KnowledgeDocument.bot_id == bot_id)
+        .order_by(KnowledgeDocument.created_at)
+    )
+    
+    return rows_response(result.all(), DOCUMENT_FIELDS)
+
+
+@router.post("/bots/{bot_id}/documents", response_model=KnowledgeDocumentResponse, status_code=status.HTTP_201_CREATED)
+async def create_document(
+    bot_id: int,
+    document_data: KnowledgeDocumentCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Add a text document to the bot's knowledge base."""
+    await _get_owned_bot(db, bot_id, current_user)
+    
+    document = await knowledge_service.save_document(
+        db,
+        bot_id,
+        sanitize_input(document_data.title),
+        sanitize_input(document_data.content)
+    )
+    await db.commit()
+    await db.refresh(document)
+    
+    return await _document_response(db, document)
+
+
+@router.post("/bots/{bot_id}/documents/upload", response_model=KnowledgeDocumentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    bot_id: int,
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Upload a UTF-8 text or Markdown file to the bot's knowledge base."""
+    await _get_owned_bot(db, bot_id, current_user)
+    
+    raw = await file.read(settings.kb_max_document_bytes + 1)
+    if len(raw) > settings.kb_max_document_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Document is too large"
+        )
+    try:
+        content = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only UTF-8 text documents are supported"
+        )
+    
+    content = sanitize_input(content)
+    if not content.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Document is empty")
+    
+    document = await knowledge_service.save_document(
+        db,
+        bot_id,
+        sanitize_input(title or file.filename or "Документ")[:255],
+        content
+    )
+    await db.commit()
+    await db.refresh(document)
+    
+    return await _document_response(db, document)
+
+
+@router.put("/bots/{bot_id}/documents/{document_id}", response_model=KnowledgeDocumentResponse)
+async def update_document(
+    bot_id: int,
+    document_id: int,
+    document_data: KnowledgeDocumentUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Replace a document; only this document is reindexed."""
+    await _get_owned_bot(db, bot_id, current_user)
+    document = await _get_document(db, bot_id, document_id)
+    
+    if document.source == "description":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Edit the bot's business description instead"
+        )
+    
+    document = await knowledge_service.save_document(
+        db,
+        bot_id,
+        sanitize_input(document_data.title) if document_data.title else document.title,
+        sanitize_input(document_data.content) if document_data.content else document.content,
+        document=document
+    )
+    await db.commit()
+    await db.refresh(document)
+    
+    return await _document_response(db, document)
+
+
+@router.delete("/bots/{bot_id}/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(
+    bot_id: int,
+    document_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove a document from the knowledge base."""
+    await _get_owned_bot(db, bot_id, current_user)
+    document = await _get_document(db, bot_id, document_id)
+    
+    await knowledge_service.delete_document(db, document)
+    await db.commit()
+
+
+@router.get("/bots/{bot_id}/search", response_model=KnowledgeSearchResponse)
+async def search_knowledge(
+    bot_id: int,
+    q: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Preview which chunks would be added to the prompt for a question."""
+    await _get_owned_bot(db, bot_id, current_user)
+    
+    chunks = await knowledge_service.retrieve(db, bot_id, q)
+    return KnowledgeSearchResponse(query=q, chunks=chunks)
+
+
+async def _get_canned_answer(db: AsyncSession, bot_id: int, answer_id: int) -> CannedAnswer:
+    result = await db.execute(
+        select(CannedAnswer).where(
+            CannedAnswer.id == answer_id,
+            CannedAnswer.bot_id == bot_id
+        )
+    )
+    canned = result.scalar_one_or_none()
+    if not canned:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Canned answer not found")
+    return canned
+
+
+@router.get("/bots/{bot_id}/canned", response_model=List[CannedAnswerResponse])
+async def list_canned_answers(
+    bot_id: int,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """Get the answers sent without calling the AI."""
+    await _check_owned_bot(db, bot_id, current_user.id)
+    
+    result = await db.execute(
+        select(*CANNED_COLUMNS)
+        .where(CannedAnswer.bot_id == bot_id)
+        .order_by(CannedAnswer.created_at)
+    )
+    return rows_response(result.all(), CANNED_FIELDS)
+
+
+@router.post("/bots/{bot_id}/canned", response_model=CannedAnswerResponse, status_code=status.HTTP_201_CREATED)
+async def create_canned_answer(
+    bot_id: int,
+    canned_data: CannedAnswerCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Add a question the bot answers directly with a fixed reply."""
+    await _get_owned_bot(db, bot_id, current_user)
+    
+    canned = CannedAnswer(
+        bot_id=bot_id,
+        question=sanitize_input(canned_data.question),
+        answer=sanitize_html(canned_data.answer)
+    )
+    db.add(canned)
+    await db.commit()
+    await db.refresh(canned)
+    preclassifier.invalidate(bot_id)
+    
+    return canned
+
+
+@router.put("/bots/{bot_id}/canned/{answer_id}", response_model=CannedAnswerResponse)
+async def update_canned_answer(
+    bot_id: int,
+    answer_id: int,
+    canned_data: CannedAnswerUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Update a canned answer."""
+    await _get_owned_bot(db, bot_id, current_user)
+    canned = await _get_canned_answer(db, bot_id, answer_id)
+    
+    if canned_data.question is not None:
+        canned.question = sanitize_input(canned_data.question)
+    if canned_data.answer is not None:
+        canned.answer = sanitize_html(canned_data.answer)
+    
+    await db.commit()
+    await db.refresh(canned)
+    preclassifier.invalidate(bot_id)
+    
+    return canned
+
+
+@router.delete("/bots/{bot_id}/canned/{answer_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_canned_answer(
+    bot_id: int,
+    answer_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove a canned answer."""
+    await _get_owned_bot(db, bot_id, current_user)
+    canned = await _get_canned_answer(db, bot_id, answer_id)
+    
+    await db.delete(canned)
+    await db.commit()
+    preclassifier.invalidate(bot_id)
+
+
+@router.get("/bots/{bot_id}/route", response_model=RoutePreviewResponse)
+async def preview_route(
+    bot_id: int,
+    q: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Preview whether a message would be escalated, answered from canned answers or sent to the AI."""
+    await _get_owned_bot(db, bot_id, current_user)
+    
+    decision = await preclassifier.classify(db, bot_id, q)
+    return RoutePreviewResponse(
+        query=q,
+        decision=decision.decision,
+        rule=decision.rule,
+        answer=decision.answer,
+        latency_us=decision.latency_us
+    )
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncConnection
+from typing import Optional
+
+from app.database import get_read_db
+from app.schemas.search import MessageSearchHit, MessageSearchResponse
+from app.security import get_current_user_row
+from app.serialization import project, ORJSONResponse
+from app.services.search import search_service
+
+router = APIRouter(prefix="/api/search", tags=["Search"])
+
+HIT_FIELDS = tuple(MessageSearchHit.model_fields)
+
+
+@router.get("/messages", response_model=MessageSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    bot_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user=Depends(get_current_user_row),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """
+    Full-text search over the live messages of the user's bots. Messages
+    moved to the archive by retention are not indexed; export the bot's
+    history to search those.
+    """
+    if not search_service.is_available:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is only available with the SQLite backend"
+        )
+    
+    after = None
+    if cursor:
+        after = search_service.decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    
+    rows, next_cursor = await search_service.search_messages(
+        db,
+        user_id=current_user.id,
+        query=q,
+        bot_id=bot_id,
+        limit=limit,
+        cursor=after
+    )
+    
+    return ORJSONResponse({"hits": project(rows, HIT_FIELDS), "next_cursor": next_cursor, "scope": "live"})
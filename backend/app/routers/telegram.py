@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Request, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Request, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Any, Dict
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, Optional
+from datetime import datetime
+import time
 
 from app.database import async_session_maker
 from app.models.bot import TelegramBot
@@ -9,7 +12,23 @@ from app.models.conversation import Conversation
 from app.models.message import Message
 from app.services.telegram import telegram_service
 from app.services.gigachat import gigachat_service
+from app.services.analytics import analytics_service
+from app.services.dedup import update_deduplicator
+from app.services.deferred_replies import deferred_replies, DeferredReply
+from app.services.knowledge import knowledge_service
+from app.services.preclassifier import preclassifier, RouteDecision
+from app.services.lifecycle import lifecycle
+from app.services.sharding import inbound_queue
+from app.services.conversation_cache import conversation_cache, ConversationState
+from app.services.tracing import tracer
+from app.services.media import media_service
+from app.services.capture import update_recorder
 from app.security import sanitize_html
+from app.schemas.telegram import IncomingMessage
+from app.serialization import read_json
+from app.config import get_settings
+
+settings = get_settings()
 
 router = APIRouter(prefix="/api/telegram", tags=["Telegram Webhook"])
 
@@ -17,8 +36,218 @@ router = APIRouter(prefix="/api/telegram", tags=["Telegram Webhook"])
 CONFIDENCE_THRESHOLD = 0.6
 
 
-async def process_message(bot_token: str, chat_id: int, user_message: str, message_id: int, user_info: dict):
-    """Process incoming message in background."""
+async def hand_off_to_owner(
+    db: AsyncSession,
+    bot: TelegramBot,
+    conversation: Conversation,
+    confidence: Optional[float] = None
+):
+    """Switch the conversation to manual mode and tell the customer."""
+    conversation.is_ai_controlled = False
+    await analytics_service.record_handoff(db, bot.id, conversation.id, confidence)
+    await db.commit()
+    await conversation_cache.store(ConversationState.from_conversation(conversation))
+    
+    # Optionally send a message that owner will respond
+    await telegram_service.send_message(
+        bot.token,
+        conversation.telegram_chat_id,
+        "Ваш вопрос передан менеджеру. Он ответит вам в ближайшее время."
+    )
+
+
+async def send_assistant_reply(
+    db: AsyncSession,
+    bot: TelegramBot,
+    conversation: Conversation,
+    user_msg: Message,
+    text: str
+):
+    """Send an automatic reply and save it as an assistant message."""
+    tg_result = await telegram_service.send_message(
+        bot.token,
+        conversation.telegram_chat_id,
+        text
+    )
+    
+    if tg_result:
+        # Save AI message
+        ai_msg = Message(
+            conversation_id=conversation.id,
+            role="assistant",
+            content=text,
+            telegram_message_id=tg_result.get("message_id"),
+            created_at=datetime.utcnow()
+        )
+        db.add(ai_msg)
+        latency_ms = int((ai_msg.created_at - user_msg.created_at).total_seconds() * 1000)
+        await analytics_service.record_message(
+            db, bot.id, "assistant", at=ai_msg.created_at, latency_ms=latency_ms
+        )
+        await db.commit()
+
+
+async def defer_reply(bot: TelegramBot, conversation: Conversation, is_retry: bool):
+    """Keep AI control and answer once GigaChat recovers; the customer gets a holding reply only once."""
+    chat_id = conversation.telegram_chat_id
+    if deferred_replies.defer(bot.id, conversation.id, chat_id) and not is_retry:
+        await telegram_service.send_message(bot.token, chat_id, settings.llm_holding_reply)
+
+
+async def reply_with_ai(
+    db: AsyncSession,
+    bot: TelegramBot,
+    conversation: Conversation,
+    user_msg: Message,
+    is_retry: bool = False,
+    deadline: Optional[float] = None
+):
+    """Generate and send the AI reply to the latest user message."""
+    chat_id = conversation.telegram_chat_id
+    
+    if not gigachat_service.breaker.would_allow():
+        # The call would be rejected: skip the typing action and context reads
+        await defer_reply(bot, conversation, is_retry)
+        return
+    
+    # Send typing indicator
+    await telegram_service.send_typing_action(bot.token, chat_id)
+    
+    # Get conversation history
+    history_result = await db.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.created_at)
+        .limit(20)
+    )
+    history = history_result.scalars().all()
+    history_list = [{"role": m.role, "content": m.content} for m in history]
+    
+    # Relevant knowledge base excerpts instead of the whole catalog
+    with tracer.span("knowledge.context") as span:
+        business_description, context_chunks = await knowledge_service.build_context(db, bot, user_msg.content)
+        span.set(chunks=len(context_chunks))
+    
+    # Generate AI response
+    try:
+        ai_response, confidence = await gigachat_service.generate_response(
+            user_message=user_msg.content,
+            business_description=business_description,
+            conversation_history=history_list,
+            deadline=deadline,
+            bot_id=bot.id,
+            bot_updated_at=bot.updated_at,
+            conversation_id=conversation.id,
+            context_chunks=context_chunks
+        )
+    except Exception:
+        # GigaChat unavailable or circuit open
+        await defer_reply(bot, conversation, is_retry)
+        return
+    
+    # Check confidence threshold
+    if confidence < CONFIDENCE_THRESHOLD:
+        # Low confidence - switch to manual mode, notify owner could be added here
+        await hand_off_to_owner(db, bot, conversation, confidence)
+        return
+    
+    await send_assistant_reply(db, bot, conversation, user_msg, ai_response)
+
+
+async def retry_deferred_reply(item: DeferredReply):
+    """Answer a conversation deferred while GigaChat was unavailable."""
+    with tracer.trace("deferred_reply", conversation_id=item.conversation_id):
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Conversation, TelegramBot)
+                .join(TelegramBot)
+                .where(
+                    Conversation.id == item.conversation_id,
+                    TelegramBot.is_active == True
+                )
+            )
+            row = result.first()
+            if not row:
+                return
+            
+            conversation, bot = row
+            if not conversation.is_ai_controlled:
+                return  # Owner took over meanwhile
+            
+            msg_result = await db.execute(
+                select(Message)
+                .where(Message.conversation_id == conversation.id)
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .limit(1)
+            )
+            last_msg = msg_result.scalar_one_or_none()
+            if not last_msg or last_msg.role != "user":
+                return  # Already answered
+            
+            await reply_with_ai(db, bot, conversation, last_msg, is_retry=True)
+
+
+def resume_update(payload: Dict[str, Any]):
+    """Restart processing of an update interrupted by the previous shutdown."""
+    lifecycle.spawn(process_message(**payload, resumed=True), kind="update", payload=payload)
+
+
+def resume_deferred_reply(payload: Dict[str, Any]):
+    deferred_replies.defer(payload["bot_id"], payload["conversation_id"], payload["chat_id"])
+
+
+async def process_queued_update(payload: Dict[str, Any], redelivered: bool):
+    """Handler of ingest workers; `redelivered` updates were claimed before."""
+    # The LLM budget counts from webhook receipt (Unix time, set by the API
+    # process); a retry gets a fresh one
+    received_time = payload.pop("received_time", None)
+    received_at = None
+    if received_time is not None and not redelivered:
+        received_at = time.monotonic() - max(0.0, time.time() - received_time)
+    if await process_message(**payload, received_at=received_at, resumed=redelivered) is False:
+        # Leave it queued; the worker unclaims it and a later claim retries
+        raise RuntimeError(f"update {payload.get('update_id')} failed")
+
+
+async def process_message(
+    bot_token: str,
+    chat_id: int,
+    user_message: str,
+    message_id: int,
+    user_info: dict,
+    update_id: Optional[int] = None,
+    received_at: Optional[float] = None,
+    resumed: bool = False,
+    trace_id: Optional[str] = None,
+    media: Optional[Dict[str, Any]] = None
+):
+    """
+    Process incoming message in background.
+    
+    `resumed` marks an update interrupted by a shutdown; if its message
+    was already saved, the reply is queued instead of skipped. Returns
+    False if processing failed (e.g. the database was locked).
+    `trace_id` continues the webhook's trace in an ingest worker.
+    `media` describes an attached file, downloaded by the media workers;
+    `user_message` is then its caption, possibly empty.
+    """
+    with tracer.trace("process_message", trace_id=trace_id, update_id=update_id, resumed=resumed):
+        return await _process_message(
+            bot_token, chat_id, user_message, message_id, user_info, update_id, received_at, resumed, media
+        )
+
+
+async def _process_message(
+    bot_token: str,
+    chat_id: int,
+    user_message: str,
+    message_id: int,
+    user_info: dict,
+    update_id: Optional[int],
+    received_at: Optional[float],
+    resumed: bool,
+    media: Optional[Dict[str, Any]]
+):
     async with async_session_maker() as db:
         try:
             # Find bot
@@ -33,14 +262,30 @@ async def process_message(bot_token: str, chat_id: int, user_message: str, messa
             if not bot:
                 return
             
-            # Find or create conversation
-            conv_result = await db.execute(
-                select(Conversation).where(
-                    Conversation.bot_id == bot.id,
-                    Conversation.telegram_chat_id == chat_id
+            # Find or create conversation; active chats come from the state cache
+            generation = conversation_cache.generation
+            with tracer.span("cache.conversation_state") as span:
+                found, state = conversation_cache.lookup(bot.id, chat_id)
+                span.set(hit=found)
+            if state is not None:
+                conversation = state.to_conversation()
+                db.add(conversation)
+            elif found:
+                conversation = None  # Known to be a new chat
+            else:
+                conv_result = await db.execute(
+                    select(Conversation).where(
+                        Conversation.bot_id == bot.id,
+                        Conversation.telegram_chat_id == chat_id
+                    )
+                )
+                conversation = conv_result.scalar_one_or_none()
+                conversation_cache.remember(
+                    bot.id,
+                    chat_id,
+                    ConversationState.from_conversation(conversation) if conversation else None,
+                    generation
                 )
-            )
-            conversation = conv_result.scalar_one_or_none()
             
             if not conversation:
                 conversation = Conversation(
@@ -53,122 +298,143 @@ async def process_message(bot_token: str, chat_id: int, user_message: str, messa
                     is_ai_controlled=True
                 )
                 db.add(conversation)
+                await analytics_service.record_conversation(db, bot.id)
                 await db.commit()
                 await db.refresh(conversation)
+                await conversation_cache.store(ConversationState.from_conversation(conversation))
             
-            # Save user message
-            sanitized_message = sanitize_html(user_message)
+            # Save user message; a file without caption is stored under a placeholder
+            if user_message or media is None:
+                sanitized_message = sanitize_html(user_message)
+            else:
+                sanitized_message = media_service.describe(media)
             user_msg = Message(
                 conversation_id=conversation.id,
                 role="user",
                 content=sanitized_message,
-                telegram_message_id=message_id
+                telegram_message_id=message_id,
+                created_at=datetime.utcnow()
             )
             db.add(user_msg)
+            bot_id, conversation_id = bot.id, conversation.id
+            try:
+                await db.flush()
+            except IntegrityError:
+                # Redelivered update already stored - skip before any LLM work
+                await db.rollback()
+                if resumed:
+                    # Interrupted after saving: retry_deferred_reply answers
+                    # it unless the owner or a reply got there first
+                    deferred_replies.defer(bot_id, conversation_id, chat_id)
+                return
+            
+            attachment = None
+            if media is not None:
+                attachment = media_service.attach(db, bot.id, conversation.id, user_msg.id, media)
+            
+            await analytics_service.record_message(db, bot.id, "user", at=user_msg.created_at)
+            if update_id is not None:
+                await update_deduplicator.persist_high_water(db, bot.id, update_id)
+            
+            # Cheap local rules first: explicit requests for a human and
+            # questions with a canned answer never reach the LLM
+            decision = None
+            if conversation.is_ai_controlled and user_message and settings.preclassifier_enabled:
+                with tracer.span("preclassifier") as span:
+                    decision = await preclassifier.classify(db, bot.id, user_message)
+                    span.set(decision=decision.decision, rule=decision.rule)
+                await analytics_service.record_routing(
+                    db, bot.id, conversation.id, decision.decision, decision.rule, decision.latency_us
+                )
             await db.commit()
+            if attachment is not None:
+                # Downloaded off the reply path; the sweep retries it if the queue is full
+                media_service.enqueue(attachment.id)
             
             # Check if AI should respond
             if not conversation.is_ai_controlled:
                 return  # Manual mode - don't respond
             
-            # Send typing indicator
-            await telegram_service.send_typing_action(bot.token, chat_id)
+            if not user_message:
+                return  # A file alone: the owner sees it in the dashboard
             
-            # Get conversation history
-            history_result = await db.execute(
-                select(Message)
-                .where(Message.conversation_id == conversation.id)
-                .order_by(Message.created_at)
-                .limit(20)
-            )
-            history = history_result.scalars().all()
-            history_list = [{"role": m.role, "content": m.content} for m in history]
-            
-            # Generate AI response
-            try:
-                ai_response, confidence = await gigachat_service.generate_response(
-                    user_message=sanitized_message,
-                    business_description=bot.business_description,
-                    conversation_history=history_list
-                )
-            except Exception as e:
-                # GigaChat error - switch to manual mode
-                conversation.is_ai_controlled = False
-                await db.commit()
+            if decision and decision.decision == RouteDecision.HANDOFF:
+                await hand_off_to_owner(db, bot, conversation)
                 return
             
-            # Check confidence threshold
-            if confidence < CONFIDENCE_THRESHOLD:
-                # Low confidence - switch to manual mode, notify owner could be added here
-                conversation.is_ai_controlled = False
-                await db.commit()
-                
-                # Optionally send a message that owner will respond
-                await telegram_service.send_message(
-                    bot.token,
-                    chat_id,
-                    "Ваш вопрос передан менеджеру. Он ответит вам в ближайшее время."
-                )
+            if decision and decision.decision == RouteDecision.CANNED:
+                await send_assistant_reply(db, bot, conversation, user_msg, decision.answer)
                 return
             
-            # Send AI response
-            tg_result = await telegram_service.send_message(
-                bot.token,
-                chat_id,
-                ai_response
-            )
+            # The LLM budget counts from webhook receipt, not from now
+            deadline = None
+            if received_at is not None:
+                deadline = received_at + settings.llm_deadline_seconds
+            await reply_with_ai(db, bot, conversation, user_msg, deadline=deadline)
             
-            if tg_result:
-                # Save AI message
-                ai_msg = Message(
-                    conversation_id=conversation.id,
-                    role="assistant",
-                    content=ai_response,
-                    telegram_message_id=tg_result.get("message_id")
-                )
-                db.add(ai_msg)
-                await db.commit()
-                
         except Exception as e:
             print(f"Error processing message: {e}")
             await db.rollback()
+            return False
 
 
 @router.post("/webhook/{bot_token}")
 async def telegram_webhook(
     bot_token: str,
-    request: Request,
-    background_tasks: BackgroundTasks
+    request: Request
 ):
     """Handle incoming Telegram webhook."""
-    try:
-        update: Dict[str, Any] = await request.json()
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
+    received_at = time.monotonic()
     
-    # Only process messages
-    if "message" not in update:
-        return {"ok": True}
+    with tracer.trace("webhook") as span:
+        return await _handle_update(bot_token, request, received_at, span)
+
+
+async def _handle_update(bot_token: str, request: Request, received_at: float, span):
+    """Body of telegram_webhook, run inside its root span."""
+    if lifecycle.draining:
+        # Shutting down - Telegram redelivers the update to the next instance
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Shutting down",
+            headers={"Retry-After": str(settings.shutdown_retry_after_seconds)}
+        )
     
-    message = update["message"]
+    update = await read_json(request)
+    update_recorder.record(bot_token, update)
     
-    # Only process text messages
-    if "text" not in message:
+    # Only process text and media messages
+    message = IncomingMessage.from_update(update)
+    if message is None:
         return {"ok": True}
     
-    chat_id = message["chat"]["id"]
-    text = message["text"]
-    message_id = message["message_id"]
-    user_info = message.get("from", {})
-    
-    # Process in background to respond quickly
-    background_tasks.add_task(
-        process_message,
-        bot_token,
-        chat_id,
-        text,
-        message_id,
-        user_info
-    )
+    span.set(update_id=message.update_id)
+    if message.update_id is not None:
+        with tracer.span("cache.dedup") as dedup_span:
+            accepted = await update_deduplicator.accept(bot_token, message.update_id)
+            dedup_span.set(duplicate=not accepted)
+        if not accepted:
+            return {"ok": True}
+    
+    payload = message.payload(bot_token, trace_id=tracer.current_trace_id())
+    
+    try:
+        if settings.app_role == "api":
+            # The ingest worker owning this bot's shard processes it
+            received_time = time.time() - (time.monotonic() - received_at)
+            await inbound_queue.enqueue(bot_token, message.chat_id, {**payload, "received_time": received_time})
+        else:
+            # Process in background to respond quickly; tracked so shutdown
+            # can drain it or save it for the next start
+            lifecycle.spawn(
+                process_message(**payload, received_at=received_at),
+                kind="update",
+                payload=payload
+            )
+    except Exception:
+        # Not handed off: the error makes Telegram redeliver, which must not count as a duplicate
+        if message.update_id is not None:
+            update_deduplicator.forget(bot_token, message.update_id)
+        raise
     
     return {"ok": True}
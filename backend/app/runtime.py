@@ -0,0 +1,118 @@
+"""
+Startup and shutdown sequences shared by the API process (`app.main`)
+and the ingest workers (`app.worker`).
+"""
+import asyncio
+from sqlalchemy import select
+
+from app.database import init_db, engine, async_session_maker
+from app.models.bot import TelegramBot
+from app.services.search import search_service
+from app.services.knowledge import knowledge_service
+from app.services.gigachat import gigachat_service
+from app.services.telegram import telegram_service
+from app.services.deferred_replies import deferred_replies
+from app.services.lifecycle import lifecycle
+from app.services.dedup import update_deduplicator
+from app.services.prompts import prompt_cache
+from app.services.preclassifier import preclassifier
+from app.services.deletion import bot_deletion_service
+from app.services.retention import retention_service
+from app.services.profiler import profiler
+from app.services.media import media_service
+from app.services.webhooks import webhook_reconciler
+from app.services.broadcast import broadcast_service
+from app.services.capture import update_recorder
+from app.routers.telegram import retry_deferred_reply, resume_update, resume_deferred_reply
+from app.config import get_settings
+
+settings = get_settings()
+
+
+async def startup(process_messages: bool = True):
+    """
+    Prepare the database and shared clients. With `process_messages`
+    the process also answers messages: deferred replies are retried and
+    work saved by the previous shutdown is resumed.
+    """
+    profiler.install_signal_handler()
+    if settings.profiler_enabled:
+        profiler.enable()
+    
+    await init_db()
+    await retention_service.reserve_archived_ids()
+    await search_service.ensure_index()
+    await knowledge_service.ensure_index()
+    
+    lifecycle.on_close(engine.dispose)
+    lifecycle.on_close(telegram_service.close)
+    lifecycle.on_close(gigachat_service.close)
+    
+    if settings.app_role != "ingest":
+        # Bot deletions interrupted by the last shutdown
+        await bot_deletion_service.resume()
+        # Broadcasts stopped midway, continued without sending twice
+        await broadcast_service.resume()
+        retention_service.start()
+        # Webhooks lost while the service was down or moved to a new URL
+        webhook_reconciler.start()
+        if settings.capture_enabled:
+            update_recorder.enable()
+    
+    if process_messages:
+        deferred_replies.start(
+            handler=retry_deferred_reply,
+            is_ready=lambda: gigachat_service.breaker.state != gigachat_service.breaker.OPEN
+        )
+        await lifecycle.resume({
+            "update": resume_update,
+            "reply": resume_deferred_reply,
+        })
+        # Also picks up downloads interrupted by the last shutdown
+        media_service.start()
+
+
+async def warm_up(process_messages: bool = True):
+    """Prime per-bot caches, prefetch the GigaChat token and open upstream connections."""
+    async with async_session_maker() as db:
+        await update_deduplicator.prime(db)
+        if process_messages:
+            result = await db.execute(
+                select(TelegramBot)
+                .where(TelegramBot.is_active == True)
+                .order_by(TelegramBot.updated_at.desc())
+                .limit(settings.warmup_max_bots)
+            )
+            for bot in result.scalars().all():
+                description = await knowledge_service.prompt_description(db, bot)
+                prompt_cache.get(bot.id, description, bot.updated_at)
+                await preclassifier.load_canned(db, bot.id)
+    
+    upstreams = [telegram_service.check_health()]
+    if process_messages:
+        upstreams.append(gigachat_service.warm_up())
+    
+    results = await asyncio.gather(*upstreams, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def shutdown():
+    """Refuse new updates, let running ones finish, save the rest and close clients."""
+    await retention_service.stop()
+    await webhook_reconciler.stop()
+    await media_service.stop()
+    await update_recorder.disable()
+    unfinished = await lifecycle.drain(settings.shutdown_drain_seconds)
+    await deferred_replies.stop()
+    unfinished += [
+        {
+            "kind": "reply",
+            "payload": {"bot_id": item.bot_id, "conversation_id": item.conversation_id, "chat_id": item.chat_id}
+        }
+        for item in deferred_replies.take_all()
+    ]
+    await lifecycle.persist(unfinished)
+    profiler.disable()
+    await lifecycle.close()
@@ -1,11 +1,29 @@
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, TokenData
-from app.schemas.bot import BotCreate, BotUpdate, BotResponse, BotListResponse
+from app.schemas.bot import (
+    BotCreate, BotUpdate, BotResponse, BotListResponse, BotActivationUpdate, WebhookStatusResponse,
+    BroadcastCreate, BroadcastResponse
+)
 from app.schemas.conversation import ConversationResponse, ConversationListResponse, ControlToggle
-from app.schemas.message import MessageCreate, MessageResponse, MessagesListResponse
+from app.schemas.message import MessageCreate, AttachmentResponse, MessageResponse, MessagesListResponse
+from app.schemas.search import MessageSearchHit, MessageSearchResponse
+from app.schemas.analytics import AnalyticsBucket, AnalyticsSummary, BotAnalyticsResponse
+from app.schemas.knowledge import (
+    KnowledgeDocumentCreate, KnowledgeDocumentUpdate, KnowledgeDocumentResponse, KnowledgeSearchResponse
+)
+from app.schemas.admin import (
+    ProfilerUpdate, ProfilerStatus, TraceSpan, TraceResponse, WebhookReconcileRun, WebhookReconcilerStatus,
+    CaptureUpdate, CaptureStatus
+)
 
 __all__ = [
     "UserCreate", "UserLogin", "UserResponse", "Token", "TokenData",
-    "BotCreate", "BotUpdate", "BotResponse", "BotListResponse",
+    "BotCreate", "BotUpdate", "BotResponse", "BotListResponse", "BotActivationUpdate", "WebhookStatusResponse",
+    "BroadcastCreate", "BroadcastResponse",
     "ConversationResponse", "ConversationListResponse", "ControlToggle",
-    "MessageCreate", "MessageResponse", "MessagesListResponse"
+    "MessageCreate", "AttachmentResponse", "MessageResponse", "MessagesListResponse",
+    "MessageSearchHit", "MessageSearchResponse",
+    "AnalyticsBucket", "AnalyticsSummary", "BotAnalyticsResponse",
+    "KnowledgeDocumentCreate", "KnowledgeDocumentUpdate", "KnowledgeDocumentResponse", "KnowledgeSearchResponse",
+    "ProfilerUpdate", "ProfilerStatus", "TraceSpan", "TraceResponse", "WebhookReconcileRun", "WebhookReconcilerStatus",
+    "CaptureUpdate", "CaptureStatus"
 ]
@@ -0,0 +1,81 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class ProfilerUpdate(BaseModel):
+    enabled: bool
+    sample_rate: Optional[float] = Field(None, gt=0, le=1, description="Fraction of requests and tasks profiled")
+    slow_request_ms: Optional[float] = Field(None, gt=0)
+    slow_task_ms: Optional[float] = Field(None, gt=0)
+
+
+class ProfilerStatus(BaseModel):
+    pid: int
+    enabled: bool
+    sample_rate: float
+    interval_ms: float
+    slow_request_ms: float
+    slow_task_ms: float
+    directory: str
+    active_captures: int
+    flagged: int
+    samples: int
+    profiles_written: int
+    slow: int
+
+
+class TraceSpan(BaseModel):
+    span_id: int
+    parent_id: Optional[int] = None
+    name: str  # webhook, process_message, db, http, cache.*, llm.complete...
+    offset_ms: float  # From the start of the trace
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = {}
+    error: Optional[str] = None
+
+
+class TraceResponse(BaseModel):
+    trace_id: str
+    name: str
+    started_at: datetime
+    duration_ms: Optional[float] = None
+    span_count: int
+    dropped_spans: int = 0
+    pid: int
+    spans: Optional[List[TraceSpan]] = None
+
+
+class WebhookReconcileRun(BaseModel):
+    finished_at: datetime
+    duration_ms: float
+    checked: int
+    ok: int
+    drift: int
+    repaired: int
+    error: int
+    pending_updates: int
+
+
+class WebhookReconcilerStatus(BaseModel):
+    pid: int
+    running: bool
+    interval: float
+    concurrency: int
+    runs: int
+    last_run: Optional[WebhookReconcileRun] = None
+
+
+class CaptureUpdate(BaseModel):
+    enabled: bool
+
+
+class CaptureStatus(BaseModel):
+    pid: int
+    enabled: bool
+    path: str
+    size_bytes: Optional[int] = None  # Of the file, shared by all processes recording to it
+    max_bytes: int
+    full: bool
+    recorded: int  # Updates recorded by this process
+    dropped: int  # Not written: file full or write error
@@ -0,0 +1,41 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+
+class AnalyticsBucket(BaseModel):
+    bucket_start: datetime
+    user_messages: int = 0
+    assistant_messages: int = 0
+    owner_messages: int = 0
+    new_conversations: int = 0
+    handoffs: int = 0
+    avg_ai_latency_ms: Optional[float] = None
+    routed_llm: int = 0
+    routed_canned: int = 0
+    routed_handoffs: int = 0
+
+
+class AnalyticsSummary(BaseModel):
+    user_messages: int = 0
+    assistant_messages: int = 0
+    owner_messages: int = 0
+    new_conversations: int = 0
+    handoffs: int = 0
+    ai_reply_share: Optional[float] = None  # assistant / (assistant + owner)
+    handoff_rate: Optional[float] = None  # handoffs / (handoffs + assistant)
+    avg_ai_latency_ms: Optional[float] = None
+    routed_llm: int = 0
+    routed_canned: int = 0
+    routed_handoffs: int = 0
+    llm_absorbed_share: Optional[float] = None  # (canned + routed handoffs) / routed
+    avg_routing_latency_us: Optional[float] = None
+
+
+class BotAnalyticsResponse(BaseModel):
+    bot_id: int
+    granularity: str
+    start: datetime
+    end: datetime
+    summary: AnalyticsSummary
+    buckets: List[AnalyticsBucket]
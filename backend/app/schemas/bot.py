@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -36,3 +36,69 @@ class BotListResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class RetentionPolicyUpdate(BaseModel):
+    archive_after_days: Optional[int] = Field(None, ge=1, description="Archive messages older than this")
+    inactive_after_days: Optional[int] = Field(None, ge=1, description="Archive conversations idle this long")
+    enabled: bool = True
+
+
+class RetentionPolicyResponse(BaseModel):
+    bot_id: int
+    archive_after_days: Optional[int] = None
+    inactive_after_days: Optional[int] = None
+    enabled: bool = False
+    last_run_at: Optional[datetime] = None
+    archive_segments: int = 0
+    archived_messages: int = 0
+    archive_bytes: int = 0
+
+
+class BotDeletionResponse(BaseModel):
+    bot_id: int
+    bot_name: str
+    status: str  # pending, running, done, failed
+    step: Optional[str] = None
+    total_rows: Optional[int] = None
+    deleted_rows: int = 0
+    progress: Optional[float] = None  # 0.0-1.0 once total_rows is known
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class BotActivationUpdate(BaseModel):
+    is_active: bool
+    bot_ids: Optional[List[int]] = Field(None, description="Bots to change; all of the user's bots if omitted")
+
+
+class WebhookStatusResponse(BaseModel):
+    bot_id: int
+    name: str
+    is_active: bool
+    state: str  # ok, drift, repaired, error
+    drift: Optional[str] = None  # missing, wrong_url, unexpected (webhook set on an inactive bot)
+    pending_update_count: Optional[int] = None  # Updates Telegram is holding for the bot
+    last_error_message: Optional[str] = None  # Telegram's last failed delivery
+    last_error_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class BroadcastCreate(BaseModel):
+    content: str = Field(..., min_length=1, max_length=4096)
+
+
+class BroadcastResponse(BaseModel):
+    id: int
+    bot_id: int
+    content: str
+    status: str  # pending, running, done, cancelled, failed
+    total: Optional[int] = None  # Target conversations, counted when the job starts
+    sent: int = 0
+    failed: int = 0  # Blocked by the user, chat gone...
+    progress: Optional[float] = None  # 0.0-1.0 once total is known
+    last_error: Optional[str] = None
+    error: Optional[str] = None  # Why the whole job failed
+    created_at: datetime
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,57 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+
+class KnowledgeDocumentCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=255)
+    content: str = Field(..., min_length=1)
+
+
+class KnowledgeDocumentUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    content: Optional[str] = Field(None, min_length=1)
+
+
+class KnowledgeDocumentResponse(BaseModel):
+    id: int
+    title: str
+    source: str
+    size: int
+    chunks_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+
+class KnowledgeSearchResponse(BaseModel):
+    query: str
+    chunks: List[str]
+
+
+class CannedAnswerCreate(BaseModel):
+    question: str = Field(..., min_length=1, max_length=1000)
+    answer: str = Field(..., min_length=1, max_length=4096)
+
+
+class CannedAnswerUpdate(BaseModel):
+    question: Optional[str] = Field(None, min_length=1, max_length=1000)
+    answer: Optional[str] = Field(None, min_length=1, max_length=4096)
+
+
+class CannedAnswerResponse(BaseModel):
+    id: int
+    question: str
+    answer: str
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class RoutePreviewResponse(BaseModel):
+    query: str
+    decision: str  # llm, canned, handoff
+    rule: Optional[str] = None
+    answer: Optional[str] = None
+    latency_us: int
@@ -7,11 +7,21 @@ class MessageCreate(BaseModel):
     content: str = Field(..., min_length=1)
 
 
+class AttachmentResponse(BaseModel):
+    id: int
+    kind: str  # photo, voice, audio, video, video_note, document
+    file_name: Optional[str] = None
+    mime_type: Optional[str] = None
+    size_bytes: Optional[int] = None
+    status: str  # pending, downloading, stored (then served at .../attachments/{id}), too_large, failed
+
+
 class MessageResponse(BaseModel):
     id: int
     role: str  # user, assistant, owner
     content: str
     created_at: datetime
+    attachment: Optional[AttachmentResponse] = None
     
     class Config:
         from_attributes = True
@@ -21,3 +31,4 @@ class MessagesListResponse(BaseModel):
     conversation_id: int
     is_ai_controlled: bool
     messages: list[MessageResponse]
+    has_more: bool = False  # Older messages exist; pass the first id as before_id
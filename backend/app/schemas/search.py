@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+
+class MessageSearchHit(BaseModel):
+    message_id: int
+    conversation_id: int
+    bot_id: int
+    role: str
+    snippet: str
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class MessageSearchResponse(BaseModel):
+    hits: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+    scope: str = Field("live", description="Messages searched: live ones only, not those moved to the archive")
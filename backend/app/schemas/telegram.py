@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# Sender fields stored on a new conversation
+USER_FIELDS = ("id", "username", "first_name", "last_name")
+
+# Message fields holding a file, checked in this order
+MEDIA_KINDS = ("photo", "voice", "audio", "video", "video_note", "document")
+
+
+@dataclass(slots=True)
+class IncomingMessage:
+    """
+    The parts of a Telegram message update the pipeline uses.
+    
+    A plain slotted dataclass rather than a Pydantic model: the webhook
+    reads a handful of fields and ignores the rest of the update.
+    """
+    chat_id: int
+    message_id: int
+    text: str
+    user_info: Dict[str, Any]
+    update_id: Optional[int] = None
+    media: Optional[Dict[str, Any]] = None  # See `media_of`; `text` is then the caption
+    
+    @classmethod
+    def from_update(cls, update: Any) -> Optional["IncomingMessage"]:
+        """None for anything but a text or media message (edits, stickers, callbacks...)."""
+        if not isinstance(update, dict):
+            return None
+        message = update.get("message")
+        if not isinstance(message, dict):
+            return None
+        
+        text = message.get("text")
+        media = None
+        if not isinstance(text, str):
+            media = cls.media_of(message)
+            if media is None:
+                return None
+            caption = message.get("caption")
+            text = caption if isinstance(caption, str) else ""
+        chat = message.get("chat")
+        message_id = message.get("message_id")
+        if not isinstance(chat, dict) or not isinstance(message_id, int):
+            return None
+        chat_id = chat.get("id")
+        if not isinstance(chat_id, int):
+            return None
+        
+        sender = message.get("from")
+        user_info = {}
+        if isinstance(sender, dict):
+            user_info = {field: sender[field] for field in USER_FIELDS if field in sender}
+        
+        update_id = update.get("update_id")
+        return cls(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            user_info=user_info,
+            update_id=update_id if isinstance(update_id, int) else None,
+            media=media
+        )
+    
+    @staticmethod
+    def media_of(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The file attached to a message: kind, Telegram ids, announced size and name."""
+        for kind in MEDIA_KINDS:
+            item = message.get(kind)
+            if kind == "photo" and isinstance(item, list) and item:
+                item = item[-1]  # Sizes come smallest first
+            if not isinstance(item, dict) or not isinstance(item.get("file_id"), str):
+                continue
+            return {
+                "kind": kind,
+                "file_id": item["file_id"],
+                "file_unique_id": item.get("file_unique_id"),
+                "file_size": item.get("file_size"),
+                "file_name": item.get("file_name"),
+                "mime_type": item.get("mime_type") or ("image/jpeg" if kind == "photo" else None),
+            }
+        return None
+    
+    def payload(self, bot_token: str, trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Keyword arguments of process_message; also what is queued or saved on shutdown."""
+        return {
+            "bot_token": bot_token,
+            "chat_id": self.chat_id,
+            "user_message": self.text,
+            "message_id": self.message_id,
+            "user_info": self.user_info,
+            "update_id": self.update_id,
+            "trace_id": trace_id,
+            "media": self.media
+        }
@@ -4,12 +4,12 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
 from sqlalchemy import select
 import bleach
 
 from app.config import get_settings
-from app.database import get_db
+from app.database import get_db, get_read_db
 
 settings = get_settings()
 
@@ -60,31 +60,59 @@ def sanitize_html(text: str, allowed_tags: list = None) -> str:
     return bleach.clean(text, tags=allowed_tags, strip=True)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-):
-    """Get the current authenticated user from JWT token."""
-    from app.models.user import User
-    
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def _token_user_id(token: str) -> int:
+    """User id from a JWT, or 401."""
     payload = verify_token(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    user_id: int = payload.get("sub")
+    user_id = payload.get("sub")
     if user_id is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    
+    return int(user_id)
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the current authenticated user from JWT token."""
+    from app.models.user import User
     
-    result = await db.execute(select(User).where(User.id == int(user_id)))
+    result = await db.execute(select(User).where(User.id == _token_user_id(token)))
     user = result.scalar_one_or_none()
     
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    
+    return user
+
+
+async def get_current_user_row(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncConnection = Depends(get_read_db)
+):
+    """
+    The current user as a row of its public columns, for read-only
+    endpoints; shares their connection instead of opening a session.
+    """
+    from app.models.user import User
+    
+    result = await db.execute(
+        select(User.id, User.email, User.name, User.created_at).where(User.id == _token_user_id(token))
+    )
+    user = result.first()
+    
+    if user is None:
+        raise _credentials_exception()
     
     return user
@@ -1,7 +1,53 @@
 from app.services.gigachat import gigachat_service, GigaChatService
 from app.services.telegram import telegram_service, TelegramService
+from app.services.search import search_service, SearchService
+from app.services.export import export_service, ExportService
+from app.services.analytics import analytics_service, AnalyticsService
+from app.services.dedup import update_deduplicator, UpdateDeduplicator
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.deferred_replies import deferred_replies, DeferredReplyQueue
+from app.services.llm import LLMProvider, GigaChatProvider, MockProvider, HedgedLLMClient
+from app.services.prompts import prompt_cache, PromptCache
+from app.services.knowledge import knowledge_service, KnowledgeService
+from app.services.preclassifier import preclassifier, PreClassifier, RouteDecision
+from app.services.lifecycle import lifecycle, LifecycleManager
+from app.services.health import health_monitor, HealthMonitor
+from app.services.coordination import coordination_store, CoordinationStore
+from app.services.sharding import inbound_queue, InboundQueue, IngestionWorker, HashRing
+from app.services.deletion import bot_deletion_service, BotDeletionService
+from app.services.retention import retention_service, RetentionService
+from app.services.conversation_cache import conversation_cache, ConversationStateCache, ConversationState
+from app.services.profiler import profiler, SamplingProfiler, ProfilerMiddleware
+from app.services.tracing import tracer, Tracer, TracingTransport
+from app.services.media import media_service, MediaService
+from app.services.webhooks import webhook_reconciler, WebhookReconciler
+from app.services.broadcast import broadcast_service, BroadcastService, RateLimiter
+from app.services.capture import update_recorder, UpdateRecorder
 
 __all__ = [
     "gigachat_service", "GigaChatService",
-    "telegram_service", "TelegramService"
+    "telegram_service", "TelegramService",
+    "search_service", "SearchService",
+    "export_service", "ExportService",
+    "analytics_service", "AnalyticsService",
+    "update_deduplicator", "UpdateDeduplicator",
+    "CircuitBreaker", "CircuitOpenError",
+    "deferred_replies", "DeferredReplyQueue",
+    "LLMProvider", "GigaChatProvider", "MockProvider", "HedgedLLMClient",
+    "prompt_cache", "PromptCache",
+    "knowledge_service", "KnowledgeService",
+    "preclassifier", "PreClassifier", "RouteDecision",
+    "lifecycle", "LifecycleManager",
+    "health_monitor", "HealthMonitor",
+    "coordination_store", "CoordinationStore",
+    "inbound_queue", "InboundQueue", "IngestionWorker", "HashRing",
+    "bot_deletion_service", "BotDeletionService",
+    "retention_service", "RetentionService",
+    "conversation_cache", "ConversationStateCache", "ConversationState",
+    "profiler", "SamplingProfiler", "ProfilerMiddleware",
+    "tracer", "Tracer", "TracingTransport",
+    "media_service", "MediaService",
+    "webhook_reconciler", "WebhookReconciler",
+    "broadcast_service", "BroadcastService", "RateLimiter",
+    "update_recorder", "UpdateRecorder"
 ]
@@ -0,0 +1,316 @@
+from collections import defaultdict
+from datetime import datetime, date
+from typing import Optional, Dict, Tuple, Union
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from app.database import async_session_maker
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.analytics import HandoffEvent, BotStatsHourly, BotStatsDaily
+from app.models.routing import RoutingDecision
+from app.services.retention import retention_service
+
+
+class AnalyticsService:
+    """
+    Incremental per-bot rollups.
+    
+    Counters are bumped with an upsert in the same transaction as the row
+    that caused them, so the hourly and daily tables are always consistent
+    with the raw data. `rebuild` regenerates them from scratch.
+    """
+    
+    COUNTERS = [
+        "user_messages",
+        "assistant_messages",
+        "owner_messages",
+        "new_conversations",
+        "handoffs",
+        "ai_latency_ms_total",
+        "ai_latency_samples",
+        "routed_llm",
+        "routed_canned",
+        "routed_handoffs",
+        "routing_latency_us_total",
+    ]
+    
+    ROLE_COUNTERS = {
+        "user": "user_messages",
+        "assistant": "assistant_messages",
+        "owner": "owner_messages",
+    }
+    
+    ROUTING_COUNTERS = {
+        "llm": "routed_llm",
+        "canned": "routed_canned",
+        "handoff": "routed_handoffs",
+    }
+    
+    @staticmethod
+    def _hour(at: datetime) -> datetime:
+        return at.replace(minute=0, second=0, microsecond=0)
+    
+    async def _bump(self, db: AsyncSession, bot_id: int, at: Optional[datetime], **deltas: int) -> None:
+        at = at or datetime.utcnow()
+        
+        for model, bucket in (
+            (BotStatsHourly, self._hour(at)),
+            (BotStatsDaily, at.date()),
+        ):
+            stmt = sqlite_insert(model).values(bot_id=bot_id, bucket_start=bucket, **deltas)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[model.bot_id, model.bucket_start],
+                set_={name: getattr(model, name) + value for name, value in deltas.items()}
+            )
+            await db.execute(stmt)
+    
+    async def record_message(
+        self,
+        db: AsyncSession,
+        bot_id: int,
+        role: str,
+        at: Optional[datetime] = None,
+        latency_ms: Optional[int] = None,
+        count: int = 1
+    ) -> None:
+        """Count saved messages (`count` for a batch). Call before the commit that saves them."""
+        counter = self.ROLE_COUNTERS.get(role)
+        if counter is None:
+            return
+        
+        deltas = {counter: count}
+        if latency_ms is not None:
+            deltas["ai_latency_ms_total"] = max(latency_ms, 0)
+            deltas["ai_latency_samples"] = 1
+        
+        await self._bump(db, bot_id, at, **deltas)
+    
+    async def record_conversation(self, db: AsyncSession, bot_id: int, at: Optional[datetime] = None) -> None:
+        await self._bump(db, bot_id, at, new_conversations=1)
+    
+    async def record_handoff(
+        self,
+        db: AsyncSession,
+        bot_id: int,
+        conversation_id: int,
+        confidence: Optional[float] = None
+    ) -> None:
+        """Store the raw handoff event and count it."""
+        event = HandoffEvent(
+            bot_id=bot_id,
+            conversation_id=conversation_id,
+            confidence=confidence,
+            created_at=datetime.utcnow()
+        )
+        db.add(event)
+        await self._bump(db, bot_id, event.created_at, handoffs=1)
+    
+    async def record_routing(
+        self,
+        db: AsyncSession,
+        bot_id: int,
+        conversation_id: int,
+        decision: str,
+        rule: Optional[str],
+        latency_us: int
+    ) -> None:
+        """Store the raw pre-classifier decision and count it."""
+        entry = RoutingDecision(
+            bot_id=bot_id,
+            conversation_id=conversation_id,
+            decision=decision,
+            rule=rule,
+            latency_us=latency_us,
+            created_at=datetime.utcnow()
+        )
+        db.add(entry)
+        await self._bump(
+            db, bot_id, entry.created_at,
+            **{self.ROUTING_COUNTERS[decision]: 1, "routing_latency_us_total": latency_us}
+        )
+    
+    async def get_series(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        bot_id: int,
+        granularity: str,
+        start: datetime,
+        end: datetime
+    ):
+        """Read rollup rows for a bot; never touches the raw tables."""
+        model = BotStatsHourly if granularity == "hour" else BotStatsDaily
+        if granularity == "hour":
+            start_bucket, end_bucket = self._hour(start), end
+        else:
+            start_bucket, end_bucket = start.date(), end.date()
+        
+        result = await db.execute(
+            select(model.bucket_start, *[getattr(model, name) for name in self.COUNTERS])
+            .where(
+                model.bot_id == bot_id,
+                model.bucket_start >= start_bucket,
+                model.bucket_start <= end_bucket
+            )
+            .order_by(model.bucket_start)
+        )
+        return result.all()
+    
+    async def purge_bot(self, db: AsyncSession, bot_id: int) -> None:
+        """Remove all analytics rows of a bot."""
+        for model in (BotStatsHourly, BotStatsDaily, HandoffEvent, RoutingDecision):
+            await db.execute(delete(model).where(model.bot_id == bot_id))
+    
+    async def rebuild(self, bot_id: Optional[int] = None) -> int:
+        """
+        Regenerate hourly and daily rollups from raw messages (including
+        archived ones), conversations, handoff events and routing decisions.
+        
+        Returns the number of hourly buckets written.
+        """
+        hourly: Dict[Tuple[int, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        
+        def bot_filter(column):
+            return [column == bot_id] if bot_id is not None else []
+        
+        async with async_session_maker() as db:
+            # Messages per role
+            bucket = func.strftime("%Y-%m-%d %H:00:00", Message.created_at).label("bucket")
+            result = await db.execute(
+                select(Conversation.bot_id, bucket, Message.role, func.count(Message.id))
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .where(*bot_filter(Conversation.bot_id))
+                .group_by(Conversation.bot_id, bucket, Message.role)
+            )
+            for row_bot_id, row_bucket, role, count in result.all():
+                counter = self.ROLE_COUNTERS.get(role)
+                if counter:
+                    hourly[(row_bot_id, row_bucket)][counter] += count
+            
+            # New conversations
+            bucket = func.strftime("%Y-%m-%d %H:00:00", Conversation.created_at).label("bucket")
+            result = await db.execute(
+                select(Conversation.bot_id, bucket, func.count(Conversation.id))
+                .where(*bot_filter(Conversation.bot_id))
+                .group_by(Conversation.bot_id, bucket)
+            )
+            for row_bot_id, row_bucket, count in result.all():
+                hourly[(row_bot_id, row_bucket)]["new_conversations"] += count
+            
+            # Handoffs
+            bucket = func.strftime("%Y-%m-%d %H:00:00", HandoffEvent.created_at).label("bucket")
+            result = await db.execute(
+                select(HandoffEvent.bot_id, bucket, func.count(HandoffEvent.id))
+                .where(*bot_filter(HandoffEvent.bot_id))
+                .group_by(HandoffEvent.bot_id, bucket)
+            )
+            for row_bot_id, row_bucket, count in result.all():
+                hourly[(row_bot_id, row_bucket)]["handoffs"] += count
+            
+            # Pre-classifier decisions
+            bucket = func.strftime("%Y-%m-%d %H:00:00", RoutingDecision.created_at).label("bucket")
+            result = await db.execute(
+                select(
+                    RoutingDecision.bot_id,
+                    bucket,
+                    RoutingDecision.decision,
+                    func.count(RoutingDecision.id),
+                    func.sum(RoutingDecision.latency_us)
+                )
+                .where(*bot_filter(RoutingDecision.bot_id))
+                .group_by(RoutingDecision.bot_id, bucket, RoutingDecision.decision)
+            )
+            for row_bot_id, row_bucket, decision, count, latency_us in result.all():
+                counter = self.ROUTING_COUNTERS.get(decision)
+                if counter:
+                    hourly[(row_bot_id, row_bucket)][counter] += count
+                    hourly[(row_bot_id, row_bucket)]["routing_latency_us_total"] += int(latency_us or 0)
+            
+            # AI latency: assistant reply time minus the latest user message before it
+            prior = Message.__table__.alias("prior")
+            prior_user_at = (
+                select(func.max(prior.c.created_at))
+                .where(
+                    prior.c.conversation_id == Message.conversation_id,
+                    prior.c.role == "user",
+                    prior.c.created_at <= Message.created_at
+                )
+                .scalar_subquery()
+            )
+            latencies = (
+                select(
+                    Conversation.bot_id.label("bot_id"),
+                    func.strftime("%Y-%m-%d %H:00:00", Message.created_at).label("bucket"),
+                    (
+                        (func.julianday(Message.created_at) - func.julianday(prior_user_at)) * 86400000.0
+                    ).label("latency_ms")
+                )
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .where(Message.role == "assistant", *bot_filter(Conversation.bot_id))
+                .subquery()
+            )
+            result = await db.execute(
+                select(
+                    latencies.c.bot_id,
+                    latencies.c.bucket,
+                    func.sum(latencies.c.latency_ms),
+                    func.count(latencies.c.latency_ms)
+                ).group_by(latencies.c.bot_id, latencies.c.bucket)
+            )
+            for row_bot_id, row_bucket, total, samples in result.all():
+                if samples:
+                    hourly[(row_bot_id, row_bucket)]["ai_latency_ms_total"] += int(total)
+                    hourly[(row_bot_id, row_bucket)]["ai_latency_samples"] += samples
+            
+            # Messages moved to archive segments by retention policies
+            conversation_id, prior_user_at = None, None
+            async for segment, messages in retention_service.iter_segments(db, bot_id):
+                if segment.conversation_id != conversation_id:
+                    conversation_id, prior_user_at = segment.conversation_id, None
+                for message in messages:
+                    created_at = message["created_at"]
+                    if created_at is None:
+                        continue
+                    counters = hourly[(segment.bot_id, created_at.strftime("%Y-%m-%d %H:00:00"))]
+                    counter = self.ROLE_COUNTERS.get(message["role"])
+                    if counter:
+                        counters[counter] += 1
+                    if message["role"] == "user":
+                        prior_user_at = created_at
+                    elif message["role"] == "assistant" and prior_user_at is not None:
+                        counters["ai_latency_ms_total"] += int((created_at - prior_user_at).total_seconds() * 1000)
+                        counters["ai_latency_samples"] += 1
+            
+            # Replace the rollups
+            for model in (BotStatsHourly, BotStatsDaily):
+                await db.execute(delete(model).where(*bot_filter(model.bot_id)))
+            
+            daily: Dict[Tuple[int, date], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+            hourly_rows = []
+            for (row_bot_id, row_bucket), counters in hourly.items():
+                bucket_start = datetime.strptime(row_bucket, "%Y-%m-%d %H:%M:%S")
+                hourly_rows.append({"bot_id": row_bot_id, "bucket_start": bucket_start, **counters})
+                for name, value in counters.items():
+                    daily[(row_bot_id, bucket_start.date())][name] += value
+            
+            daily_rows = [
+                {"bot_id": row_bot_id, "bucket_start": day, **counters}
+                for (row_bot_id, day), counters in daily.items()
+            ]
+            
+            for model, rows in ((BotStatsHourly, hourly_rows), (BotStatsDaily, daily_rows)):
+                if rows:
+                    # Fill counters missing from a bucket so executemany sees uniform rows
+                    await db.execute(
+                        sqlite_insert(model),
+                        [{name: 0 for name in self.COUNTERS} | row for row in rows]
+                    )
+            
+            await db.commit()
+        
+        return len(hourly_rows)
+
+
+# Singleton instance
+analytics_service = AnalyticsService()
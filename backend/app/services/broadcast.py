@@ -0,0 +1,315 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, insert, func, or_, and_, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.bot import TelegramBot
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.broadcast import Broadcast
+from app.services.analytics import analytics_service
+from app.services.lifecycle import lifecycle
+from app.services.telegram import telegram_service
+
+settings = get_settings()
+
+
+class RateLimiter:
+    """Spaces calls `1 / rate` seconds apart; `pause` holds every caller back, e.g. after a 429."""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._paused_until = 0.0
+    
+    async def wait(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if self._paused_until <= time.monotonic():
+                return
+    
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class BroadcastService:
+    """
+    Sends an owner announcement to every active conversation of a bot.
+    
+    `create` records the job; `run` reads the target conversations in
+    id order, `batch_size` at a time, and sends to them through the
+    shared Bot API client: `concurrency` sends in flight, spaced by a
+    limiter to `rate` messages per second (Telegram allows about 30 per
+    bot) and paused for as long as a 429 asks. After each batch the
+    owner messages of the successful sends are inserted in one statement
+    and the progress is committed, which is also the heartbeat.
+    
+    A conversation that already has the announcement from this job is
+    skipped, so a job resumed after a shutdown (`resume`) or a crash does
+    not send twice what it recorded. Cancelling takes effect between
+    batches.
+    """
+    
+    STALE_AFTER = timedelta(seconds=60)
+    MAX_ATTEMPTS = 3
+    
+    def __init__(self, rate: float = 25.0, concurrency: int = 5, batch_size: int = 100):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+    
+    async def active_job(self, db: AsyncSession, bot_id: int) -> Optional[Broadcast]:
+        result = await db.execute(
+            select(Broadcast)
+            .where(Broadcast.bot_id == bot_id, Broadcast.status.in_(("pending", "running")))
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    def create(self, db: AsyncSession, bot: TelegramBot, user_id: int, content: str) -> Broadcast:
+        """Queue a broadcast; committed by the caller, then `start` it."""
+        job = Broadcast(bot_id=bot.id, user_id=user_id, content=content, status="pending")
+        db.add(job)
+        return job
+    
+    def start(self, job_id: int) -> None:
+        lifecycle.spawn(self.run(job_id))
+    
+    async def _claim(self, db: AsyncSession, job_id: int) -> bool:
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == job_id,
+                or_(
+                    Broadcast.status == "pending",
+                    and_(Broadcast.status == "running", Broadcast.updated_at < now - self.STALE_AFTER)
+                )
+            )
+            .values(status="running", updated_at=now)
+        )
+        await db.commit()
+        return result.rowcount == 1
+    
+    def _targets(self, job: Broadcast):
+        """Active conversations of the bot that existed when the job was created and lack its message."""
+        already_sent = exists().where(
+            Message.conversation_id == Conversation.id,
+            Message.role == "owner",
+            Message.created_at >= job.created_at,
+            Message.content == job.content
+        )
+        return and_(
+            Conversation.bot_id == job.bot_id,
+            Conversation.is_active == True,
+            Conversation.created_at <= job.created_at,
+            ~already_sent
+        )
+    
+    async def _send_one(self, token: str, chat_id: int, text: str, limiter: RateLimiter) -> Tuple[Optional[int], Optional[str]]:
+        """(telegram message id, None) once sent, or (None, error)."""
+        error = None
+        for attempt in range(self.MAX_ATTEMPTS):
+            await limiter.wait()
+            data = await telegram_service.send_message_result(token, chat_id, text)
+            if data.get("ok"):
+                return data["result"].get("message_id"), None
+            
+            error = data.get("description") or "sendMessage failed"
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if data.get("error_code") == 429 and retry_after:
+                limiter.pause(retry_after)
+            elif data.get("error_code") is None and attempt + 1 < self.MAX_ATTEMPTS:
+                await asyncio.sleep(1.0)  # Network error
+            else:
+                break  # Blocked by the user, chat not found...
+        return None, error
+    
+    async def _send_batch(
+        self,
+        token: str,
+        text: str,
+        rows: List[Any],
+        limiter: RateLimiter,
+        outcomes: Dict[int, Tuple[Optional[int], Optional[str], datetime]]
+    ) -> None:
+        pending = iter(rows)
+        
+        async def sender():
+            # The workers share one iterator, so conversations go out in id order
+            for row in pending:
+                message_id, error = await self._send_one(token, row.telegram_chat_id, text, limiter)
+                outcomes[row.id] = (message_id, error, datetime.utcnow())
+        
+        await asyncio.gather(*(sender() for _ in range(self.concurrency)))
+    
+    async def _save_batch(
+        self,
+        db: AsyncSession,
+        job: Broadcast,
+        rows: List[Any],
+        outcomes: Dict[int, Tuple[Optional[int], Optional[str], datetime]]
+    ) -> None:
+        sent = [
+            {
+                "conversation_id": conversation_id,
+                "role": "owner",
+                "content": job.content,
+                "telegram_message_id": message_id,
+                "created_at": at,
+            }
+            for conversation_id, (message_id, error, at) in outcomes.items()
+            if error is None
+        ]
+        if sent:
+            await db.execute(insert(Message), sent)
+            await analytics_service.record_message(db, job.bot_id, "owner", count=len(sent))
+        errors = [error for _, error, _ in outcomes.values() if error is not None]
+        if errors:
+            job.last_error = errors[-1][:500]
+        
+        if len(outcomes) == len(rows):
+            job.cursor = rows[-1].id
+        job.sent += len(sent)
+        job.failed += len(errors)
+        job.updated_at = datetime.utcnow()
+        await db.commit()
+    
+    async def _stop_reason(self, db: AsyncSession, job_id: int) -> Optional[str]:
+        """"cancelled" by the owner, "deleted" with the bot, or None to go on."""
+        result = await db.execute(
+            select(Broadcast.status, TelegramBot.deleted_at)
+            .join(TelegramBot, TelegramBot.id == Broadcast.bot_id)
+            .where(Broadcast.id == job_id)
+        )
+        row = result.first()
+        if row is None or row.deleted_at is not None:
+            return "deleted"
+        return "cancelled" if row.status == "cancelled" else None
+    
+    async def run(self, job_id: int) -> None:
+        async with async_session_maker() as db:
+            if not await self._claim(db, job_id):
+                return  # Finished, cancelled, or another process is running it
+            
+            job = await db.get(Broadcast, job_id)
+            try:
+                token = await db.scalar(
+                    select(TelegramBot.token).where(TelegramBot.id == job.bot_id, TelegramBot.deleted_at.is_(None))
+                )
+                if token is None:
+                    raise RuntimeError("The bot was deleted")
+                
+                targets = self._targets(job)
+                if job.total is None:
+                    job.total = await db.scalar(select(func.count()).select_from(Conversation).where(targets))
+                    await db.commit()
+                
+                limiter = RateLimiter(self.rate)
+                while True:
+                    result = await db.execute(
+                        select(Conversation.id, Conversation.telegram_chat_id)
+                        .where(targets, Conversation.id > job.cursor)
+                        .order_by(Conversation.id)
+                        .limit(self.batch_size)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        break
+                    
+                    outcomes: Dict[int, Tuple[Optional[int], Optional[str], datetime]] = {}
+                    try:
+                        await self._send_batch(token, job.content, rows, limiter, outcomes)
+                    finally:
+                        # Also when cancelled by a shutdown: what went out is recorded
+                        await self._save_batch(db, job, rows, outcomes)
+                    
+                    reason = await self._stop_reason(db, job_id)
+                    if reason == "deleted":
+                        return  # The bot deletion removes the job
+                    if reason == "cancelled":
+                        job.status = "cancelled"
+                        job.finished_at = datetime.utcnow()
+                        await db.commit()
+                        return
+                
+                job.status = "done"
+                job.finished_at = job.updated_at = datetime.utcnow()
+                await db.commit()
+            except asyncio.CancelledError:
+                # Shutdown: the next startup picks the job up where it stopped
+                job.status = "pending"
+                await db.commit()
+                raise
+            except Exception as e:
+                print(f"Error broadcasting {job_id}: {e}")
+                await db.rollback()
+                job.status = "failed"
+                job.error = str(e)
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+    
+    def cancel(self, job: Broadcast) -> None:
+        """Stop a job after its current batch; committed by the caller."""
+        if job.status == "pending":
+            job.finished_at = datetime.utcnow()
+        if job.status in ("pending", "running"):
+            job.status = "cancelled"
+    
+    async def resume(self) -> int:
+        """Restart broadcasts that were pending or whose runner stopped."""
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Broadcast.id).where(
+                    or_(
+                        Broadcast.status == "pending",
+                        and_(
+                            Broadcast.status == "running",
+                            Broadcast.updated_at < datetime.utcnow() - self.STALE_AFTER
+                        )
+                    )
+                )
+            )
+            job_ids = result.scalars().all()
+        
+        for job_id in job_ids:
+            self.start(job_id)
+        return len(job_ids)
+    
+    async def list_jobs(self, db: AsyncSession, bot_id: int, user_id: int, limit: int = 20) -> List[Broadcast]:
+        result = await db.execute(
+            select(Broadcast)
+            .where(Broadcast.bot_id == bot_id, Broadcast.user_id == user_id)
+            .order_by(Broadcast.id.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    
+    async def get_job(self, db: AsyncSession, bot_id: int, job_id: int, user_id: int) -> Optional[Broadcast]:
+        result = await db.execute(
+            select(Broadcast).where(
+                Broadcast.id == job_id,
+                Broadcast.bot_id == bot_id,
+                Broadcast.user_id == user_id
+            )
+        )
+        return result.scalar_one_or_none()
+
+
+# Singleton instance
+broadcast_service = BroadcastService(
+    rate=settings.broadcast_rate_per_second,
+    concurrency=settings.broadcast_concurrency,
+    batch_size=settings.broadcast_batch_size
+)
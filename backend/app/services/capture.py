@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.serialization import dumps
+
+settings = get_settings()
+
+
+class UpdateRecorder:
+    """
+    Opt-in capture of the raw updates reaching the Telegram webhook, for
+    replaying real traffic against a build (`python -m loadtest.replay`).
+    
+    Each update becomes one JSON line: arrival time `t` (Unix seconds),
+    `bot`, a hash standing in for the bot token, and the update as
+    Telegram sent it. Lines are buffered and appended every
+    `flush_interval` seconds as one gzip member, so several processes
+    can share a file and `gzip.open` reads it whole. Recording stops
+    once the file reaches `max_bytes`.
+    
+    Captures hold customer messages: keep them like the database.
+    """
+    
+    def __init__(self, path: str = "./captures/updates.jsonl.gz", max_bytes: int = 500_000_000, flush_interval: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.enabled = False
+        self._buffer: List[bytes] = []
+        self._write_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.full = False
+    
+    @staticmethod
+    def bot_key(token: str) -> str:
+        """Stable per bot and across captures, without revealing the token."""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+    
+    def enable(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.full = False
+        self.enabled = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def disable(self) -> None:
+        """Stop recording and write what is buffered."""
+        self.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    def record(self, bot_token: str, update: Any) -> None:
+        if not self.enabled:
+            return
+        if self.full:
+            self.dropped += 1
+            return
+        self._buffer.append(dumps({"t": round(time.time(), 3), "bot": self.bot_key(bot_token), "update": update}) + b"\n")
+        self.recorded += 1
+    
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, lines)
+    
+    def _write(self, lines: List[bytes]) -> None:
+        member = gzip.compress(b"".join(lines))
+        try:
+            with self._write_lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(member) > self.max_bytes:
+                    self.full = True
+                    self.dropped += len(lines)
+                    return
+                with open(self.path, "ab") as f:
+                    f.write(member)
+        except OSError as e:
+            self.dropped += len(lines)
+            print(f"Error writing update capture: {e}")
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing update capture: {e}")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        size = None
+        if os.path.exists(self.path):
+            size = os.path.getsize(self.path)
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "full": self.full,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+        }
+
+
+# Singleton instance
+update_recorder = UpdateRecorder(
+    path=settings.capture_path,
+    max_bytes=settings.capture_max_bytes
+)
@@ -0,0 +1,129 @@
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker.
+    
+    CLOSED: calls pass; outcomes are kept for a sliding time window. Once
+    the window holds at least `minimum_calls` and the failure rate reaches
+    `failure_rate_threshold`, the circuit opens.
+    OPEN: calls are rejected immediately for `open_seconds`.
+    HALF_OPEN: up to `half_open_max_calls` probe calls pass. A success
+    closes the circuit, a failure opens it again.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_seconds: float = 30.0,
+        minimum_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        
+        self._state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self.times_opened = 0
+    
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+    
+    @property
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+    
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+    
+    def failure_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / len(self._outcomes)
+    
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        return False
+    
+    def would_allow(self) -> bool:
+        """Whether a call made now would pass, without taking a probe slot."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls)
+    
+    def check(self) -> None:
+        """Raise CircuitOpenError if the call may not proceed."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after)
+    
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+    
+    def record_success(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, True))
+        self._trim(now)
+    
+    def record_failure(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._open()
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, False))
+        self._trim(now)
+        if len(self._outcomes) >= self.minimum_calls and self.failure_rate() >= self.failure_rate_threshold:
+            self._open()
+    
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "retry_after": round(self.retry_after, 1),
+            "times_opened": self.times_opened,
+        }
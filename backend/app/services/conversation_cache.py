@@ -0,0 +1,186 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import get_settings
+from app.models.conversation import Conversation
+from app.services.coordination import CoordinationStore, coordination_store
+
+settings = get_settings()
+
+
+class ConversationState:
+    """The columns of a conversation the webhook path needs."""
+    
+    __slots__ = ("id", "bot_id", "telegram_chat_id", "is_ai_controlled")
+    
+    def __init__(self, id: int, bot_id: int, telegram_chat_id: int, is_ai_controlled: bool):
+        self.id = id
+        self.bot_id = bot_id
+        self.telegram_chat_id = telegram_chat_id
+        self.is_ai_controlled = is_ai_controlled
+    
+    @classmethod
+    def from_conversation(cls, conversation: Conversation) -> "ConversationState":
+        return cls(
+            conversation.id,
+            conversation.bot_id,
+            conversation.telegram_chat_id,
+            bool(conversation.is_ai_controlled)
+        )
+    
+    def to_conversation(self) -> Conversation:
+        """
+        A detached Conversation holding only these columns. Added to a
+        session it can be updated without being loaded first; its other
+        columns must not be read.
+        """
+        conversation = Conversation(
+            id=self.id,
+            bot_id=self.bot_id,
+            telegram_chat_id=self.telegram_chat_id,
+            is_ai_controlled=self.is_ai_controlled
+        )
+        make_transient_to_detached(conversation)
+        return conversation
+
+
+class ConversationStateCache:
+    """
+    Bounded LRU of conversation state for active chats, keyed by
+    (bot_id, telegram_chat_id), so a steady-state message needs no
+    conversations SELECT. A None entry records that the chat has no
+    conversation yet.
+    
+    Writes of the cached columns go through `store`, which updates the
+    local entry and, with a shared store (multi-process mode), publishes
+    an invalidation the other processes apply in `sync`; `forget_bot`
+    does the same for all chats of a deleted bot. A SELECT result
+    is only remembered if no write happened while it ran (`generation`).
+    """
+    
+    CHANNEL = "conversation_state"
+    
+    def __init__(
+        self,
+        max_size: int = 10000,
+        shared_store: Optional[CoordinationStore] = None,
+        event_retention: float = 3600.0
+    ):
+        self.max_size = max_size
+        self.shared_store = shared_store
+        self.event_retention = event_retention
+        self.origin = str(os.getpid())
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple[int, int], Optional[ConversationState]]" = OrderedDict()
+        self._cursor: Optional[int] = None
+        self._synced_at = 0.0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def lookup(self, bot_id: int, chat_id: int) -> Tuple[bool, Optional[ConversationState]]:
+        """(found, state); found with a None state means the chat has no conversation."""
+        key = (bot_id, chat_id)
+        if key not in self._entries:
+            self.misses += 1
+            return False, None
+        
+        self._entries.move_to_end(key)
+        state = self._entries[key]
+        if state is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, state
+    
+    def _put(self, key: Tuple[int, int], state: Optional[ConversationState]) -> None:
+        self._entries[key] = state
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def remember(self, bot_id: int, chat_id: int, state: Optional[ConversationState], generation: int) -> None:
+        """Cache what a SELECT started at `generation` found, unless a write came in meanwhile."""
+        if generation == self.generation:
+            self._put((bot_id, chat_id), state)
+    
+    async def store(self, state: ConversationState) -> None:
+        """Write-through after the conversation row was created or changed and committed."""
+        self.generation += 1
+        self._put((state.bot_id, state.telegram_chat_id), state)
+        if self.shared_store is not None:
+            await self.shared_store.publish(
+                self.CHANNEL,
+                f"{self.origin}:{state.bot_id}:{state.telegram_chat_id}",
+                keep_seconds=self.event_retention
+            )
+    
+    def _drop_bot(self, bot_id: int) -> int:
+        keys = [key for key in self._entries if key[0] == bot_id]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+    
+    async def forget_bot(self, bot_id: int) -> None:
+        """Drop every chat of a deleted bot, here and (with a shared store) in the other processes."""
+        self.generation += 1
+        self._drop_bot(bot_id)
+        if self.shared_store is not None:
+            await self.shared_store.publish(
+                self.CHANNEL,
+                f"{self.origin}:{bot_id}:*",
+                keep_seconds=self.event_retention
+            )
+    
+    async def sync(self) -> None:
+        """Apply invalidations published by other processes since the last call."""
+        if self.shared_store is None:
+            return
+        
+        now = time.monotonic()
+        if self._cursor is None or now - self._synced_at > self.event_retention / 2:
+            # First call, or events may have been pruned since the last one
+            self.generation += 1
+            self._entries.clear()
+            self._cursor = await self.shared_store.last_event_id()
+        else:
+            for event_id, payload in await self.shared_store.events_since(self.CHANNEL, self._cursor):
+                self._cursor = event_id
+                origin, bot_id, chat_id = payload.split(":")
+                if origin == self.origin:
+                    continue
+                self.generation += 1
+                if chat_id == "*":
+                    self.invalidations += self._drop_bot(int(bot_id))
+                elif self._entries.pop((int(bot_id), int(chat_id)), False) is not False:
+                    self.invalidations += 1
+        self._synced_at = now
+    
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Singleton instance
+conversation_cache = ConversationStateCache(
+    max_size=settings.conversation_cache_size,
+    shared_store=coordination_store if settings.app_role != "all" else None
+)
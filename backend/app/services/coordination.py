@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class CoordinationStore:
+    """
+    Small SQLite file shared by the processes of one deployment.
+    
+    Holds worker leases (who is alive, used for shard assignment), a
+    key/value table with expiry for state every process should share
+    (e.g. the GigaChat access token), named locks and a short-lived event
+    log processes poll for invalidations. Every operation is
+    one short transaction on a separate connection, run in a thread so
+    the event loop never blocks on the file lock.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    worker_id TEXT PRIMARY KEY,
+                    role TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    started_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS kv (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+            """)
+            self._initialized = True
+        return conn
+    
+    def _execute(self, sql: str, params: tuple = ()) -> Tuple[List[tuple], int]:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            return cursor.fetchall(), cursor.rowcount
+        finally:
+            conn.close()
+    
+    async def _run(self, sql: str, params: tuple = ()) -> Tuple[List[tuple], int]:
+        return await asyncio.to_thread(self._execute, sql, params)
+    
+    async def heartbeat(self, worker_id: str, role: str, ttl: float) -> None:
+        """Create or extend the lease of a worker."""
+        now = time.time()
+        await self._run(
+            "INSERT INTO leases (worker_id, role, expires_at, started_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at",
+            (worker_id, role, now + ttl, now)
+        )
+    
+    async def release(self, worker_id: str) -> None:
+        await self._run("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+    
+    async def live_workers(self, role: str) -> List[str]:
+        """Workers of a role with an unexpired lease, sorted by id."""
+        rows, _ = await self._run(
+            "SELECT worker_id FROM leases WHERE role = ? AND expires_at > ? ORDER BY worker_id",
+            (role, time.time())
+        )
+        return [row[0] for row in rows]
+    
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) if the key exists and has not expired."""
+        rows, _ = await self._run(
+            "SELECT value, expires_at FROM kv WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        )
+        return rows[0] if rows else None
+    
+    async def put(self, key: str, value: str, expires_at: float) -> None:
+        await self._run(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at)
+        )
+    
+    async def try_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """Take a named lock unless another owner holds an unexpired one."""
+        now = time.time()
+        _, changed = await self._run(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at <= ? OR kv.value = excluded.value",
+            (f"lock:{name}", owner, now + ttl, now)
+        )
+        return changed > 0
+    
+    async def unlock(self, name: str, owner: str) -> None:
+        await self._run("DELETE FROM kv WHERE key = ? AND value = ?", (f"lock:{name}", owner))
+    
+    async def publish(self, channel: str, payload: str, keep_seconds: float = 3600.0) -> None:
+        """Append an event for other processes; events older than `keep_seconds` are pruned."""
+        now = time.time()
+        await self._run("DELETE FROM events WHERE created_at < ?", (now - keep_seconds,))
+        await self._run(
+            "INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)",
+            (channel, payload, now)
+        )
+    
+    async def events_since(self, channel: str, after_id: int, limit: int = 1000) -> List[Tuple[int, str]]:
+        """(id, payload) of the channel's events after `after_id`, oldest first."""
+        rows, _ = await self._run(
+            "SELECT id, payload FROM events WHERE channel = ? AND id > ? ORDER BY id LIMIT ?",
+            (channel, after_id, limit)
+        )
+        return rows
+    
+    async def last_event_id(self) -> int:
+        rows, _ = await self._run("SELECT COALESCE(MAX(id), 0) FROM events")
+        return rows[0][0]
+
+
+# Singleton instance
+coordination_store = CoordinationStore(settings.coordination_db_path)
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.bot import TelegramBot
+
+settings = get_settings()
+
+
+class UpdateDeduplicator:
+    """
+    Drops Telegram webhook retries before any work is scheduled.
+    
+    Recently accepted (bot token, update_id) pairs are kept in a bounded
+    LRU window. Beyond the window, the per-bot high-water mark persisted in
+    `telegram_bots.last_update_id` rejects stale redeliveries, e.g. after a
+    restart. Updates just below the mark are still let through because
+    Telegram may deliver over parallel connections out of order; those are
+    caught by the unique (conversation_id, telegram_message_id) guard.
+    
+    The mark expires HIGH_WATER_TTL after it was last raised: Telegram
+    drops undelivered updates after a day, so nothing older can be a
+    redelivery, and after a week without updates it restarts update_id
+    from a random value that may lie below the mark.
+    """
+    
+    # Updates this far below the high-water mark are always duplicates
+    HIGH_WATER_MARGIN = 100
+    HIGH_WATER_TTL = timedelta(hours=24)
+    
+    def __init__(self, window_size: int = 10000, max_bots: int = 10000):
+        self.window_size = window_size
+        self.max_bots = max_bots
+        self._window: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        # Token of a known bot -> (update_id, when it was raised), None
+        # without updates yet; least recently used first
+        self._high_water: "OrderedDict[str, Optional[Tuple[int, datetime]]]" = OrderedDict()
+        self.duplicates = 0
+    
+    @staticmethod
+    def _mark(update_id: Optional[int], at: Optional[datetime]) -> Optional[Tuple[int, datetime]]:
+        if update_id is None:
+            return None
+        return update_id, at or datetime.min
+    
+    def _remember(self, bot_token: str, mark: Optional[Tuple[int, datetime]]) -> None:
+        self._high_water[bot_token] = mark
+        self._high_water.move_to_end(bot_token)
+        if len(self._high_water) > self.max_bots:
+            self._high_water.popitem(last=False)
+    
+    async def _load_high_water(self, bot_token: str) -> Tuple[bool, Optional[Tuple[int, datetime]]]:
+        """(whether the token belongs to a bot, its mark); only bots are cached."""
+        if bot_token in self._high_water:
+            self._high_water.move_to_end(bot_token)
+            return True, self._high_water[bot_token]
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(TelegramBot.last_update_id, TelegramBot.last_update_at).where(TelegramBot.token == bot_token)
+            )
+            row = result.first()
+        if row is None:
+            return False, None
+        self._remember(bot_token, self._mark(*row))
+        return True, self._high_water[bot_token]
+    
+    async def accept(self, bot_token: str, update_id: int) -> bool:
+        """Return True if the update is new and mark it as seen."""
+        key = (bot_token, update_id)
+        if key in self._window:
+            self._window.move_to_end(key)
+            self.duplicates += 1
+            return False
+        
+        now = datetime.utcnow()
+        known, high_water = await self._load_high_water(bot_token)
+        if not known:
+            return True  # No bot: nothing to remember, processing drops it
+        expired = high_water is not None and high_water[1] < now - self.HIGH_WATER_TTL
+        if high_water is not None and not expired and update_id <= high_water[0] - self.HIGH_WATER_MARGIN:
+            self.duplicates += 1
+            return False
+        
+        self._window[key] = None
+        if len(self._window) > self.window_size:
+            self._window.popitem(last=False)
+        
+        if high_water is None or expired or update_id > high_water[0]:
+            self._remember(bot_token, (update_id, now))
+        return True
+    
+    def forget(self, bot_token: str, update_id: int) -> None:
+        """Un-see an update that could not be handed off, so Telegram's redelivery is accepted."""
+        self._window.pop((bot_token, update_id), None)
+    
+    async def persist_high_water(self, db: AsyncSession, bot_id: int, update_id: int) -> None:
+        """Raise the stored high-water mark, or replace an expired one; committed with the caller's transaction."""
+        now = datetime.utcnow()
+        await db.execute(
+            update(TelegramBot)
+            .where(
+                TelegramBot.id == bot_id,
+                or_(
+                    TelegramBot.last_update_id.is_(None),
+                    TelegramBot.last_update_id < update_id,
+                    TelegramBot.last_update_at.is_(None),
+                    TelegramBot.last_update_at < now - self.HIGH_WATER_TTL
+                )
+            )
+            # Bookkeeping only: keep updated_at, which tracks edits by the owner
+            .values(last_update_id=update_id, last_update_at=now, updated_at=TelegramBot.updated_at)
+        )
+    
+    async def prime(self, db: AsyncSession) -> int:
+        """Load the high-water marks of all active bots in one query."""
+        result = await db.execute(
+            select(TelegramBot.token, TelegramBot.last_update_id, TelegramBot.last_update_at)
+            .where(TelegramBot.is_active == True)
+        )
+        rows = result.all()
+        for token, last_update_id, last_update_at in rows:
+            if token not in self._high_water:
+                self._remember(token, self._mark(last_update_id, last_update_at))
+        return len(rows)
+    
+    def forget_bot(self, bot_token: str) -> None:
+        self._high_water.pop(bot_token, None)
+
+
+# Singleton instance
+update_deduplicator = UpdateDeduplicator(window_size=settings.update_dedup_window)
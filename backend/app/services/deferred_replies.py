@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+@dataclass
+class DeferredReply:
+    bot_id: int
+    conversation_id: int
+    chat_id: int
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class DeferredReplyQueue:
+    """
+    Conversations waiting for an AI reply while the LLM is unavailable.
+    
+    One entry per conversation: the retry answers with the full history,
+    so later messages of the same chat are covered by the same entry.
+    A retry that defers its conversation again ends the pass, keeping
+    the entry's age, until the next poll.
+    """
+    
+    def __init__(self, max_size: int = 10000, max_age_seconds: float = 3600, poll_interval: float = 1.0):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self.poll_interval = poll_interval
+        self._pending: "OrderedDict[int, DeferredReply]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+    
+    def is_pending(self, conversation_id: int) -> bool:
+        return conversation_id in self._pending
+    
+    def defer(self, bot_id: int, conversation_id: int, chat_id: int) -> bool:
+        """Queue a conversation for retry. Returns False if it was already queued."""
+        if conversation_id in self._pending:
+            return False
+        self._pending[conversation_id] = DeferredReply(bot_id, conversation_id, chat_id)
+        if len(self._pending) > self.max_size:
+            self._pending.popitem(last=False)
+            self.expired += 1
+        return True
+    
+    def start(
+        self,
+        handler: Callable[[DeferredReply], Awaitable[None]],
+        is_ready: Callable[[], bool]
+    ) -> None:
+        """Start retrying queued conversations whenever `is_ready()` is true."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(handler, is_ready))
+    
+    def take_all(self) -> List[DeferredReply]:
+        """Remove and return every queued conversation, oldest first."""
+        items = list(self._pending.values())
+        self._pending.clear()
+        return items
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self, handler, is_ready) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            while self._pending and is_ready():
+                _, item = self._pending.popitem(last=False)
+                if time.monotonic() - item.queued_at > self.max_age_seconds:
+                    self.expired += 1
+                    continue
+                try:
+                    await handler(item)
+                    requeued = self._pending.get(item.conversation_id)
+                    if requeued is not None:
+                        # Still unavailable (e.g. another call holds the
+                        # half-open probe): age from the first deferral
+                        requeued.queued_at = item.queued_at
+                        self._pending.move_to_end(item.conversation_id, last=False)
+                        break
+                except asyncio.CancelledError:
+                    # Stopped mid-retry: keep the conversation for take_all
+                    self._pending[item.conversation_id] = item
+                    self._pending.move_to_end(item.conversation_id, last=False)
+                    raise
+                except Exception as e:
+                    print(f"Error retrying deferred reply: {e}")
+
+
+# Singleton instance
+deferred_replies = DeferredReplyQueue(
+    max_size=settings.deferred_reply_max_size,
+    max_age_seconds=settings.deferred_reply_max_age_seconds
+)
@@ -0,0 +1,190 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.bot import TelegramBot
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.analytics import HandoffEvent
+from app.models.routing import RoutingDecision
+from app.models.deletion import BotDeletion
+from app.models.retention import ArchiveSegment
+from app.models.media import MessageAttachment
+from app.models.broadcast import Broadcast
+from app.services.analytics import analytics_service
+from app.services.knowledge import knowledge_service
+from app.services.retention import retention_service
+from app.services.media import media_service
+from app.services.lifecycle import lifecycle
+from app.services.conversation_cache import conversation_cache
+
+settings = get_settings()
+
+
+class BotDeletionService:
+    """
+    Deletes a bot and its history in bounded batches.
+    
+    `mark` hides the bot and frees its token at once; `run` then removes
+    rows in short transactions so the SQLite write lock is never held for
+    long, recording progress on the BotDeletion row. A job interrupted by
+    a shutdown goes back to pending, and one whose heartbeat is older than
+    STALE_AFTER (e.g. the process crashed) is picked up again by `resume`.
+    """
+    
+    STALE_AFTER = timedelta(seconds=60)
+    
+    def __init__(self, batch_size: int = 2000, batch_pause: float = 0.05):
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+    
+    def _steps(self, bot_id: int) -> List[tuple]:
+        """(name, model, condition) in dependency order: children first."""
+        conversation_ids = select(Conversation.id).where(Conversation.bot_id == bot_id)
+        return [
+            ("message_attachments", MessageAttachment, MessageAttachment.bot_id == bot_id),
+            ("broadcasts", Broadcast, Broadcast.bot_id == bot_id),
+            ("messages", Message, Message.conversation_id.in_(conversation_ids)),
+            ("routing_decisions", RoutingDecision, RoutingDecision.bot_id == bot_id),
+            ("handoff_events", HandoffEvent, HandoffEvent.bot_id == bot_id),
+            ("archive_segments", ArchiveSegment, ArchiveSegment.bot_id == bot_id),
+            ("conversations", Conversation, Conversation.bot_id == bot_id),
+        ]
+    
+    async def mark(self, db: AsyncSession, bot: TelegramBot) -> BotDeletion:
+        """Hide the bot and queue its deletion; committed by the caller."""
+        job = BotDeletion(
+            bot_id=bot.id,
+            user_id=bot.user_id,
+            bot_name=bot.name,
+            status="pending"
+        )
+        db.add(job)
+        
+        bot.deleted_at = datetime.utcnow()
+        bot.is_active = False
+        # Free the unique token so the owner can add the same bot again
+        bot.token = f"deleted:{bot.id}:{uuid.uuid4().hex}"
+        return job
+    
+    def start(self, job_id: int) -> None:
+        lifecycle.spawn(self.run(job_id))
+    
+    async def _claim(self, db: AsyncSession, job_id: int) -> bool:
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(BotDeletion)
+            .where(
+                BotDeletion.id == job_id,
+                or_(
+                    BotDeletion.status == "pending",
+                    and_(BotDeletion.status == "running", BotDeletion.updated_at < now - self.STALE_AFTER)
+                )
+            )
+            .values(status="running", updated_at=now)
+        )
+        await db.commit()
+        return result.rowcount == 1
+    
+    async def _count(self, db: AsyncSession, bot_id: int) -> int:
+        total = 1  # The bot row
+        for _, model, condition in self._steps(bot_id):
+            result = await db.execute(select(func.count()).select_from(model).where(condition))
+            total += result.scalar() or 0
+        return total
+    
+    async def run(self, job_id: int) -> None:
+        async with async_session_maker() as db:
+            if not await self._claim(db, job_id):
+                return  # Finished, or another process is running it
+            
+            job = await db.get(BotDeletion, job_id)
+            try:
+                if job.total_rows is None:
+                    job.total_rows = await self._count(db, job.bot_id)
+                    await db.commit()
+                
+                for name, model, condition in self._steps(job.bot_id):
+                    job.step = name
+                    while True:
+                        batch = select(model.id).where(condition).limit(self.batch_size)
+                        result = await db.execute(delete(model).where(model.id.in_(batch)))
+                        job.deleted_rows += result.rowcount
+                        job.updated_at = datetime.utcnow()
+                        await db.commit()
+                        if result.rowcount < self.batch_size:
+                            break
+                        await asyncio.sleep(self.batch_pause)
+                
+                # Rollups, knowledge base, archive and media files and the bot row are small
+                job.step = "bot"
+                await analytics_service.purge_bot(db, job.bot_id)
+                await knowledge_service.purge_bot(db, job.bot_id)
+                await retention_service.purge_bot(db, job.bot_id)
+                await media_service.purge_unreferenced(db)
+                result = await db.execute(delete(TelegramBot).where(TelegramBot.id == job.bot_id))
+                job.deleted_rows += result.rowcount
+                job.status = "done"
+                job.step = None
+                job.finished_at = job.updated_at = datetime.utcnow()
+                await db.commit()
+                # A new bot may get this id: no process may keep the old chats
+                await conversation_cache.forget_bot(job.bot_id)
+            except asyncio.CancelledError:
+                # Shutdown: the next startup picks the job up where it stopped
+                job.status = "pending"
+                await db.commit()
+                raise
+            except Exception as e:
+                print(f"Error deleting bot {job.bot_id}: {e}")
+                await db.rollback()
+                job.status = "failed"
+                job.error = str(e)
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+    
+    async def resume(self) -> int:
+        """Restart jobs that were pending or whose runner stopped."""
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(BotDeletion.id).where(
+                    or_(
+                        BotDeletion.status == "pending",
+                        and_(
+                            BotDeletion.status == "running",
+                            BotDeletion.updated_at < datetime.utcnow() - self.STALE_AFTER
+                        )
+                    )
+                )
+            )
+            job_ids = result.scalars().all()
+        
+        for job_id in job_ids:
+            self.start(job_id)
+        return len(job_ids)
+    
+    def retry(self, job: BotDeletion) -> None:
+        """Requeue a failed job; committed by the caller, then `start` it."""
+        job.status = "pending"
+        job.error = None
+    
+    async def get_job(self, db: AsyncSession, bot_id: int, user_id: int) -> Optional[BotDeletion]:
+        result = await db.execute(
+            select(BotDeletion)
+            .where(BotDeletion.bot_id == bot_id, BotDeletion.user_id == user_id)
+            .order_by(BotDeletion.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+
+# Singleton instance
+bot_deletion_service = BotDeletionService(
+    batch_size=settings.deletion_batch_size,
+    batch_pause=settings.deletion_batch_pause
+)
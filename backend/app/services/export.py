@@ -0,0 +1,137 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.serialization import dumps
+from app.services.retention import retention_service
+
+
+class ExportService:
+    """
+    Streams a bot's conversation history as NDJSON or CSV.
+    
+    Messages moved to the archive by retention come first, read from
+    their segments, then the live ones; each part is ordered by
+    conversation and time.
+    """
+    
+    # Rows fetched from the DB cursor per round trip
+    CHUNK_SIZE = 1000
+    
+    COLUMNS = [
+        "conversation_id",
+        "telegram_chat_id",
+        "telegram_username",
+        "telegram_first_name",
+        "telegram_last_name",
+        "message_id",
+        "role",
+        "content",
+        "telegram_message_id",
+        "created_at",
+    ]
+    
+    def _build_query(self, bot_id: int, updated_since: Optional[datetime]):
+        query = (
+            select(
+                Message.conversation_id,
+                Conversation.telegram_chat_id,
+                Conversation.telegram_username,
+                Conversation.telegram_first_name,
+                Conversation.telegram_last_name,
+                Message.id.label("message_id"),
+                Message.role,
+                Message.content,
+                Message.telegram_message_id,
+                Message.created_at,
+            )
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .where(Conversation.bot_id == bot_id)
+            .order_by(Message.conversation_id, Message.created_at, Message.id)
+        )
+        if updated_since is not None:
+            query = query.where(Message.created_at > updated_since)
+        return query
+    
+    async def _iter_archived(self, db: AsyncSession, bot_id: int, updated_since: Optional[datetime]):
+        """Yield the archived messages of each segment as rows in COLUMNS order."""
+        conversation_id, conversation = None, None
+        async for segment, messages in retention_service.iter_segments(db, bot_id, created_after=updated_since):
+            if segment.conversation_id != conversation_id:
+                conversation_id = segment.conversation_id
+                result = await db.execute(
+                    select(
+                        Conversation.telegram_chat_id,
+                        Conversation.telegram_username,
+                        Conversation.telegram_first_name,
+                        Conversation.telegram_last_name,
+                    ).where(Conversation.id == conversation_id)
+                )
+                conversation = tuple(result.one_or_none() or (None, None, None, None))
+            yield [
+                (
+                    conversation_id,
+                    *conversation,
+                    message["id"],
+                    message["role"],
+                    message["content"],
+                    message["telegram_message_id"],
+                    message["created_at"],
+                )
+                for message in messages
+                if updated_since is None or (message["created_at"] and message["created_at"] > updated_since)
+            ]
+    
+    async def _iter_chunks(self, bot_id: int, updated_since: Optional[datetime]):
+        """Yield lists of rows in COLUMNS order: archived ones, then live ones through a server-side cursor."""
+        # The request session is gone by the time the body streams,
+        # so the export runs in its own session.
+        async with async_session_maker() as db:
+            async for rows in self._iter_archived(db, bot_id, updated_since):
+                if rows:
+                    yield rows
+            
+            result = await db.stream(
+                self._build_query(bot_id, updated_since).execution_options(
+                    yield_per=self.CHUNK_SIZE
+                )
+            )
+            async for partition in result.partitions():
+                yield partition
+    
+    @staticmethod
+    def _format_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+    
+    async def iter_ndjson(self, bot_id: int, updated_since: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        async for rows in self._iter_chunks(bot_id, updated_since):
+            # orjson writes datetimes as ISO 8601 itself
+            yield b"".join(dumps(dict(zip(self.COLUMNS, row))) + b"\n" for row in rows)
+    
+    async def iter_csv(self, bot_id: int, updated_since: Optional[datetime] = None) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        writer.writerow(self.COLUMNS)
+        yield buffer.getvalue()
+        
+        async for rows in self._iter_chunks(bot_id, updated_since):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                [self._format_value(value) for value in row]
+                for row in rows
+            )
+            yield buffer.getvalue()
+
+
+# Singleton instance
+export_service = ExportService()
@@ -1,9 +1,17 @@
+import asyncio
 import httpx
+import os
+import time
 import uuid
 import ssl
 from typing import Optional, Tuple
 from datetime import datetime, timedelta
 from app.config import get_settings
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.coordination import CoordinationStore, coordination_store
+from app.services.llm import HedgedLLMClient, GigaChatProvider, MockProvider
+from app.services.prompts import prompt_cache, render_system_prompt, session_id_for
+from app.services.tracing import tracer, TracingTransport
 
 settings = get_settings()
 
@@ -11,21 +19,85 @@ settings = get_settings()
 class GigaChatService:
     """Service for interacting with GigaChat API from Sber."""
     
-    def __init__(self):
+    # Coordination store keys for the token shared between worker processes
+    SHARED_TOKEN_KEY = "gigachat_access_token"
+    SHARED_TOKEN_LOCK = "gigachat_oauth"
+    
+    def __init__(self, shared_store: Optional[CoordinationStore] = None):
+        self.shared_store = shared_store
         self.auth_key = settings.gigachat_auth_key
         self.scope = settings.gigachat_scope
         self.oauth_url = settings.gigachat_oauth_url
         self.api_url = settings.gigachat_api_url
         self.access_token: Optional[str] = None
         self.token_expires_at: Optional[datetime] = None
+        self._token_lock = asyncio.Lock()
+        self.token_usage = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "precached_prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self.breaker = CircuitBreaker(
+            "gigachat",
+            failure_rate_threshold=settings.gigachat_breaker_failure_rate,
+            window_seconds=settings.gigachat_breaker_window_seconds,
+            minimum_calls=settings.gigachat_breaker_minimum_calls,
+            open_seconds=settings.gigachat_breaker_open_seconds
+        )
+        self.llm = self._build_llm_client()
+    
+    def _has_valid_token(self) -> bool:
+        return bool(
+            self.access_token and self.token_expires_at
+            and datetime.utcnow() < self.token_expires_at - timedelta(minutes=1)
+        )
     
     async def _get_access_token(self) -> str:
         """Get or refresh access token for GigaChat API."""
         # Check if we have a valid token
-        if self.access_token and self.token_expires_at:
-            if datetime.utcnow() < self.token_expires_at - timedelta(minutes=1):
+        if self._has_valid_token():
+            return self.access_token
+        
+        # Concurrent callers (e.g. hedged requests) share a single refresh
+        async with self._token_lock:
+            if self._has_valid_token():
                 return self.access_token
+            if self.shared_store is not None:
+                return await self._get_shared_token()
+            return await self._fetch_access_token()
+    
+    async def _get_shared_token(self) -> str:
+        """
+        Take the token another worker process fetched, or fetch it under
+        the shared lock, so N processes make one OAuth call per expiry.
+        """
+        owner = f"{os.getpid()}:{id(self)}"
+        for _ in range(50):
+            cached = await self.shared_store.get(self.SHARED_TOKEN_KEY)
+            if cached and cached[1] - 60 > time.time():
+                self.access_token = cached[0]
+                self.token_expires_at = datetime.utcnow() + timedelta(seconds=cached[1] - time.time())
+                return self.access_token
+            
+            if await self.shared_store.try_lock(self.SHARED_TOKEN_LOCK, owner, ttl=30):
+                try:
+                    token = await self._fetch_access_token()
+                    await self.shared_store.put(
+                        self.SHARED_TOKEN_KEY,
+                        token,
+                        time.time() + (self.token_expires_at - datetime.utcnow()).total_seconds()
+                    )
+                    return token
+                finally:
+                    await self.shared_store.unlock(self.SHARED_TOKEN_LOCK, owner)
+            
+            await asyncio.sleep(0.1)
         
+        # The lock holder is stuck; do not wait on it any longer
+        return await self._fetch_access_token()
+    
+    async def _fetch_access_token(self) -> str:
         # Request new token
         headers = {
             "Content-Type": "application/x-www-form-urlencoded",
@@ -41,7 +113,9 @@ class GigaChatService:
         ssl_context.check_hostname = False
         ssl_context.verify_mode = ssl.CERT_NONE
         
-        async with httpx.AsyncClient(verify=False) as client:
+        async with httpx.AsyncClient(
+            transport=TracingTransport(httpx.AsyncHTTPTransport(verify=False), tracer)
+        ) as client:
             response = await client.post(
                 self.oauth_url,
                 headers=headers,
@@ -57,40 +131,44 @@ class GigaChatService:
             
             return self.access_token
     
-    async def generate_response(
-        self,
-        user_message: str,
-        business_description: str,
-        conversation_history: list[dict] = None
-    ) -> Tuple[str, float]:
-        """
-        Generate AI response for a user message.
-        
-        Returns:
-            Tuple of (response_text, confidence_score)
-            confidence_score: 0.0-1.0, higher means AI is more confident
-        """
-        access_token = await self._get_access_token()
+    def _build_llm_client(self) -> HedgedLLMClient:
+        """Create the primary and optional backup providers from settings."""
+        if settings.llm_provider == "mock":
+            primary = MockProvider("mock", seed=0)
+            backup = MockProvider("mock-backup", seed=1) if settings.llm_backup_model else None
+        else:
+            primary = GigaChatProvider(
+                "gigachat",
+                api_url=self.api_url,
+                model=settings.gigachat_model,
+                token_getter=self._get_access_token,
+                max_timeout=settings.gigachat_timeout
+            )
+            backup = None
+            if settings.llm_backup_model or settings.llm_backup_api_url:
+                backup = GigaChatProvider(
+                    "gigachat-backup",
+                    api_url=settings.llm_backup_api_url or self.api_url,
+                    model=settings.llm_backup_model or settings.gigachat_model,
+                    token_getter=self._get_access_token,
+                    max_timeout=settings.gigachat_timeout
+                )
         
-        # Build messages for context
-        messages = [
-            {
-                "role": "system",
-                "content": f"""Ты — AI-консультант для бизнеса. Отвечай профессионально и дружелюбно.
-
-Описание бизнеса:
-{business_description}
-
-Правила:
-1. Отвечай только на вопросы, связанные с данным бизнесом
-2. Если не знаешь точного ответа — честно скажи об этом
-3. Если вопрос требует ручного вмешательства владельца — укажи это
-4. Отвечай кратко и по делу
-5. Используй вежливый тон
-
-Если ты НЕ УВЕРЕН в ответе или вопрос слишком сложный, начни ответ с [UNSURE]."""
-            }
-        ]
+        return HedgedLLMClient(
+            primary,
+            backup,
+            default_hedge_delay=settings.llm_hedge_default_delay
+        )
+    
+    @staticmethod
+    def build_messages(
+        user_message: str,
+        system_prompt: str,
+        conversation_history: list[dict] = None,
+        context_chunks: list[str] = None
+    ) -> list[dict]:
+        """Build the chat messages sent to the model."""
+        messages = [{"role": "system", "content": system_prompt}]
         
         # Add conversation history
         if conversation_history:
@@ -100,59 +178,134 @@ class GigaChatService:
                     "content": msg["content"]
                 })
         
+        # Knowledge base excerpts go with the question, so the system
+        # prompt stays a stable prefix the upstream can cache
+        if context_chunks:
+            user_message = (
+                "Справочная информация:\n"
+                + "\n---\n".join(context_chunks)
+                + f"\n\nВопрос клиента: {user_message}"
+            )
+        
         # Add current message
         messages.append({
             "role": "user",
             "content": user_message
         })
         
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
+        return messages
+    
+    @staticmethod
+    def score_confidence(ai_response: str) -> Tuple[str, float]:
+        """Strip the uncertainty tag and estimate confidence from the reply text."""
+        confidence = 0.8  # Default confidence
         
-        payload = {
-            "model": "GigaChat",
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
+        # Lower confidence if AI indicates uncertainty
+        if ai_response.startswith("[UNSURE]"):
+            confidence = 0.3
+            ai_response = ai_response.replace("[UNSURE]", "").strip()
         
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(
-                f"{self.api_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60.0
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            ai_response = result["choices"][0]["message"]["content"]
-            
-            # Calculate confidence based on response
-            confidence = 0.8  # Default confidence
-            
-            # Lower confidence if AI indicates uncertainty
-            if ai_response.startswith("[UNSURE]"):
-                confidence = 0.3
-                ai_response = ai_response.replace("[UNSURE]", "").strip()
-            
-            # Lower confidence for certain phrases
-            uncertainty_phrases = [
-                "не уверен", "не знаю", "возможно", "вероятно",
-                "лучше спросить", "свяжитесь с", "уточните у"
-            ]
-            for phrase in uncertainty_phrases:
-                if phrase.lower() in ai_response.lower():
-                    confidence = min(confidence, 0.5)
-                    break
-            
-            return ai_response, confidence
+        # Lower confidence for certain phrases
+        uncertainty_phrases = [
+            "не уверен", "не знаю", "возможно", "вероятно",
+            "лучше спросить", "свяжитесь с", "уточните у"
+        ]
+        for phrase in uncertainty_phrases:
+            if phrase.lower() in ai_response.lower():
+                confidence = min(confidence, 0.5)
+                break
+        
+        return ai_response, confidence
+    
+    async def generate_response(
+        self,
+        user_message: str,
+        business_description: str,
+        conversation_history: list[dict] = None,
+        deadline: Optional[float] = None,
+        bot_id: Optional[int] = None,
+        bot_updated_at: Optional[datetime] = None,
+        conversation_id: Optional[int] = None,
+        context_chunks: Optional[list[str]] = None
+    ) -> Tuple[str, float]:
+        """
+        Generate AI response for a user message.
+        
+        `deadline` is a time.monotonic() value, normally derived from the
+        webhook receipt time; no provider call runs past it. Raises
+        CircuitOpenError without calling the API while GigaChat is
+        considered down.
+        
+        With `bot_id` the rendered system prompt is taken from the prompt
+        cache, and with `conversation_id` the request carries a per-
+        conversation X-Session-ID so GigaChat can reuse the cached prefix.
+        `context_chunks` are knowledge base excerpts relevant to the question.
+        
+        Returns:
+            Tuple of (response_text, confidence_score)
+            confidence_score: 0.0-1.0, higher means AI is more confident
+        """
+        if deadline is None:
+            deadline = time.monotonic() + settings.llm_deadline_seconds
+        
+        if bot_id is not None:
+            with tracer.span("cache.prompt") as span:
+                hits = prompt_cache.hits
+                system_prompt = prompt_cache.get(bot_id, business_description, bot_updated_at)
+                span.set(hit=prompt_cache.hits > hits)
+        else:
+            system_prompt = render_system_prompt(business_description)
+        
+        session_id = None
+        if conversation_id is not None:
+            session_id = session_id_for(conversation_id, bot_updated_at)
+        
+        self.breaker.check()
+        try:
+            messages = self.build_messages(user_message, system_prompt, conversation_history, context_chunks)
+            with tracer.span("llm.complete", messages=len(messages)) as span:
+                result = await self.llm.complete(messages, deadline, session_id=session_id)
+                span.set(
+                    provider=result.provider,
+                    prompt_tokens=result.usage.get("prompt_tokens"),
+                    completion_tokens=result.usage.get("completion_tokens")
+                )
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        
+        self._record_usage(result.usage)
+        return self.score_confidence(result.text)
+    
+    def _record_usage(self, usage: dict) -> None:
+        for key in ("prompt_tokens", "precached_prompt_tokens", "completion_tokens"):
+            self.token_usage[key] += usage.get(key) or 0
+        self.token_usage["requests"] += 1
+    
+    def usage_stats(self) -> dict:
+        """Token totals and the share of prompt tokens served from the upstream cache."""
+        prompt_tokens = self.token_usage["prompt_tokens"]
+        return {
+            **self.token_usage,
+            "precached_ratio": round(self.token_usage["precached_prompt_tokens"] / prompt_tokens, 4)
+            if prompt_tokens else None,
+            "prompt_cache": prompt_cache.snapshot(),
+        }
+    
+    async def warm_up(self) -> None:
+        """Prefetch the OAuth token and open provider connections."""
+        if settings.llm_provider != "mock":
+            await self._get_access_token()
+        await self.llm.warm_up()
+    
+    async def close(self) -> None:
+        await self.llm.close()
     
     async def check_health(self) -> bool:
         """Check if GigaChat API is accessible."""
+        if settings.llm_provider == "mock":
+            return True
         try:
             await self._get_access_token()
             return True
@@ -161,4 +314,6 @@ class GigaChatService:
 
 
 # Singleton instance
-gigachat_service = GigaChatService()
+gigachat_service = GigaChatService(
+    shared_store=coordination_store if settings.app_role != "all" else None
+)
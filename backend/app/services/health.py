@@ -0,0 +1,151 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ProbeResult:
+    """Last outcome of a dependency probe."""
+    
+    def __init__(self, ok: bool, latency_ms: float, checked_at: float, error: Optional[str] = None):
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.checked_at = checked_at
+        self.error = error
+    
+    def to_dict(self, now: float) -> dict:
+        return {
+            "ok": self.ok,
+            "latency_ms": round(self.latency_ms, 1),
+            "age_seconds": round(now - self.checked_at, 1),
+            "error": self.error,
+        }
+
+
+class HealthMonitor:
+    """
+    Dependency probes run in the background with cached results.
+    
+    `/ready` and `/live` only read the cache, so load balancer polling
+    never touches the database or upstreams. The instance becomes ready
+    after the warm-up and a first successful round of the required probes.
+    """
+    
+    def __init__(self, interval: float = 15.0, timeout: float = 5.0, required: Optional[List[str]] = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.required = required
+        self._probes: Dict[str, Callable[[], Awaitable[bool]]] = {}
+        self._results: Dict[str, ProbeResult] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self._last_round_at: Optional[float] = None
+        self.warmed_up = False
+        self.warm_up_error: Optional[str] = None
+    
+    def add_probe(self, name: str, probe: Callable[[], Awaitable[bool]]) -> None:
+        self._probes[name] = probe
+    
+    async def _run_probe(self, name: str, probe: Callable[[], Awaitable[bool]]) -> None:
+        started = time.monotonic()
+        error = None
+        try:
+            ok = bool(await asyncio.wait_for(probe(), timeout=self.timeout))
+        except asyncio.TimeoutError:
+            ok, error = False, "timeout"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        now = time.monotonic()
+        self._results[name] = ProbeResult(ok, (now - started) * 1000, now, error)
+    
+    async def run_probes(self) -> None:
+        await asyncio.gather(*(self._run_probe(name, probe) for name, probe in self._probes.items()))
+        self._last_round_at = time.monotonic()
+    
+    def start(self, warm_up: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """Warm up, then keep probing every `interval` seconds."""
+        if self._task is None:
+            self._started_at = time.monotonic()
+            self.warmed_up = False
+            self.warm_up_error = None
+            self._task = asyncio.create_task(self._run(warm_up))
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self, warm_up) -> None:
+        if warm_up is not None:
+            try:
+                await warm_up()
+            except Exception as e:
+                # Not fatal: whatever failed is warmed by the first real request
+                self.warm_up_error = str(e) or type(e).__name__
+                print(f"Error during warm-up: {e}")
+        self.warmed_up = True
+        
+        while True:
+            try:
+                await self.run_probes()
+            except Exception as e:
+                print(f"Error running health probes: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def _is_fresh(self, result: ProbeResult, now: float) -> bool:
+        return now - result.checked_at <= self.interval * 3 + self.timeout
+    
+    def live(self) -> Tuple[bool, dict]:
+        """The process and its probe loop are running."""
+        now = time.monotonic()
+        stalled = (
+            self._last_round_at is not None
+            and now - self._last_round_at > self.interval * 3 + self.timeout
+        )
+        return not stalled, {
+            "status": "stalled" if stalled else "alive",
+            "uptime_seconds": round(now - self._started_at, 1),
+            "last_probe_age_seconds": round(now - self._last_round_at, 1) if self._last_round_at else None,
+        }
+    
+    def ready(self, draining: bool = False) -> Tuple[bool, dict]:
+        """Warm, not shutting down, and every required probe recently passed."""
+        now = time.monotonic()
+        required = [name for name in (self.required or self._probes) if name in self._probes]
+        
+        failing = [
+            name for name in required
+            if name not in self._results
+            or not self._results[name].ok
+            or not self._is_fresh(self._results[name], now)
+        ]
+        ready = self.warmed_up and not draining and not failing
+        
+        if draining:
+            status = "draining"
+        elif not self.warmed_up:
+            status = "warming_up"
+        else:
+            status = "ready" if ready else "degraded"
+        
+        return ready, {
+            "status": status,
+            "failing": failing,
+            "warm_up_error": self.warm_up_error,
+            "checks": {name: result.to_dict(now) for name, result in self._results.items()},
+        }
+
+
+# Singleton instance
+health_monitor = HealthMonitor(
+    interval=settings.health_probe_interval,
+    timeout=settings.health_probe_timeout,
+    required=[name.strip() for name in settings.readiness_probes.split(",") if name.strip()]
+)
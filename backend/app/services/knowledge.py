@@ -0,0 +1,247 @@
+import hashlib
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import select, delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import engine
+from app.models.bot import TelegramBot
+from app.models.knowledge import KnowledgeDocument, KnowledgeChunk
+from app.models.routing import CannedAnswer
+
+settings = get_settings()
+
+
+class KnowledgeService:
+    """
+    Per-bot knowledge base: documents are split into chunks, indexed with
+    SQLite FTS5 (BM25 ranking, stored in the main database) and only the
+    chunks relevant to a question are put into the prompt.
+    """
+    
+    FTS_TABLE = "knowledge_chunks_fts"
+    
+    # bot_id is an indexed FTS column so the per-bot filter is part of the match
+    DDL = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            content,
+            bot_id,
+            content='knowledge_chunks',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS knowledge_chunks_fts_ai AFTER INSERT ON knowledge_chunks BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, content, bot_id) VALUES (new.id, new.content, new.bot_id);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS knowledge_chunks_fts_ad AFTER DELETE ON knowledge_chunks BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, bot_id)
+            VALUES ('delete', old.id, old.content, old.bot_id);
+        END""",
+    ]
+    
+    DESCRIPTION_TITLE = "Описание бизнеса"
+    
+    # Words shorter than this carry little signal for retrieval
+    MIN_TERM_LENGTH = 3
+    # Longer words are matched by prefix to absorb Russian inflection
+    STEM_LENGTH = 6
+    
+    async def ensure_index(self) -> None:
+        """Create the FTS5 table and sync triggers, backfilling on first run."""
+        if engine.dialect.name != "sqlite":
+            return
+        
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": self.FTS_TABLE}
+            )
+            existed = result.scalar() is not None
+            
+            for statement in self.DDL:
+                await conn.execute(text(statement))
+            
+            if not existed:
+                await conn.execute(
+                    text(f"INSERT INTO {self.FTS_TABLE}({self.FTS_TABLE}) VALUES ('rebuild')")
+                )
+    
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def chunk_text(content: str, chunk_size: int = None) -> List[str]:
+        """Pack paragraphs into chunks of about `chunk_size` characters."""
+        chunk_size = chunk_size or settings.kb_chunk_size
+        
+        pieces = []
+        for paragraph in re.split(r"\n\s*\n", content):
+            paragraph = " ".join(paragraph.split())
+            # Split oversized paragraphs at word boundaries
+            while len(paragraph) > chunk_size:
+                cut = paragraph.rfind(" ", 0, chunk_size)
+                if cut <= 0:
+                    cut = chunk_size
+                pieces.append(paragraph[:cut])
+                paragraph = paragraph[cut:].strip()
+            if paragraph:
+                pieces.append(paragraph)
+        
+        chunks = []
+        current = ""
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > chunk_size:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    async def _reindex(self, db: AsyncSession, document: KnowledgeDocument) -> None:
+        """Replace the chunks of one document; triggers keep the FTS index in sync."""
+        await db.execute(delete(KnowledgeChunk).where(KnowledgeChunk.document_id == document.id))
+        chunks = self.chunk_text(document.content)
+        if chunks:
+            await db.execute(
+                insert(KnowledgeChunk),
+                [
+                    {"document_id": document.id, "bot_id": document.bot_id, "position": i, "content": chunk}
+                    for i, chunk in enumerate(chunks)
+                ]
+            )
+    
+    async def save_document(
+        self,
+        db: AsyncSession,
+        bot_id: int,
+        title: str,
+        content: str,
+        document: Optional[KnowledgeDocument] = None,
+        source: str = "upload",
+        force: bool = False
+    ) -> KnowledgeDocument:
+        """
+        Create or replace a document. Only this document is re-chunked,
+        and not at all when its content is unchanged.
+        """
+        digest = self.content_hash(content)
+        
+        if document is None:
+            document = KnowledgeDocument(bot_id=bot_id, source=source)
+            db.add(document)
+        elif document.content_hash == digest and not force:
+            document.title = title
+            return document
+        
+        document.title = title
+        document.content = content
+        document.content_hash = digest
+        await db.flush()
+        
+        await self._reindex(db, document)
+        return document
+    
+    async def delete_document(self, db: AsyncSession, document: KnowledgeDocument) -> None:
+        await db.execute(delete(KnowledgeChunk).where(KnowledgeChunk.document_id == document.id))
+        await db.execute(delete(KnowledgeDocument).where(KnowledgeDocument.id == document.id))
+    
+    async def purge_bot(self, db: AsyncSession, bot_id: int) -> None:
+        await db.execute(delete(KnowledgeChunk).where(KnowledgeChunk.bot_id == bot_id))
+        await db.execute(delete(KnowledgeDocument).where(KnowledgeDocument.bot_id == bot_id))
+        await db.execute(delete(CannedAnswer).where(CannedAnswer.bot_id == bot_id))
+    
+    async def sync_description(self, db: AsyncSession, bot: TelegramBot) -> None:
+        """
+        Index a long business description as a document so that only a
+        short excerpt has to stay in the system prompt.
+        """
+        result = await db.execute(
+            select(KnowledgeDocument).where(
+                KnowledgeDocument.bot_id == bot.id,
+                KnowledgeDocument.source == "description"
+            )
+        )
+        document = result.scalar_one_or_none()
+        
+        if len(bot.business_description) > settings.kb_description_prompt_limit:
+            await self.save_document(
+                db, bot.id, self.DESCRIPTION_TITLE, bot.business_description,
+                document=document, source="description"
+            )
+        elif document is not None:
+            await self.delete_document(db, document)
+    
+    @staticmethod
+    def excerpt(content: str, limit: int) -> str:
+        if len(content) <= limit:
+            return content
+        cut = content.rfind(" ", 0, limit)
+        return content[:cut if cut > 0 else limit].rstrip() + "…"
+    
+    def build_match_query(self, bot_id: int, question: str) -> Optional[str]:
+        terms = []
+        for word in re.findall(r"\w+", question.lower()):
+            if len(word) < self.MIN_TERM_LENGTH:
+                continue
+            if len(word) > self.STEM_LENGTH:
+                terms.append(f'"{word[:self.STEM_LENGTH]}"*')
+            else:
+                terms.append(f'"{word}"')
+        if not terms:
+            return None
+        return f'bot_id : "{bot_id}" AND content : ({" OR ".join(dict.fromkeys(terms))})'
+    
+    async def retrieve(self, db: AsyncSession, bot_id: int, question: str, top_k: int = None) -> List[str]:
+        """Return the chunks most relevant to the question, best first."""
+        match = self.build_match_query(bot_id, question)
+        if match is None or engine.dialect.name != "sqlite":
+            return []
+        
+        result = await db.execute(
+            text(f"""
+                SELECT c.content
+                FROM {self.FTS_TABLE}
+                JOIN knowledge_chunks c ON c.id = {self.FTS_TABLE}.rowid
+                WHERE {self.FTS_TABLE} MATCH :match
+                ORDER BY {self.FTS_TABLE}.rank
+                LIMIT :top_k
+            """),
+            {"match": match, "top_k": top_k or settings.kb_top_k}
+        )
+        return list(result.scalars().all())
+    
+    async def _prompt_description(self, db: AsyncSession, bot: TelegramBot) -> Tuple[str, bool]:
+        result = await db.execute(
+            select(KnowledgeDocument.source).where(KnowledgeDocument.bot_id == bot.id).distinct()
+        )
+        sources = set(result.scalars().all())
+        
+        description = bot.business_description
+        if "description" in sources:
+            description = self.excerpt(description, settings.kb_description_prompt_limit)
+        return description, bool(sources)
+    
+    async def prompt_description(self, db: AsyncSession, bot: TelegramBot) -> str:
+        """The business description as it goes into the system prompt."""
+        description, _ = await self._prompt_description(db, bot)
+        return description
+    
+    async def build_context(self, db: AsyncSession, bot: TelegramBot, question: str) -> Tuple[str, List[str]]:
+        """
+        Return (business description for the system prompt, relevant chunks).
+        
+        Bots without documents keep the full description and get no chunks.
+        """
+        description, has_documents = await self._prompt_description(db, bot)
+        if not has_documents:
+            return description, []
+        
+        return description, await self.retrieve(db, bot.id, question)
+
+
+# Singleton instance
+knowledge_service = KnowledgeService()
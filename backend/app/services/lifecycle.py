@@ -0,0 +1,134 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import delete
+
+from app.database import async_session_maker
+from app.models.pending import PendingWork
+from app.serialization import dumps_str, loads
+from app.services.profiler import profiler
+from app.services.tracing import tracer
+
+
+class LifecycleManager:
+    """
+    Tracks background work so a shutdown can drain it.
+    
+    Tasks started with `spawn` carry a description of their work. On
+    shutdown new work is refused, running tasks get until the drain
+    deadline, and whatever is still unfinished is written to the
+    pending_work table and handed back to `resume` on the next start.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[asyncio.Task, Optional[Dict[str, Any]]] = {}
+        self._close_hooks: List[Callable[[], Awaitable[None]]] = []
+        self.draining = False
+        self.started = 0
+        self.persisted = 0
+        self.resumed = 0
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+    
+    def spawn(self, coro: Awaitable[None], kind: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> asyncio.Task:
+        """
+        Run `coro` in the background. If `kind` is given the work is
+        persisted when it cannot finish before shutdown.
+        """
+        task = tracer.create_task(coro, kind=kind)
+        self._tasks[task] = {"kind": kind, "payload": payload} if kind else None
+        profiler.watch_task(task, coro, kind)
+        task.add_done_callback(self._discard)
+        self.started += 1
+        return task
+    
+    def _discard(self, task: asyncio.Task) -> None:
+        self._tasks.pop(task, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in background task: {task.exception()}")
+    
+    def on_close(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """Register a coroutine function run after draining, in reverse order."""
+        self._close_hooks.append(hook)
+    
+    async def drain(self, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Stop accepting work and wait up to `timeout` seconds for running
+        tasks. Returns the descriptions of the tasks that were cancelled.
+        """
+        self.draining = True
+        if not self._tasks:
+            return []
+        
+        tasks = dict(self._tasks)
+        _, pending = await asyncio.wait(tasks.keys(), timeout=timeout)
+        
+        unfinished = []
+        for task in pending:
+            task.cancel()
+            if tasks[task] is not None:
+                unfinished.append(tasks[task])
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        return unfinished
+    
+    async def persist(self, work: List[Dict[str, Any]]) -> None:
+        if not work:
+            return
+        async with async_session_maker() as db:
+            for item in work:
+                db.add(PendingWork(kind=item["kind"], payload=dumps_str(item["payload"] or {})))
+            await db.commit()
+        self.persisted += len(work)
+    
+    async def close(self) -> None:
+        for hook in reversed(self._close_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                print(f"Error closing resource: {e}")
+        self._close_hooks.clear()
+    
+    async def resume(self, handlers: Dict[str, Callable[[Dict[str, Any]], Any]]) -> int:
+        """
+        Hand work saved by the previous shutdown to its handlers. The rows
+        are taken with one DELETE ... RETURNING, so processes starting
+        together (e.g. ingest workers under the supervisor) never resume
+        the same work twice.
+        """
+        async with async_session_maker() as db:
+            result = await db.execute(
+                delete(PendingWork).returning(PendingWork.id, PendingWork.kind, PendingWork.payload)
+            )
+            rows = sorted(result.all(), key=lambda row: row.id)
+            await db.commit()
+        if not rows:
+            return 0
+        
+        for row in rows:
+            handler = handlers.get(row.kind)
+            if handler is None:
+                print(f"Error resuming work: unknown kind {row.kind}")
+                continue
+            try:
+                handler(loads(row.payload))
+            except Exception as e:
+                print(f"Error resuming work: {e}")
+        
+        self.resumed += len(rows)
+        return len(rows)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "started": self.started,
+            "persisted": self.persisted,
+            "resumed": self.resumed,
+        }
+
+
+# Singleton instance
+lifecycle = LifecycleManager()
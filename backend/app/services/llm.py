@@ -0,0 +1,332 @@
+import asyncio
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from app.services.tracing import tracer, TracingTransport
+
+
+class LLMError(Exception):
+    """Base error for LLM provider calls."""
+
+
+class DeadlineExceeded(LLMError):
+    """The end-to-end deadline passed before any provider answered."""
+
+
+class LLMResult:
+    """A completion returned by a provider."""
+    
+    def __init__(self, text: str, provider: str, latency_ms: float, usage: Optional[dict] = None):
+        self.text = text
+        self.provider = provider
+        self.latency_ms = latency_ms
+        self.usage = usage or {}
+    
+    def __repr__(self):
+        return f"<LLMResult {self.provider} {self.latency_ms:.0f}ms>"
+
+
+class LatencyStats:
+    """Rolling latency samples and outcome counters for one provider."""
+    
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def record_success(self, latency_ms: float) -> None:
+        self.calls += 1
+        self._samples.append(latency_ms)
+    
+    def record_error(self) -> None:
+        self.calls += 1
+        self.errors += 1
+    
+    def record_cancel(self) -> None:
+        self.calls += 1
+        self.cancelled += 1
+    
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+    
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class LLMProvider(ABC):
+    """A chat-completion backend. Subclasses implement `_complete`."""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = LatencyStats()
+    
+    @abstractmethod
+    async def _complete(self, messages: List[dict], timeout: float, session_id: Optional[str] = None) -> tuple:
+        """Return (text, usage) for the chat messages."""
+    
+    async def complete(self, messages: List[dict], timeout: float, session_id: Optional[str] = None) -> LLMResult:
+        started = time.monotonic()
+        try:
+            text, usage = await self._complete(messages, timeout, session_id)
+        except asyncio.CancelledError:
+            self.stats.record_cancel()
+            raise
+        except Exception:
+            self.stats.record_error()
+            raise
+        latency_ms = (time.monotonic() - started) * 1000
+        self.stats.record_success(latency_ms)
+        return LLMResult(text, self.name, latency_ms, usage)
+    
+    async def warm_up(self) -> None:
+        """Open connections ahead of the first request."""
+    
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class GigaChatProvider(LLMProvider):
+    """GigaChat chat/completions endpoint for one model."""
+    
+    def __init__(
+        self,
+        name: str,
+        api_url: str,
+        model: str,
+        token_getter: Callable[[], Awaitable[str]],
+        max_timeout: float = 60.0
+    ):
+        super().__init__(name)
+        self.api_url = api_url
+        self.model = model
+        self.token_getter = token_getter
+        self.max_timeout = max_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=TracingTransport(httpx.AsyncHTTPTransport(verify=False), tracer)
+            )
+        return self._client
+    
+    async def warm_up(self) -> None:
+        """Fetch the model list; leaves an authenticated connection in the pool."""
+        access_token = await self.token_getter()
+        response = await self._get_client().get(
+            f"{self.api_url}/models",
+            headers={"Accept": "application/json", "Authorization": f"Bearer {access_token}"},
+            timeout=min(10.0, self.max_timeout)
+        )
+        response.raise_for_status()
+    
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _complete(self, messages: List[dict], timeout: float, session_id: Optional[str] = None) -> tuple:
+        access_token = await self.token_getter()
+        
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {access_token}"
+        }
+        if session_id:
+            # Lets GigaChat reuse the cached prompt prefix of this conversation
+            headers["X-Session-ID"] = session_id
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 500
+        }
+        
+        response = await self._get_client().post(
+            f"{self.api_url}/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=min(timeout, self.max_timeout)
+        )
+        response.raise_for_status()
+        
+        result = response.json()
+        return result["choices"][0]["message"]["content"], result.get("usage")
+
+
+class MockProvider(LLMProvider):
+    """
+    Deterministic offline provider for testing tail-latency behavior.
+    
+    With the same seed, the sequence of latencies and failures is always
+    the same: `tail_probability` of the calls take `tail_latency_ms`
+    instead of `latency_ms`, and `failure_rate` of them raise.
+    """
+    
+    def __init__(
+        self,
+        name: str = "mock",
+        latency_ms: float = 50.0,
+        tail_latency_ms: float = 2000.0,
+        tail_probability: float = 0.05,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        reply: str = "Спасибо за вопрос! Менеджер уточнит детали."
+    ):
+        super().__init__(name)
+        self.latency_ms = latency_ms
+        self.tail_latency_ms = tail_latency_ms
+        self.tail_probability = tail_probability
+        self.failure_rate = failure_rate
+        self.reply = reply
+        self._random = random.Random(seed)
+        self._sessions: Dict[str, int] = {}
+    
+    async def _complete(self, messages: List[dict], timeout: float, session_id: Optional[str] = None) -> tuple:
+        is_tail = self._random.random() < self.tail_probability
+        fails = self._random.random() < self.failure_rate
+        delay = (self.tail_latency_ms if is_tail else self.latency_ms) / 1000
+        
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            raise LLMError(f"{self.name}: timed out")
+        await asyncio.sleep(delay)
+        if fails:
+            raise LLMError(f"{self.name}: injected failure")
+        
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        completion_tokens = len(self.reply.split())
+        
+        # Emulate upstream prefix caching: a known session reuses the system prompt
+        system_tokens = len(messages[0]["content"].split()) if messages else 0
+        precached = 0
+        if session_id:
+            if self._sessions.get(session_id) == system_tokens:
+                precached = system_tokens
+            self._sessions[session_id] = system_tokens
+        
+        return self.reply, {
+            "prompt_tokens": prompt_tokens,
+            "precached_prompt_tokens": precached,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+
+class HedgedLLMClient:
+    """
+    Deadline-aware client over a primary and an optional backup provider.
+    
+    The primary is called first. If it has not answered after its observed
+    p95 latency, the same request is sent to the backup and whichever
+    succeeds first wins; the other call is cancelled. If the primary fails
+    outright, the backup is tried immediately. Nothing runs past the
+    caller's deadline.
+    """
+    
+    def __init__(
+        self,
+        primary: LLMProvider,
+        backup: Optional[LLMProvider] = None,
+        default_hedge_delay: float = 5.0,
+        min_samples: int = 20
+    ):
+        self.primary = primary
+        self.backup = backup
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+    
+    @property
+    def providers(self) -> List[LLMProvider]:
+        return [p for p in (self.primary, self.backup) if p is not None]
+    
+    async def warm_up(self) -> None:
+        await asyncio.gather(*(p.warm_up() for p in self.providers))
+    
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.close()
+    
+    def hedge_delay(self) -> float:
+        """Seconds to wait on the primary before hedging."""
+        if len(self.primary.stats) < self.min_samples:
+            return self.default_hedge_delay
+        return max(0.05, self.primary.stats.percentile(95) / 1000)
+    
+    async def complete(self, messages: List[dict], deadline: float, session_id: Optional[str] = None) -> LLMResult:
+        """Get a completion before `deadline` (a time.monotonic() value)."""
+        def remaining() -> float:
+            return deadline - time.monotonic()
+        
+        if remaining() <= 0:
+            raise DeadlineExceeded("Deadline passed before the LLM call")
+        
+        pending = {asyncio.create_task(self.primary.complete(messages, remaining(), session_id))}
+        backup_task: Optional[asyncio.Task] = None
+        errors: List[BaseException] = []
+        
+        try:
+            while True:
+                hedge_pending = self.backup is not None and backup_task is None
+                wait_for = remaining()
+                if wait_for <= 0:
+                    raise DeadlineExceeded("LLM deadline exceeded")
+                if hedge_pending:
+                    wait_for = min(wait_for, self.hedge_delay())
+                
+                done, pending = await asyncio.wait(
+                    pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            self.hedge_wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+                
+                if hedge_pending and remaining() > 0:
+                    # Nothing done means the primary is slow (hedge),
+                    # otherwise it failed (fail over)
+                    if not done:
+                        self.hedges += 1
+                    backup_task = asyncio.create_task(self.backup.complete(messages, remaining(), session_id))
+                    pending.add(backup_task)
+                
+                if not pending:
+                    raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def stats(self) -> dict:
+        return {
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {p.name: p.stats.snapshot() for p in self.providers},
+        }
@@ -0,0 +1,482 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+
+import httpx
+from sqlalchemy import select, update, delete, or_, and_, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.bot import TelegramBot
+from app.models.media import MediaFile, MessageAttachment
+from app.services.telegram import telegram_service
+from app.services.tracing import tracer, TracingTransport
+
+settings = get_settings()
+
+# Stored as the message content when a file comes without a caption
+PLACEHOLDERS = {
+    "photo": "[Фото]",
+    "voice": "[Голосовое сообщение]",
+    "audio": "[Аудио]",
+    "video": "[Видео]",
+    "video_note": "[Видеосообщение]",
+    "document": "[Документ]",
+}
+
+# Types the dashboard may show inline. The sender chooses a document's
+# type, so anything else (HTML, SVG, ...) is only offered as a download
+INLINE_MIME_TYPES = frozenset({
+    "image/jpeg", "image/png", "image/gif", "image/webp",
+    "audio/ogg", "audio/mpeg", "audio/mp4", "audio/wav", "audio/webm",
+    "video/mp4", "video/webm", "video/quicktime",
+})
+
+ATTACHMENT_COLUMNS = [
+    MessageAttachment.message_id,
+    MessageAttachment.id,
+    MessageAttachment.kind,
+    MessageAttachment.file_name,
+    MessageAttachment.mime_type,
+    MessageAttachment.size_bytes,
+    MessageAttachment.status,
+]
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def _truncate(value: Any, length: int) -> Optional[str]:
+    return value[:length] if isinstance(value, str) and value else None
+
+
+class MediaService:
+    """
+    Downloads the files customers send and keeps each content once.
+    
+    The message path only records a MessageAttachment and queues its id.
+    A fixed pool of download workers, with its own connections to the
+    Bot API, resolves the file with getFile and streams it to a temporary
+    file in chunks, hashing as it goes and giving up past `max_bytes`;
+    a download never sits in memory and never delays a text reply. The
+    file then moves to `<media_dir>/<ab>/<sha256>`, so content sent again
+    by anyone is stored once, and a Telegram file already stored (same
+    file_unique_id) is not fetched at all.
+    
+    Attachments left pending by a full queue, a failed attempt or a
+    shutdown are picked up by a periodic sweep; claiming the row keeps
+    two processes from downloading the same one.
+    """
+    
+    SWEEP_SECONDS = 60
+    MAX_ATTEMPTS = 3
+    # Unreferenced files younger than this may be about to be linked
+    GARBAGE_AFTER = timedelta(hours=1)
+    
+    def __init__(
+        self,
+        media_dir: str,
+        max_bytes: int = 20_000_000,
+        workers: int = 4,
+        queue_size: int = 1000,
+        chunk_bytes: int = 65536,
+        timeout: float = 120.0
+    ):
+        self.media_dir = media_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.queue_size = queue_size
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        # A claim older than this belongs to a download that has stopped
+        self.stale_after = timedelta(seconds=timeout * 2)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+        self.downloaded = 0
+        self.downloaded_bytes = 0
+        self.deduplicated = 0
+        self.too_large = 0
+        self.failed = 0
+    
+    # Message path
+    
+    @staticmethod
+    def describe(media: Dict[str, Any]) -> str:
+        return PLACEHOLDERS.get(media["kind"], "[Файл]")
+    
+    def attach(
+        self,
+        db: AsyncSession,
+        bot_id: int,
+        conversation_id: int,
+        message_id: int,
+        media: Dict[str, Any]
+    ) -> MessageAttachment:
+        """Record the file of a saved message; committed by the caller, then `enqueue` it."""
+        size = media.get("file_size")
+        attachment = MessageAttachment(
+            bot_id=bot_id,
+            conversation_id=conversation_id,
+            message_id=message_id,
+            kind=media["kind"],
+            telegram_file_id=media["file_id"],
+            telegram_file_unique_id=media.get("file_unique_id"),
+            file_name=_truncate(media.get("file_name"), 255),
+            mime_type=_truncate(media.get("mime_type"), 100),
+            size_bytes=size if isinstance(size, int) else None,
+            status="pending"
+        )
+        db.add(attachment)
+        return attachment
+    
+    def enqueue(self, attachment_id: int) -> bool:
+        """Queue a download; False if the pool is not running or full (the sweep retries it)."""
+        if self._queue is None or attachment_id in self._queued:
+            return False
+        try:
+            self._queue.put_nowait(attachment_id)
+        except asyncio.QueueFull:
+            return False
+        self._queued.add(attachment_id)
+        return True
+    
+    # Worker pool
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Separate from the Bot API client, so downloads never hold its connections."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=TracingTransport(
+                    httpx.AsyncHTTPTransport(
+                        limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+                    ),
+                    tracer
+                ),
+                timeout=httpx.Timeout(30.0, connect=10.0)
+            )
+        return self._client
+    
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+    
+    async def stop(self) -> None:
+        """Cancel downloads; their claims expire and the next start resumes them."""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _work(self) -> None:
+        while True:
+            attachment_id = await self._queue.get()
+            self._queued.discard(attachment_id)
+            try:
+                await self.download(attachment_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error downloading media {attachment_id}: {e}")
+    
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                await self.enqueue_pending()
+            except Exception as e:
+                print(f"Error sweeping media downloads: {e}")
+            await asyncio.sleep(self.SWEEP_SECONDS)
+    
+    async def enqueue_pending(self) -> int:
+        """Queue attachments waiting for a download, as far as the queue has room."""
+        room = self.queue_size - self._queue.qsize() if self._queue is not None else 0
+        if room <= 0:
+            return 0
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(MessageAttachment.id)
+                .where(self._claimable(datetime.utcnow()))
+                .order_by(MessageAttachment.id)
+                .limit(room + len(self._queued))
+            )
+            attachment_ids = result.scalars().all()
+        return sum(self.enqueue(attachment_id) for attachment_id in attachment_ids)
+    
+    def _claimable(self, now: datetime):
+        return or_(
+            MessageAttachment.status == "pending",
+            and_(MessageAttachment.status == "downloading", MessageAttachment.claimed_at < now - self.stale_after)
+        )
+    
+    # Download
+    
+    async def _claim(self, db: AsyncSession, attachment_id: int) -> bool:
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(MessageAttachment)
+            .where(MessageAttachment.id == attachment_id, self._claimable(now))
+            .values(status="downloading", claimed_at=now, attempts=MessageAttachment.attempts + 1)
+        )
+        await db.commit()
+        return result.rowcount == 1
+    
+    async def _finish(self, db: AsyncSession, attachment_id: int, **values: Any) -> None:
+        await db.execute(update(MessageAttachment).where(MessageAttachment.id == attachment_id).values(**values))
+        await db.commit()
+    
+    async def download(self, attachment_id: int) -> Optional[str]:
+        """Fetch and store one attachment; returns its new status, or None if someone else has it."""
+        async with async_session_maker() as db:
+            if not await self._claim(db, attachment_id):
+                return None
+            attachment = await db.get(MessageAttachment, attachment_id)
+            # Plain values: a rollback below would expire the instance
+            bot_id, file_id, unique_id = attachment.bot_id, attachment.telegram_file_id, attachment.telegram_file_unique_id
+            announced, attempts = attachment.size_bytes, attachment.attempts
+            
+            with tracer.trace("media_download", attachment_id=attachment_id, kind=attachment.kind) as span:
+                try:
+                    media = await self._known(db, unique_id)
+                    if media is None:
+                        if announced is not None and announced > self.max_bytes:
+                            raise MediaTooLarge()
+                        token = await db.scalar(
+                            select(TelegramBot.token).where(TelegramBot.id == bot_id, TelegramBot.deleted_at.is_(None))
+                        )
+                        if token is None:
+                            raise RuntimeError(f"bot {bot_id} is gone")
+                        media = await self._fetch(db, token, file_id)
+                    else:
+                        self.deduplicated += 1
+                except MediaTooLarge:
+                    await db.rollback()
+                    self.too_large += 1
+                    await self._finish(db, attachment_id, status="too_large")
+                    span.set(status="too_large")
+                    return "too_large"
+                except Exception as e:
+                    await db.rollback()
+                    status = "failed" if attempts >= self.MAX_ATTEMPTS else "pending"
+                    if status == "failed":
+                        self.failed += 1
+                    print(f"Error downloading media {attachment_id} (attempt {attempts}): {e}")
+                    await self._finish(db, attachment_id, status=status)
+                    span.set(status=status)
+                    return status
+                
+                await self._finish(
+                    db, attachment_id, status="stored", media_file_id=media.id, size_bytes=media.size_bytes
+                )
+                span.set(status="stored", size_bytes=media.size_bytes)
+                return "stored"
+    
+    async def _known(self, db: AsyncSession, unique_id: Optional[str]) -> Optional[MediaFile]:
+        """The stored file of an earlier attachment of the same Telegram file."""
+        if not unique_id:
+            return None
+        result = await db.execute(
+            select(MediaFile)
+            .join(MessageAttachment, MessageAttachment.media_file_id == MediaFile.id)
+            .where(MessageAttachment.telegram_file_unique_id == unique_id, MessageAttachment.status == "stored")
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    async def _fetch(self, db: AsyncSession, token: str, file_id: str) -> MediaFile:
+        info = await telegram_service.get_file(token, file_id)
+        if not info or not info.get("file_path"):
+            raise RuntimeError("getFile failed")
+        if (info.get("file_size") or 0) > self.max_bytes:
+            raise MediaTooLarge()
+        
+        url = f"{settings.telegram_api_url}/file/bot{token}/{info['file_path']}"
+        tmp_path = os.path.join(self.media_dir, "tmp", uuid.uuid4().hex)
+        try:
+            sha256, size = await self._stream_to_disk(url, tmp_path)
+            media = await self._store(db, sha256, size, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.downloaded += 1
+        self.downloaded_bytes += size
+        return media
+    
+    @staticmethod
+    def _write_chunk(f, hasher, chunk: bytes) -> None:
+        hasher.update(chunk)
+        f.write(chunk)
+    
+    async def _stream_to_disk(self, url: str, tmp_path: str) -> Tuple[str, int]:
+        """Download `url` to `tmp_path` chunk by chunk; (sha256, size)."""
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            async with asyncio.timeout(self.timeout):
+                async with self._get_client().stream("GET", url) as response:
+                    response.raise_for_status()
+                    if int(response.headers.get("content-length") or 0) > self.max_bytes:
+                        raise MediaTooLarge()
+                    async for chunk in response.aiter_bytes(self.chunk_bytes):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise MediaTooLarge()
+                        await asyncio.to_thread(self._write_chunk, f, hasher, chunk)
+            await asyncio.to_thread(os.fsync, f.fileno())
+        return hasher.hexdigest(), size
+    
+    def _move(self, tmp_path: str, relative_path: str) -> None:
+        path = os.path.join(self.media_dir, relative_path)
+        if os.path.exists(path):
+            return  # Same content already stored; the caller drops the copy
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    
+    async def _store(self, db: AsyncSession, sha256: str, size: int, tmp_path: str) -> MediaFile:
+        relative_path = os.path.join(sha256[:2], sha256)
+        await asyncio.to_thread(self._move, tmp_path, relative_path)
+        
+        media = await db.scalar(select(MediaFile).where(MediaFile.sha256 == sha256))
+        if media is not None:
+            self.deduplicated += 1
+            return media
+        media = MediaFile(sha256=sha256, path=relative_path, size_bytes=size)
+        db.add(media)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another process stored the same content meanwhile
+            await db.rollback()
+            media = await db.scalar(select(MediaFile).where(MediaFile.sha256 == sha256))
+        return media
+    
+    # Dashboard
+    
+    async def attachments_for(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        conversation_id: int,
+        message_ids: List[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """Attachment of each message of the conversation that has one, by message id."""
+        if not message_ids:
+            return {}
+        result = await db.execute(
+            select(*ATTACHMENT_COLUMNS).where(
+                MessageAttachment.conversation_id == conversation_id,
+                MessageAttachment.message_id.in_(message_ids)
+            )
+        )
+        return {row.message_id: {k: v for k, v in row._asdict().items() if k != "message_id"} for row in result.all()}
+    
+    @staticmethod
+    def content_type(mime_type: Optional[str]) -> Tuple[str, str]:
+        """(Content-Type, disposition) to serve a stored file with: inline only for allowlisted types."""
+        normalized = (mime_type or "").split(";", 1)[0].strip().lower()
+        if normalized in INLINE_MIME_TYPES:
+            return normalized, "inline"
+        return "application/octet-stream", "attachment"
+    
+    @staticmethod
+    def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+        """
+        First and last byte of a single `bytes=` range, or None to send the
+        whole file (no header, other units, several ranges). Raises
+        ValueError when the range lies outside the file.
+        """
+        if not header or not header.startswith("bytes=") or "," in header:
+            return None
+        first, _, last = header[len("bytes="):].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start = max(0, size - int(last))
+                end = size - 1
+        except ValueError:
+            return None
+        if start >= size or start > end or start < 0:
+            raise ValueError("range not satisfiable")
+        return start, min(end, size - 1)
+    
+    def path_of(self, relative_path: str) -> str:
+        return os.path.join(self.media_dir, relative_path)
+    
+    async def iter_file(self, relative_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Bytes `start`..`end` of a stored file, read off the event loop in chunks."""
+        f = await asyncio.to_thread(open, self.path_of(relative_path), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(self.chunk_bytes, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+    
+    # Cleanup
+    
+    async def purge_unreferenced(self, db: AsyncSession) -> int:
+        """Remove stored files no attachment points to any more, e.g. after a bot deletion; committed by the caller."""
+        result = await db.execute(
+            select(MediaFile.id, MediaFile.path).where(
+                MediaFile.created_at < datetime.utcnow() - self.GARBAGE_AFTER,
+                ~exists().where(MessageAttachment.media_file_id == MediaFile.id)
+            )
+        )
+        rows = result.all()
+        if not rows:
+            return 0
+        await db.execute(delete(MediaFile).where(MediaFile.id.in_([row.id for row in rows])))
+        
+        def remove_files():
+            for row in rows:
+                try:
+                    os.remove(self.path_of(row.path))
+                except OSError:
+                    pass
+        
+        await asyncio.to_thread(remove_files)
+        return len(rows)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "downloaded": self.downloaded,
+            "downloaded_bytes": self.downloaded_bytes,
+            "deduplicated": self.deduplicated,
+            "too_large": self.too_large,
+            "failed": self.failed,
+        }
+
+
+# Singleton instance
+media_service = MediaService(
+    media_dir=settings.media_dir,
+    max_bytes=settings.media_max_bytes,
+    workers=settings.media_download_workers,
+    queue_size=settings.media_queue_size,
+    chunk_bytes=settings.media_chunk_bytes,
+    timeout=settings.media_download_timeout
+)
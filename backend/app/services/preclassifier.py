@@ -0,0 +1,131 @@
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.routing import CannedAnswer
+
+settings = get_settings()
+
+
+class RouteDecision:
+    """Outcome of pre-classifying a message."""
+    
+    LLM = "llm"
+    CANNED = "canned"
+    HANDOFF = "handoff"
+    
+    def __init__(self, decision: str, rule: Optional[str] = None, answer: Optional[str] = None, latency_us: int = 0):
+        self.decision = decision
+        self.rule = rule
+        self.answer = answer
+        self.latency_us = latency_us
+    
+    def __repr__(self):
+        return f"<RouteDecision {self.decision} {self.rule or ''}>"
+
+
+class PreClassifier:
+    """
+    Cheap local routing before the LLM call.
+    
+    Explicit requests for a human are escalated by keyword rules, and
+    questions the owner has already answered get the canned answer
+    (fuzzy matched). Everything else goes to the LLM.
+    """
+    
+    HANDOFF_RULES = [
+        ("call_manager", r"\b(позов|позва|пригласи)\w*\s+(мне\s+)?(менеджер|оператор|человек|админ|владел|руководител)\w*"),
+        ("connect_manager", r"\b(соедини|свяжи|переключи)\w*\s+(меня\s+)?(с|на)\s+(менеджер|оператор|человек|админ|владел|руководител)\w*"),
+        ("talk_to_human", r"\b(хочу|можно|могу)\s+(ли\s+)?(я\s+)?(поговорить|связаться|пообщаться)\s+с\s+(менеджер|оператор|человек|живым|админ|владел)\w*"),
+        ("live_human", r"\bжив\w*\s+(человек|оператор|менеджер)\w*"),
+        ("bare_request", r"^\W*(менеджер|оператор|человек|администратор)\W*$"),
+        ("talk_to_human_en", r"\b(talk|speak|chat)\s+(to|with)\s+(a\s+)?(human|manager|operator|person|agent)\b"),
+    ]
+    
+    def __init__(self, match_threshold: float = 0.85, cache_ttl: float = 60.0):
+        self.match_threshold = match_threshold
+        self.cache_ttl = cache_ttl
+        self._handoff_rules = [
+            (name, re.compile(pattern, re.IGNORECASE)) for name, pattern in self.HANDOFF_RULES
+        ]
+        # bot_id -> (loaded_at, [(id, normalized question, tokens, answer)])
+        self._canned: Dict[int, Tuple[float, List[tuple]]] = {}
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(re.findall(r"\w+", text.lower().replace("ё", "е")))
+    
+    def invalidate(self, bot_id: int) -> None:
+        self._canned.pop(bot_id, None)
+    
+    async def load_canned(self, db: AsyncSession, bot_id: int) -> List[tuple]:
+        cached = self._canned.get(bot_id)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        
+        result = await db.execute(
+            select(CannedAnswer.id, CannedAnswer.question, CannedAnswer.answer)
+            .where(CannedAnswer.bot_id == bot_id)
+        )
+        entries = []
+        for answer_id, question, answer in result.all():
+            normalized = self.normalize(question)
+            entries.append((answer_id, normalized, set(normalized.split()), answer))
+        
+        self._canned[bot_id] = (time.monotonic(), entries)
+        return entries
+    
+    def match_handoff(self, text: str) -> Optional[str]:
+        for name, pattern in self._handoff_rules:
+            if pattern.search(text):
+                return name
+        return None
+    
+    def match_canned(self, text: str, entries: List[tuple]) -> Optional[tuple]:
+        normalized = self.normalize(text)
+        if not normalized:
+            return None
+        tokens = set(normalized.split())
+        
+        best, best_score = None, 0.0
+        for entry in entries:
+            _, question, question_tokens, _ = entry
+            if normalized == question:
+                return entry
+            # Cheap token overlap filter before the character-level ratio
+            overlap = len(tokens & question_tokens) / max(len(tokens | question_tokens), 1)
+            if overlap < 0.5:
+                continue
+            score = SequenceMatcher(None, normalized, question).ratio()
+            if score > best_score:
+                best, best_score = entry, score
+        
+        return best if best_score >= self.match_threshold else None
+    
+    async def classify(self, db: AsyncSession, bot_id: int, text: str) -> RouteDecision:
+        started = time.perf_counter_ns()
+        
+        def done(decision: str, rule: Optional[str] = None, answer: Optional[str] = None) -> RouteDecision:
+            latency_us = (time.perf_counter_ns() - started) // 1000
+            return RouteDecision(decision, rule, answer, latency_us)
+        
+        rule = self.match_handoff(text)
+        if rule:
+            return done(RouteDecision.HANDOFF, rule)
+        
+        entry = self.match_canned(text, await self.load_canned(db, bot_id))
+        if entry:
+            return done(RouteDecision.CANNED, f"canned:{entry[0]}", entry[3])
+        
+        return done(RouteDecision.LLM)
+
+
+# Singleton instance
+preclassifier = PreClassifier(
+    match_threshold=settings.canned_match_threshold,
+    cache_ttl=settings.canned_cache_ttl_seconds
+)
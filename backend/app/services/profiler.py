@@ -0,0 +1,362 @@
+import asyncio
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class Capture:
+    """Stack samples of one request or background task."""
+    
+    __slots__ = ("task", "kind", "label", "samples", "slow_capture")
+    
+    def __init__(self, task: asyncio.Task, kind: str, label: Optional[str], slow_capture: bool = False):
+        self.task = task
+        self.kind = kind
+        self.label = label
+        self.samples: Counter = Counter()
+        self.slow_capture = slow_capture
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for the event loop.
+    
+    A daemon thread wakes every `interval_ms` and, for each profiled
+    request or task, records one stack: the Python stack of the loop
+    thread when that task is the one running, otherwise the chain of
+    coroutines it is suspended in, ending in "[await]". Time spent on
+    the CPU and time spent waiting on the database or upstream APIs
+    both show up.
+    
+    A `sample_rate` fraction of requests and background tasks is
+    profiled. The others are only timed; when one is slower than its
+    threshold, the next `slow_capture` runs of the same route or task
+    are profiled in full. Each profile is written as collapsed stacks
+    (`frame;frame;frame count`, readable by flamegraph.pl and
+    speedscope) to `directory`, which keeps the newest `max_files`.
+    """
+    
+    # Event loop and server frames around the application's own code
+    SKIP_PATHS = tuple(
+        f"{os.sep}{name}{os.sep}" for name in ("asyncio", "concurrent", "uvicorn", "anyio", "starlette", "fastapi")
+    ) + (f"{os.sep}threading.py", f"{os.sep}selectors.py")
+    
+    def __init__(
+        self,
+        directory: str = "./profiles",
+        sample_rate: float = 0.01,
+        interval_ms: float = 5.0,
+        slow_request_ms: float = 1000.0,
+        slow_task_ms: float = 15000.0,
+        slow_capture: int = 5,
+        max_files: int = 500
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.slow_request_ms = slow_request_ms
+        self.slow_task_ms = slow_task_ms
+        self.slow_capture = slow_capture
+        self.max_files = max_files
+        self.enabled = False
+        self._captures: Dict[asyncio.Task, Capture] = {}
+        self._flagged: Dict[Tuple[str, str], int] = {}  # (kind, label) -> runs left to capture in full
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._names: Dict[Any, str] = {}
+        self.samples = 0
+        self.written = 0
+        self.slow = 0
+    
+    # Control
+    
+    def enable(
+        self,
+        sample_rate: Optional[float] = None,
+        slow_request_ms: Optional[float] = None,
+        slow_task_ms: Optional[float] = None
+    ) -> None:
+        """Start sampling; must be called from the event loop thread."""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_request_ms is not None:
+            self.slow_request_ms = slow_request_ms
+        if slow_task_ms is not None:
+            self.slow_task_ms = slow_task_ms
+        if self.enabled:
+            return
+        
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample_loop,
+            args=(threading.get_ident(),),
+            name="profiler",
+            daemon=True
+        )
+        self.enabled = True
+        self._thread.start()
+        print(f"Profiler enabled: sample_rate={self.sample_rate}, writing to {self.directory}")
+    
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._captures.clear()
+        self._flagged.clear()
+        print("Profiler disabled")
+    
+    def toggle(self) -> None:
+        """SIGUSR2 handler."""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+    
+    def install_signal_handler(self) -> None:
+        """`kill -USR2 <pid>` toggles profiling of that process."""
+        if not hasattr(signal, "SIGUSR2"):
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, self.toggle)
+        except (RuntimeError, ValueError):
+            # Not the main thread, e.g. under a test client
+            pass
+    
+    # Captures
+    
+    @property
+    def flagged(self) -> int:
+        """Routes and tasks waiting for a full capture after a slow run."""
+        return len(self._flagged)
+    
+    def _select(self, task: Optional[asyncio.Task], kind: str, label: Optional[str]) -> Optional[Capture]:
+        if not self.enabled or task is None:
+            return None
+        
+        key = (kind, label)
+        remaining = self._flagged.get(key) if label is not None else None
+        if remaining:
+            if remaining == 1:
+                del self._flagged[key]
+            else:
+                self._flagged[key] = remaining - 1
+        elif random.random() >= self.sample_rate:
+            return None
+        
+        capture = Capture(task, kind, label, slow_capture=bool(remaining))
+        self._captures[task] = capture
+        return capture
+    
+    def begin(self, kind: str, label: Optional[str] = None) -> Optional[Capture]:
+        """
+        Profile the current task if it is sampled, or if `label` was
+        flagged slow. Returns None when it is only timed.
+        """
+        return self._select(asyncio.current_task(), kind, label)
+    
+    def end(self, capture: Optional[Capture], kind: str, label: str, started: float) -> None:
+        """Finish a request or task begun at `started` (perf_counter) and write its profile."""
+        if capture is not None:
+            self._captures.pop(capture.task, None)
+            capture.label = label
+        if not self.enabled:
+            return
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        threshold = self.slow_request_ms if kind == "request" else self.slow_task_ms
+        is_slow = elapsed_ms >= threshold
+        if is_slow:
+            self.slow += 1
+            if capture is None:
+                # Not profiled this time: capture the next runs in full
+                self._flagged[(kind, label)] = self.slow_capture
+        
+        if capture is not None and capture.samples:
+            self._write_async(capture, elapsed_ms, is_slow)
+    
+    def watch_task(self, task: asyncio.Task, coro: Any, kind: Optional[str] = None) -> None:
+        """Time, and maybe profile, a background task started with `lifecycle.spawn`."""
+        if not self.enabled:
+            return
+        
+        label = kind or getattr(coro, "__qualname__", type(coro).__name__)
+        started = time.perf_counter()
+        capture = self._select(task, "task", label)
+        task.add_done_callback(lambda _: self.end(capture, "task", label, started))
+    
+    # Sampling
+    
+    def _name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            marker = f"{os.sep}app{os.sep}"
+            if marker in filename:
+                module = "app." + filename.rsplit(marker, 1)[1]
+            else:
+                module = os.sep.join(filename.split(os.sep)[-2:])
+            module = module.rsplit(".py", 1)[0].replace(os.sep, ".")
+            name = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+            self._names[code] = name
+        return name
+    
+    def _skipped(self, code) -> bool:
+        filename = code.co_filename
+        return any(path in filename for path in self.SKIP_PATHS)
+    
+    def _running_stack(self, frame, coro) -> List[str]:
+        """The loop thread's stack from the task's outermost coroutine down."""
+        root = getattr(coro, "cr_frame", None)
+        stack = []
+        while frame is not None:
+            if not self._skipped(frame.f_code):
+                stack.append(self._name(frame.f_code))
+            if frame is root:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+    
+    def _awaiting_stack(self, coro) -> List[str]:
+        stack = []
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+            if frame is None:
+                break
+            if not self._skipped(frame.f_code):
+                stack.append(self._name(frame.f_code))
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+        stack.append("[await]")
+        return stack
+    
+    def _sample_loop(self, loop_thread: int) -> None:
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            if not self._captures:
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            try:
+                running = asyncio.current_task(self._loop)
+            except RuntimeError:
+                running = None
+            for task, capture in list(self._captures.items()):
+                try:
+                    if task is running:
+                        stack = self._running_stack(frame, task.get_coro())
+                    else:
+                        stack = self._awaiting_stack(task.get_coro())
+                except (AttributeError, ValueError):
+                    # The coroutine changed under us; skip this sample
+                    continue
+                if not stack:
+                    continue
+                capture.samples[";".join(stack)] += 1
+                self.samples += 1
+    
+    # Output
+    
+    def _write_async(self, capture: Capture, elapsed_ms: float, is_slow: bool) -> None:
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, capture, elapsed_ms, is_slow)
+        except RuntimeError:
+            self._write(capture, elapsed_ms, is_slow)
+    
+    def _write(self, capture: Capture, elapsed_ms: float, is_slow: bool) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            label = "".join(c if c.isalnum() or c in "-_" else "_" for c in capture.label).strip("_")[:80]
+            flags = ("-slow" if is_slow else "") + ("-after-slow" if capture.slow_capture else "")
+            name = (
+                f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{capture.kind}-{label}"
+                f"-{elapsed_ms:.0f}ms{flags}.folded"
+            )
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+                # Copied first: the sampler thread may still be adding to it
+                for stack, count in sorted(list(capture.samples.items()), key=lambda item: -item[1]):
+                    f.write(f"{stack} {count}\n")
+            self.written += 1
+            self._rotate()
+        except OSError as e:
+            print(f"Error writing profile: {e}")
+    
+    def _rotate(self) -> None:
+        files = sorted(name for name in os.listdir(self.directory) if name.endswith(".folded"))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval_ms,
+            "slow_request_ms": self.slow_request_ms,
+            "slow_task_ms": self.slow_task_ms,
+            "directory": os.path.abspath(self.directory),
+            "active_captures": len(self._captures),
+            "flagged": len(self._flagged),
+            "samples": self.samples,
+            "profiles_written": self.written,
+            "slow": self.slow,
+        }
+
+
+class ProfilerMiddleware:
+    """ASGI middleware timing requests and profiling the ones the profiler picks."""
+    
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        # Matching the route up front is only needed to honour slow flags
+        capture = self.profiler.begin("request", self._label(scope) if self.profiler.flagged else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The matched route is only known afterwards; it keeps tokens out of file names
+            self.profiler.end(capture, "request", self._label(scope), started)
+    
+    @staticmethod
+    def _label(scope) -> str:
+        route = scope.get("route")
+        path = getattr(route, "path", None)
+        if path is None:
+            for candidate in getattr(scope.get("app"), "routes", ()):
+                match, _ = candidate.matches(scope)
+                if match.name == "FULL":
+                    path = candidate.path
+                    break
+        return f"{scope['method']} {path or 'unmatched'}"
+
+
+# Singleton instance
+profiler = SamplingProfiler(
+    directory=settings.profiler_dir,
+    sample_rate=settings.profiler_sample_rate,
+    interval_ms=settings.profiler_interval_ms,
+    slow_request_ms=settings.profiler_slow_request_ms,
+    slow_task_ms=settings.profiler_slow_task_ms,
+    slow_capture=settings.profiler_slow_capture,
+    max_files=settings.profiler_max_files
+)
@@ -0,0 +1,81 @@
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Bump whenever SYSTEM_PROMPT_TEMPLATE changes: cached prompts and
+# upstream prompt-cache sessions roll over to the new text.
+PROMPT_VERSION = 2
+
+SYSTEM_PROMPT_TEMPLATE = """Ты — AI-консультант для бизнеса. Отвечай профессионально и дружелюбно.
+
+Описание бизнеса:
+{business_description}
+
+Правила:
+1. Отвечай только на вопросы, связанные с данным бизнесом
+2. Если не знаешь точного ответа — честно скажи об этом
+3. Если вопрос требует ручного вмешательства владельца — укажи это
+4. Отвечай кратко и по делу
+5. Используй вежливый тон
+
+Если ты НЕ УВЕРЕН в ответе или вопрос слишком сложный, начни ответ с [UNSURE]."""
+
+# Namespace for deterministic X-Session-ID values
+SESSION_NAMESPACE = uuid.UUID("6f1c9a52-3e0b-4f57-9a43-6a1f1d2b7c10")
+
+
+def render_system_prompt(business_description: str) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.format(business_description=business_description)
+
+
+def session_id_for(conversation_id: int, bot_updated_at: Optional[datetime] = None) -> str:
+    """
+    Stable upstream session ID for a conversation.
+    
+    It changes with the prompt version and with bot edits, so the
+    upstream never reuses a cached prefix built from an old prompt.
+    """
+    stamp = bot_updated_at.isoformat() if bot_updated_at else ""
+    return str(uuid.uuid5(SESSION_NAMESPACE, f"{conversation_id}:{PROMPT_VERSION}:{stamp}"))
+
+
+class PromptCache:
+    """Rendered system prompts per bot, keyed by prompt version and bot revision."""
+    
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._prompts: "OrderedDict[int, Tuple[tuple, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, bot_id: int, business_description: str, bot_updated_at: Optional[datetime] = None) -> str:
+        revision = (PROMPT_VERSION, bot_updated_at)
+        cached = self._prompts.get(bot_id)
+        if cached is not None and cached[0] == revision:
+            self._prompts.move_to_end(bot_id)
+            self.hits += 1
+            return cached[1]
+        
+        self.misses += 1
+        prompt = render_system_prompt(business_description)
+        self._prompts[bot_id] = (revision, prompt)
+        self._prompts.move_to_end(bot_id)
+        if len(self._prompts) > self.max_size:
+            self._prompts.popitem(last=False)
+        return prompt
+    
+    def invalidate(self, bot_id: int) -> None:
+        self._prompts.pop(bot_id, None)
+    
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._prompts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": PROMPT_VERSION,
+        }
+
+
+# Singleton instance
+prompt_cache = PromptCache()
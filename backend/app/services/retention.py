@@ -0,0 +1,383 @@
+import asyncio
+import gzip
+import os
+import shutil
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from sqlalchemy import select, update, delete, func, or_, and_, exists, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from app.config import get_settings
+from app.database import async_session_maker, engine
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.retention import RetentionPolicy, ArchiveSegment
+from app.serialization import dumps, loads
+
+settings = get_settings()
+
+
+class RetentionService:
+    """
+    Moves old messages out of the `messages` table into compressed
+    archive segments, following each bot's RetentionPolicy.
+    
+    A run reads candidates in batches; each batch is written as one gzip
+    NDJSON file per conversation, then the ArchiveSegment rows are added
+    and the messages deleted in one short transaction. A crash in between
+    leaves a file the next run overwrites. Afterwards free pages are
+    handed back with incremental vacuum, when the database uses
+    auto_vacuum=INCREMENTAL (`python -m app.cli vacuum` converts one).
+    """
+    
+    # A run refreshes last_run_at after every batch; older than this, it has stopped
+    STALE_AFTER = timedelta(seconds=60)
+    # How often the background loop looks for policies that are due
+    POLL_SECONDS = 300
+    # Decompressed segments kept for operators paging back through history
+    CACHE_SEGMENTS = 32
+    
+    def __init__(
+        self,
+        archive_dir: str,
+        batch_size: int = 2000,
+        batch_pause: float = 0.05,
+        interval: float = 86400.0,
+        vacuum_pages: int = 1000
+    ):
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self._cache: "OrderedDict[int, List[dict]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.archived_messages = 0
+        self.segments_written = 0
+        self.vacuumed_pages = 0
+    
+    def _condition(self, policy: RetentionPolicy, now: datetime):
+        """Messages of the policy's bot that are due for the archive, or None."""
+        rules = []
+        if policy.archive_after_days:
+            rules.append(Message.created_at < now - timedelta(days=policy.archive_after_days))
+        if policy.inactive_after_days:
+            recent = Message.__table__.alias("recent")
+            rules.append(~exists().where(
+                recent.c.conversation_id == Message.conversation_id,
+                recent.c.created_at >= now - timedelta(days=policy.inactive_after_days)
+            ))
+        if not rules:
+            return None
+        
+        conversation_ids = select(Conversation.id).where(Conversation.bot_id == policy.bot_id)
+        return and_(Message.conversation_id.in_(conversation_ids), or_(*rules))
+    
+    async def _claim(self, db: AsyncSession, policy_id: int, force: bool) -> bool:
+        now = datetime.utcnow()
+        # A forced run only waits for a running one to stop heartbeating
+        due_after = self.STALE_AFTER if force else timedelta(seconds=self.interval)
+        conditions = [
+            RetentionPolicy.id == policy_id,
+            RetentionPolicy.enabled == True,
+            or_(RetentionPolicy.last_run_at.is_(None), RetentionPolicy.last_run_at < now - due_after)
+        ]
+        result = await db.execute(
+            update(RetentionPolicy)
+            .where(*conditions)
+            .values(last_run_at=now, updated_at=RetentionPolicy.updated_at)
+        )
+        await db.commit()
+        return result.rowcount == 1
+    
+    def _write_file(self, relative_path: str, data: bytes) -> int:
+        path = os.path.join(self.archive_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as compressed:
+                compressed.write(data)
+            # The rows are deleted right after; the file must be on disk first
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+    
+    async def _write_segment(self, bot_id: int, conversation_id: int, rows: list) -> ArchiveSegment:
+        data = b"".join(
+            dumps({
+                "id": row.id,
+                "role": row.role,
+                "content": row.content,
+                "telegram_message_id": row.telegram_message_id,
+                "created_at": row.created_at,
+            }) + b"\n"
+            for row in rows
+        )
+        relative_path = os.path.join(str(bot_id), str(conversation_id), f"{rows[0].id}-{rows[-1].id}.ndjson.gz")
+        size = await asyncio.to_thread(self._write_file, relative_path, data)
+        
+        return ArchiveSegment(
+            bot_id=bot_id,
+            conversation_id=conversation_id,
+            path=relative_path,
+            message_count=len(rows),
+            first_message_id=rows[0].id,
+            last_message_id=rows[-1].id,
+            first_created_at=rows[0].created_at,
+            last_created_at=rows[-1].created_at,
+            size_bytes=size
+        )
+    
+    async def run_policy(self, policy_id: int, force: bool = False) -> int:
+        """Archive the messages one policy selects; returns how many were moved."""
+        archived = 0
+        async with async_session_maker() as db:
+            if not await self._claim(db, policy_id, force):
+                return 0  # Not due, disabled, or another process is running it
+            
+            policy = await db.get(RetentionPolicy, policy_id)
+            condition = self._condition(policy, datetime.utcnow())
+            if condition is None:
+                return 0
+            
+            try:
+                while True:
+                    result = await db.execute(
+                        select(
+                            Message.id,
+                            Message.conversation_id,
+                            Message.role,
+                            Message.content,
+                            Message.telegram_message_id,
+                            Message.created_at
+                        )
+                        .where(condition)
+                        .order_by(Message.conversation_id, Message.id)
+                        .limit(self.batch_size)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        break
+                    
+                    by_conversation: Dict[int, list] = defaultdict(list)
+                    for row in rows:
+                        by_conversation[row.conversation_id].append(row)
+                    for conversation_id, messages in by_conversation.items():
+                        db.add(await self._write_segment(policy.bot_id, conversation_id, messages))
+                    
+                    await db.execute(delete(Message).where(Message.id.in_([row.id for row in rows])))
+                    # Heartbeat, so a forced run does not start alongside this one
+                    policy.last_run_at = datetime.utcnow()
+                    await db.commit()
+                    
+                    archived += len(rows)
+                    self.segments_written += len(by_conversation)
+                    if len(rows) < self.batch_size:
+                        break
+                    await asyncio.sleep(self.batch_pause)
+            except Exception as e:
+                print(f"Error archiving messages of bot {policy.bot_id}: {e}")
+                await db.rollback()
+        
+        self.archived_messages += archived
+        return archived
+    
+    async def run_all(self, bot_id: Optional[int] = None, force: bool = False) -> int:
+        """Run every enabled policy that is due, then vacuum what was freed."""
+        async with async_session_maker() as db:
+            query = select(RetentionPolicy.id).where(RetentionPolicy.enabled == True)
+            if bot_id is not None:
+                query = query.where(RetentionPolicy.bot_id == bot_id)
+            policy_ids = (await db.execute(query)).scalars().all()
+        
+        archived = 0
+        for policy_id in policy_ids:
+            archived += await self.run_policy(policy_id, force=force)
+        if archived:
+            await self.vacuum()
+        return archived
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.POLL_SECONDS)
+            try:
+                await self.run_all()
+            except Exception as e:
+                print(f"Error running retention policies: {e}")
+    
+    async def vacuum(self) -> int:
+        """
+        Return free pages to the filesystem a few at a time, so the write
+        lock is only held briefly. A no-op unless auto_vacuum is INCREMENTAL.
+        """
+        if engine.dialect.name != "sqlite":
+            return 0
+        
+        freed = 0
+        async with engine.connect() as conn:
+            if (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() != 2:
+                return 0
+            await conn.commit()
+            # The sqlite3 module steps a statement once, which frees a single
+            # page; executescript runs the pragma to completion
+            raw = await conn.get_raw_connection()
+            while True:
+                free_pages = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+                await conn.commit()
+                if not free_pages:
+                    break
+                step = min(free_pages, self.vacuum_pages)
+                await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({step})")
+                freed += step
+                await asyncio.sleep(self.batch_pause)
+        
+        self.vacuumed_pages += freed
+        return freed
+    
+    async def enable_incremental_vacuum(self) -> None:
+        """Switch an existing database to auto_vacuum=INCREMENTAL; rewrites the whole file once."""
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+    
+    async def reserve_archived_ids(self) -> None:
+        """
+        Keep new messages above every archived id. AUTOINCREMENT (see
+        Message) guarantees it from then on; a database whose table was
+        rebuilt with it may already have lost the rows above the archive.
+        """
+        if engine.dialect.name != "sqlite":
+            return
+        async with engine.begin() as conn:
+            archived = await conn.scalar(select(func.max(ArchiveSegment.last_message_id)))
+            if archived is None:
+                return
+            sequence = await conn.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = 'messages'"))
+            if sequence is None:
+                await conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('messages', :seq)"), {"seq": archived})
+            elif sequence < archived:
+                await conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'messages'"), {"seq": archived})
+    
+    def _read_file(self, relative_path: str) -> List[dict]:
+        with gzip.open(os.path.join(self.archive_dir, relative_path), "rb") as f:
+            messages = [loads(line) for line in f if line.strip()]
+        for message in messages:
+            if message["created_at"]:
+                message["created_at"] = datetime.fromisoformat(message["created_at"])
+        return messages
+    
+    async def read_segment(self, segment: ArchiveSegment, cache: bool = True) -> List[dict]:
+        """Messages of a segment (or a row with its id and path), oldest first."""
+        if segment.id in self._cache:
+            self._cache.move_to_end(segment.id)
+            return self._cache[segment.id]
+        
+        messages = await asyncio.to_thread(self._read_file, segment.path)
+        if cache:
+            self._cache[segment.id] = messages
+            while len(self._cache) > self.CACHE_SEGMENTS:
+                self._cache.popitem(last=False)
+        return messages
+    
+    async def get_messages(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        conversation_id: int,
+        before_id: Optional[int],
+        limit: int
+    ) -> Tuple[List[dict], bool]:
+        """
+        Up to `limit` archived messages of a conversation with ids below
+        `before_id`, oldest first, and whether older ones remain.
+        """
+        # Only the columns read_segment needs, so a read-only connection works too
+        query = select(ArchiveSegment.id, ArchiveSegment.path).where(ArchiveSegment.conversation_id == conversation_id)
+        if before_id is not None:
+            query = query.where(ArchiveSegment.first_message_id < before_id)
+        segments = (await db.execute(query.order_by(ArchiveSegment.last_message_id.desc()))).all()
+        if limit <= 0:
+            return [], bool(segments)
+        
+        collected: List[dict] = []
+        for segment in segments:
+            messages = await self.read_segment(segment)
+            if before_id is not None:
+                messages = [m for m in messages if m["id"] < before_id]
+            collected = messages + collected
+            if len(collected) > limit:
+                return collected[-limit:], True
+        return collected, False
+    
+    async def iter_segments(
+        self,
+        db: AsyncSession,
+        bot_id: Optional[int] = None,
+        created_after: Optional[datetime] = None
+    ) -> AsyncIterator[Tuple[ArchiveSegment, List[dict]]]:
+        """
+        Every segment with its messages, by conversation and in time order;
+        with `created_after`, only segments holding newer messages.
+        """
+        query = select(ArchiveSegment).order_by(ArchiveSegment.conversation_id, ArchiveSegment.first_message_id)
+        if bot_id is not None:
+            query = query.where(ArchiveSegment.bot_id == bot_id)
+        if created_after is not None:
+            query = query.where(ArchiveSegment.last_created_at > created_after)
+        for segment in (await db.execute(query)).scalars().all():
+            yield segment, await self.read_segment(segment, cache=False)
+    
+    async def archive_stats(self, db: AsyncSession, bot_id: int) -> dict:
+        result = await db.execute(
+            select(
+                func.count(ArchiveSegment.id),
+                func.coalesce(func.sum(ArchiveSegment.message_count), 0),
+                func.coalesce(func.sum(ArchiveSegment.size_bytes), 0)
+            ).where(ArchiveSegment.bot_id == bot_id)
+        )
+        segments, messages, size = result.one()
+        return {"archive_segments": segments, "archived_messages": messages, "archive_bytes": size}
+    
+    async def purge_bot(self, db: AsyncSession, bot_id: int) -> None:
+        """Remove a bot's policy, segment rows and archive files."""
+        result = await db.execute(select(ArchiveSegment.id).where(ArchiveSegment.bot_id == bot_id))
+        for segment_id in result.scalars().all():
+            self._cache.pop(segment_id, None)
+        await db.execute(delete(ArchiveSegment).where(ArchiveSegment.bot_id == bot_id))
+        await db.execute(delete(RetentionPolicy).where(RetentionPolicy.bot_id == bot_id))
+        await asyncio.to_thread(
+            shutil.rmtree, os.path.join(self.archive_dir, str(bot_id)), ignore_errors=True
+        )
+    
+    def snapshot(self) -> dict:
+        return {
+            "archived_messages": self.archived_messages,
+            "segments_written": self.segments_written,
+            "vacuumed_pages": self.vacuumed_pages,
+            "cached_segments": len(self._cache),
+        }
+
+
+# Singleton instance
+retention_service = RetentionService(
+    archive_dir=settings.archive_dir,
+    batch_size=settings.archive_batch_size,
+    batch_pause=settings.archive_batch_pause,
+    interval=settings.retention_interval_seconds,
+    vacuum_pages=settings.vacuum_pages_per_step
+)
@@ -0,0 +1,167 @@
+import base64
+from typing import Optional, List, Tuple, Any, Union
+from sqlalchemy import text, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from app.database import engine
+
+
+class SearchService:
+    """
+    Full-text search over message history backed by SQLite FTS5.
+    
+    Covers live messages only: the index reads its text from `messages`,
+    so archiving a message (retention) also removes it from the index.
+    """
+    
+    # External-content FTS5 table: the index stores only tokens, the text
+    # itself stays in `messages` and is not duplicated.
+    FTS_TABLE = "messages_fts"
+    
+    DDL = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+        END""",
+    ]
+    
+    @property
+    def is_available(self) -> bool:
+        return engine.dialect.name == "sqlite"
+    
+    async def ensure_index(self) -> None:
+        """Create the FTS5 table and sync triggers, backfilling on first run."""
+        if not self.is_available:
+            return
+        
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": self.FTS_TABLE}
+            )
+            existed = result.scalar() is not None
+            
+            for statement in self.DDL:
+                await conn.execute(text(statement))
+            
+            if not existed:
+                # Index messages written before the triggers existed
+                await conn.execute(
+                    text(f"INSERT INTO {self.FTS_TABLE}({self.FTS_TABLE}) VALUES ('rebuild')")
+                )
+    
+    @staticmethod
+    def build_match_query(query: str) -> Optional[str]:
+        """
+        Turn free user input into a safe FTS5 MATCH expression.
+        
+        Every word is quoted so FTS5 operators in the input are treated as
+        plain text; the last word gets a prefix match for search-as-you-type.
+        """
+        terms = [t.replace('"', '""') for t in query.split() if t.strip('"')]
+        if not terms:
+            return None
+        
+        quoted = [f'"{t}"' for t in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+    
+    @staticmethod
+    def encode_cursor(rank: float, message_id: int) -> str:
+        raw = f"{rank!r}:{message_id}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[Tuple[float, int]]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            rank, message_id = raw.split(":", 1)
+            return float(rank), int(message_id)
+        except Exception:
+            return None
+    
+    async def search_messages(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        user_id: int,
+        query: str,
+        bot_id: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[Tuple[float, int]] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Search messages of the user's bots, best matches first.
+        
+        Pagination is keyset-based on (rank, message id), so deep pages
+        cost the same as the first one.
+        
+        Returns:
+            Tuple of (rows, next_cursor)
+        """
+        match = self.build_match_query(query)
+        if match is None:
+            return [], None
+        
+        conditions = [
+            f"{self.FTS_TABLE} MATCH :match",
+            "b.user_id = :user_id",
+            "b.deleted_at IS NULL",
+        ]
+        params = {"match": match, "user_id": user_id, "limit": limit + 1}
+        
+        if bot_id is not None:
+            conditions.append("c.bot_id = :bot_id")
+            params["bot_id"] = bot_id
+        
+        if cursor is not None:
+            conditions.append(
+                f"({self.FTS_TABLE}.rank > :after_rank "
+                f"OR ({self.FTS_TABLE}.rank = :after_rank AND m.id > :after_id))"
+            )
+            params["after_rank"], params["after_id"] = cursor
+        
+        sql = f"""
+            SELECT
+                m.id AS message_id,
+                m.conversation_id AS conversation_id,
+                c.bot_id AS bot_id,
+                m.role AS role,
+                m.created_at AS created_at,
+                snippet({self.FTS_TABLE}, 0, '<b>', '</b>', '…', 16) AS snippet,
+                {self.FTS_TABLE}.rank AS rank
+            FROM {self.FTS_TABLE}
+            JOIN messages m ON m.id = {self.FTS_TABLE}.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            JOIN telegram_bots b ON b.id = c.bot_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {self.FTS_TABLE}.rank, m.id
+            LIMIT :limit
+        """
+        
+        # Typed so rows carry datetimes, not SQLite's text timestamps
+        result = await db.execute(text(sql).columns(created_at=DateTime), params)
+        rows = result.all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(last.rank, last.message_id)
+        
+        return rows, next_cursor
+
+
+# Singleton instance
+search_service = SearchService()
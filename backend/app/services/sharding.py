@@ -0,0 +1,314 @@
+import asyncio
+import bisect
+import hashlib
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, delete, and_, or_
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.inbound import InboundUpdate
+from app.services.coordination import CoordinationStore
+from app.services.conversation_cache import conversation_cache
+from app.services.lifecycle import lifecycle
+from app.serialization import dumps_str, loads
+
+settings = get_settings()
+
+INGEST_ROLE = "ingest"
+
+
+def shard_for(bot_token: str, shard_count: int = settings.shard_count) -> int:
+    """Fixed shard of a bot; all its chats live on the same shard."""
+    return zlib.crc32(bot_token.encode()) % shard_count
+
+
+class HashRing:
+    """
+    Consistent hashing of shards onto workers.
+    
+    Each worker owns `replicas` points on the ring; a shard belongs to the
+    first point at or after its hash. Adding or removing a worker moves
+    only the shards adjacent to its points.
+    """
+    
+    def __init__(self, nodes: List[str], replicas: int = 64):
+        self.nodes = sorted(nodes)
+        self._points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._keys = [point for point, _ in self._points]
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+    
+    def node_for(self, shard: int) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._keys, self._hash(f"shard:{shard}")) % len(self._points)
+        return self._points[index][1]
+    
+    def shards_of(self, node: str, shard_count: int) -> List[int]:
+        return [shard for shard in range(shard_count) if self.node_for(shard) == node]
+
+
+class InboundQueue:
+    """Durable queue of webhook updates between API and ingest workers."""
+    
+    async def enqueue(self, bot_token: str, chat_id: int, payload: Dict[str, Any]) -> None:
+        async with async_session_maker() as db:
+            db.add(InboundUpdate(
+                shard=shard_for(bot_token),
+                bot_token=bot_token,
+                chat_id=chat_id,
+                payload=dumps_str(payload)
+            ))
+            await db.commit()
+    
+    async def claim(self, worker_id: str, shards: List[int], limit: int) -> List[InboundUpdate]:
+        """
+        Claim the oldest unclaimed updates of the given shards.
+        
+        Chats that still have updates claimed by another worker (e.g. the
+        previous owner after a rebalance) are skipped until those finish,
+        so each chat is processed by one worker at a time and in order.
+        Likewise an update waiting out its retry backoff holds back the
+        later updates of its chat.
+        """
+        if not shards:
+            return []
+        
+        now = datetime.utcnow()
+        async with async_session_maker() as db:
+            busy = InboundUpdate.__table__.alias("busy")
+            result = await db.execute(
+                select(InboundUpdate.id)
+                .where(
+                    InboundUpdate.shard.in_(shards),
+                    InboundUpdate.claimed_by.is_(None),
+                    InboundUpdate.failed_at.is_(None),
+                    or_(InboundUpdate.not_before.is_(None), InboundUpdate.not_before <= now),
+                    ~select(busy.c.id).where(
+                        and_(
+                            busy.c.bot_token == InboundUpdate.bot_token,
+                            busy.c.chat_id == InboundUpdate.chat_id,
+                            or_(
+                                and_(busy.c.claimed_by.is_not(None), busy.c.claimed_by != worker_id),
+                                and_(
+                                    busy.c.id < InboundUpdate.id,
+                                    busy.c.failed_at.is_(None),
+                                    busy.c.not_before > now
+                                )
+                            )
+                        )
+                    ).exists()
+                )
+                .order_by(InboundUpdate.id)
+                .limit(limit)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                return []
+            # End the read transaction so the claim starts a fresh write one;
+            # upgrading a WAL read snapshot fails at once instead of waiting
+            await db.commit()
+            
+            await db.execute(
+                update(InboundUpdate)
+                .where(InboundUpdate.id.in_(ids), InboundUpdate.claimed_by.is_(None))
+                .values(claimed_by=worker_id, attempts=InboundUpdate.attempts + 1)
+            )
+            await db.commit()
+            
+            result = await db.execute(
+                select(InboundUpdate)
+                .where(InboundUpdate.id.in_(ids), InboundUpdate.claimed_by == worker_id)
+                .order_by(InboundUpdate.id)
+            )
+            return result.scalars().all()
+    
+    async def complete(self, update_id: int) -> None:
+        async with async_session_maker() as db:
+            await db.execute(delete(InboundUpdate).where(InboundUpdate.id == update_id))
+            await db.commit()
+    
+    async def fail(self, update_id: int, error: str) -> None:
+        """Set an update aside for good; the row stays for inspection."""
+        async with async_session_maker() as db:
+            await db.execute(
+                update(InboundUpdate)
+                .where(InboundUpdate.id == update_id)
+                .values(claimed_by=None, failed_at=datetime.utcnow(), error=error[:500])
+            )
+            await db.commit()
+    
+    async def postpone(self, update_id: int, delay: float, release_ids: List[int]) -> None:
+        """Retry an update after `delay` seconds and unclaim `release_ids`, the rest of its chat."""
+        async with async_session_maker() as db:
+            await db.execute(
+                update(InboundUpdate)
+                .where(InboundUpdate.id == update_id)
+                .values(claimed_by=None, not_before=datetime.utcnow() + timedelta(seconds=delay))
+            )
+            await db.execute(
+                update(InboundUpdate).where(InboundUpdate.id.in_(release_ids)).values(claimed_by=None)
+            )
+            await db.commit()
+    
+    async def unclaim(self, update_ids: List[int]) -> None:
+        async with async_session_maker() as db:
+            await db.execute(
+                update(InboundUpdate).where(InboundUpdate.id.in_(update_ids)).values(claimed_by=None)
+            )
+            await db.commit()
+    
+    async def release(self, worker_ids: Optional[List[str]] = None, keep: Optional[List[str]] = None) -> int:
+        """
+        Unclaim updates of the given workers, or of every worker not in
+        `keep` (i.e. whose lease expired), so they can be claimed again.
+        """
+        stmt = update(InboundUpdate).where(InboundUpdate.claimed_by.is_not(None))
+        if worker_ids is not None:
+            stmt = stmt.where(InboundUpdate.claimed_by.in_(worker_ids))
+        if keep is not None:
+            stmt = stmt.where(InboundUpdate.claimed_by.not_in(keep))
+        
+        async with async_session_maker() as db:
+            result = await db.execute(stmt.values(claimed_by=None))
+            await db.commit()
+            return result.rowcount
+
+
+class IngestionWorker:
+    """
+    Processes the queued updates of the shards this worker owns.
+    
+    Ownership comes from a hash ring over the ingest workers holding a
+    live lease in the coordination store, recomputed on every heartbeat,
+    so shards move to the remaining workers when one stops or dies.
+    Updates of one chat run strictly one after another. A failed update
+    is retried after a backoff doubling from `ingest_retry_backoff_seconds`,
+    and set aside after `ingest_max_attempts` claims so the rest of its
+    chat goes on.
+    """
+    
+    def __init__(
+        self,
+        worker_id: str,
+        store: CoordinationStore,
+        handler: Callable[[Dict[str, Any], bool], Awaitable[None]],
+        queue: Optional[InboundQueue] = None
+    ):
+        self.worker_id = worker_id
+        self.store = store
+        self.handler = handler
+        self.queue = queue or inbound_queue
+        self.shards: List[int] = []
+        self.members: List[str] = []
+        self._chats: Dict[Tuple[str, int], Deque[InboundUpdate]] = {}
+        self._semaphore = asyncio.Semaphore(settings.ingest_concurrency)
+        self._stopping = asyncio.Event()
+        self.processed = 0
+        self.failed = 0
+        self.rebalances = 0
+    
+    async def _heartbeat(self) -> None:
+        await self.store.heartbeat(self.worker_id, INGEST_ROLE, settings.worker_lease_seconds)
+        members = await self.store.live_workers(INGEST_ROLE)
+        if members != self.members:
+            self.members = members
+            self.shards = HashRing(members).shards_of(self.worker_id, settings.shard_count)
+            self.rebalances += 1
+            print(f"Worker {self.worker_id} owns {len(self.shards)}/{settings.shard_count} shards ({len(members)} workers)")
+        # Claims of workers whose lease expired go back to the queue
+        await self.queue.release(keep=members)
+    
+    def _dispatch(self, item: InboundUpdate) -> None:
+        key = (item.bot_token, item.chat_id)
+        if key in self._chats:
+            self._chats[key].append(item)
+            return
+        self._chats[key] = deque([item])
+        lifecycle.spawn(self._drain_chat(key))
+    
+    async def _drain_chat(self, key: Tuple[str, int]) -> None:
+        pending = self._chats[key]
+        try:
+            while pending:
+                item = pending[0]
+                try:
+                    async with self._semaphore:
+                        await self.handler(loads(item.payload), item.attempts > 1)
+                except Exception as e:
+                    print(f"Error processing queued update {item.id} (attempt {item.attempts}): {e}")
+                    if item.attempts < settings.ingest_max_attempts:
+                        # Give the chat back in order; a claim after the backoff retries it
+                        delay = settings.ingest_retry_backoff_seconds * 2 ** (item.attempts - 1)
+                        await self.queue.postpone(item.id, delay, [later.id for later in list(pending)[1:]])
+                        return
+                    await self.queue.fail(item.id, str(e) or type(e).__name__)
+                    pending.popleft()
+                    self.failed += 1
+                    continue
+                await self.queue.complete(item.id)
+                pending.popleft()
+                self.processed += 1
+        except Exception as e:
+            print(f"Error updating the inbound queue: {e}")
+            await self.queue.unclaim([item.id for item in pending])
+        finally:
+            self._chats.pop(key, None)
+    
+    async def run(self) -> None:
+        # Claims left by a previous run under the same id are ours to redo
+        await self.queue.release(worker_ids=[self.worker_id])
+        next_heartbeat = 0.0
+        
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    await self._heartbeat()
+                    next_heartbeat = time.monotonic() + settings.worker_lease_seconds / 3
+                
+                # Control changes made by API processes, before any update is handled
+                await conversation_cache.sync()
+                claimed = await self.queue.claim(self.worker_id, self.shards, settings.ingest_batch_size)
+                for item in claimed:
+                    self._dispatch(item)
+                if len(claimed) == settings.ingest_batch_size:
+                    continue
+            except Exception as e:
+                print(f"Error in ingest worker {self.worker_id}: {e}")
+            
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.ingest_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stop(self) -> None:
+        """Stop claiming; running chats are drained by the lifecycle manager."""
+        self._stopping.set()
+    
+    async def release(self) -> None:
+        """Return unfinished claims to the queue and give up the lease."""
+        await self.queue.release(worker_ids=[self.worker_id])
+        await self.store.release(self.worker_id)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "members": self.members,
+            "shards": len(self.shards),
+            "active_chats": len(self._chats),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rebalances": self.rebalances,
+        }
+
+
+# Singleton instance
+inbound_queue = InboundQueue()
@@ -1,6 +1,7 @@
 import httpx
 from typing import Optional, Dict, Any
 from app.config import get_settings
+from app.services.tracing import tracer, TracingTransport
 
 settings = get_settings()
 
@@ -8,7 +9,36 @@ settings = get_settings()
 class TelegramService:
     """Service for interacting with Telegram Bot API."""
     
-    BASE_URL = "https://api.telegram.org/bot"
+    BASE_URL = f"{settings.telegram_api_url}/bot"
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared client, so connections to the Bot API are reused."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=TracingTransport(
+                    httpx.AsyncHTTPTransport(
+                        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                    ),
+                    tracer
+                )
+            )
+        return self._client
+    
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def check_health(self) -> bool:
+        """Check that the Bot API host answers; also opens a pooled connection."""
+        try:
+            response = await self._get_client().get(settings.telegram_api_url, timeout=5.0)
+            return response.status_code < 500
+        except Exception:
+            return False
     
     async def validate_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
@@ -17,57 +47,96 @@ class TelegramService:
         Returns bot info if valid, None if invalid.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}{token}/getMe",
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("ok"):
-                        return data.get("result")
-                return None
+            client = self._get_client()
+            response = await client.get(
+                f"{self.BASE_URL}{token}/getMe",
+                timeout=10.0
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("ok"):
+                    return data.get("result")
+            return None
         except Exception:
             return None
     
+    @staticmethod
+    def webhook_url(token: str) -> Optional[str]:
+        """Where Telegram should deliver a bot's updates; None without WEBHOOK_BASE_URL."""
+        if not settings.webhook_base_url:
+            return None
+        return f"{settings.webhook_base_url}/api/telegram/webhook/{token}"
+    
     async def set_webhook(self, token: str, bot_id: int) -> bool:
         """Set webhook URL for a bot."""
-        if not settings.webhook_base_url:
+        webhook_url = self.webhook_url(token)
+        if webhook_url is None:
             return False
         
-        webhook_url = f"{settings.webhook_base_url}/api/telegram/webhook/{token}"
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.BASE_URL}{token}/setWebhook",
-                    json={
-                        "url": webhook_url,
-                        "allowed_updates": ["message"]
-                    },
-                    timeout=10.0
-                )
-                
-                data = response.json()
-                return data.get("ok", False)
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/setWebhook",
+                json={
+                    "url": webhook_url,
+                    "allowed_updates": ["message"]
+                },
+                timeout=10.0
+            )
+            
+            data = response.json()
+            return data.get("ok", False)
         except Exception:
             return False
     
+    async def get_webhook_info(self, token: str) -> Optional[Dict[str, Any]]:
+        """Current webhook of a bot: url ("" if none), pending_update_count, last error."""
+        try:
+            client = self._get_client()
+            response = await client.get(
+                f"{self.BASE_URL}{token}/getWebhookInfo",
+                timeout=10.0
+            )
+            
+            data = response.json()
+            if data.get("ok"):
+                return data.get("result")
+            return None
+        except Exception:
+            return None
+    
     async def delete_webhook(self, token: str) -> bool:
         """Remove webhook for a bot."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.BASE_URL}{token}/deleteWebhook",
-                    timeout=10.0
-                )
-                
-                data = response.json()
-                return data.get("ok", False)
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/deleteWebhook",
+                timeout=10.0
+            )
+            
+            data = response.json()
+            return data.get("ok", False)
         except Exception:
             return False
     
+    async def get_file(self, token: str, file_id: str) -> Optional[Dict[str, Any]]:
+        """Resolve a file_id to its download path, valid for at least an hour."""
+        try:
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/getFile",
+                json={"file_id": file_id},
+                timeout=10.0
+            )
+            
+            data = response.json()
+            if data.get("ok"):
+                return data.get("result")
+            return None
+        except Exception:
+            return None
+    
     async def send_message(
         self,
         token: str,
@@ -86,33 +155,50 @@ class TelegramService:
             if reply_to_message_id:
                 payload["reply_to_message_id"] = reply_to_message_id
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.BASE_URL}{token}/sendMessage",
-                    json=payload,
-                    timeout=10.0
-                )
-                
-                data = response.json()
-                if data.get("ok"):
-                    return data.get("result")
-                return None
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/sendMessage",
+                json=payload,
+                timeout=10.0
+            )
+            
+            data = response.json()
+            if data.get("ok"):
+                return data.get("result")
+            return None
         except Exception:
             return None
     
+    async def send_message_result(self, token: str, chat_id: int, text: str) -> Dict[str, Any]:
+        """
+        Send a message and return the Bot API answer as is, so the caller
+        sees error_code and parameters.retry_after; on a network error
+        {"ok": False} without an error_code.
+        """
+        try:
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/sendMessage",
+                json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+                timeout=10.0
+            )
+            return response.json()
+        except Exception as e:
+            return {"ok": False, "description": str(e) or type(e).__name__}
+    
     async def send_typing_action(self, token: str, chat_id: int) -> bool:
         """Send typing indicator to a chat."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.BASE_URL}{token}/sendChatAction",
-                    json={
-                        "chat_id": chat_id,
-                        "action": "typing"
-                    },
-                    timeout=5.0
-                )
-                return response.status_code == 200
+            client = self._get_client()
+            response = await client.post(
+                f"{self.BASE_URL}{token}/sendChatAction",
+                json={
+                    "chat_id": chat_id,
+                    "action": "typing"
+                },
+                timeout=5.0
+            )
+            return response.status_code == 200
         except Exception:
             return False
 
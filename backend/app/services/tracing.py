@@ -0,0 +1,335 @@
+import asyncio
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Deque, Dict, Iterator, List, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import get_settings
+from app.database import engine
+from app.serialization import dumps
+
+settings = get_settings()
+
+# Bot API paths carry the bot token: /bot<token>/sendMessage
+_TOKEN_PATH = re.compile(r"/bot[^/]+")
+
+
+class Trace:
+    """Spans of one update recorded by this process."""
+    
+    __slots__ = ("trace_id", "name", "started_at", "spans", "open", "dropped", "duration_ms")
+    
+    def __init__(self, trace_id: str, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = datetime.utcnow()
+        self.spans: List["Span"] = []
+        self.open = 0
+        self.dropped = 0
+        self.duration_ms: Optional[float] = None
+    
+    def as_dict(self, spans: bool = True) -> Dict[str, Any]:
+        body = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped,
+            "pid": os.getpid(),
+        }
+        if spans:
+            origin = self.spans[0].start if self.spans else 0.0
+            body["spans"] = [span.as_dict(origin) for span in self.spans]
+        return body
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "error")
+    
+    def __init__(self, trace: Trace, span_id: int, parent_id: Optional[int], name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+    
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+    
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else round((self.end - self.start) * 1000, 3)
+    
+    def as_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NullSpan:
+    """Stand-in yielded outside a trace, so callers never check for None."""
+    
+    __slots__ = ()
+    
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Lightweight span tracing of the update pipeline.
+    
+    `trace` opens the root span at webhook receipt; the current span
+    lives in a contextvar, so background tasks spawned from it, DB
+    queries (engine events) and HTTP calls (`TracingTransport`) become
+    its children without passing anything around. A queued update
+    carries its trace_id to the ingest worker, which continues the trace.
+    
+    Work outside a trace records nothing. A trace is complete once all
+    its spans have ended; it then goes to a ring buffer of the last
+    `buffer_size` traces (see /api/admin/traces) and, with `export_path`,
+    is appended to a JSONL file, one span per line.
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        buffer_size: int = 1000,
+        max_spans: int = 500,
+        export_path: str = "",
+        export_max_bytes: int = 50_000_000
+    ):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.export_path = export_path
+        self.export_max_bytes = export_max_bytes
+        self._current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+        self._finished: Deque[Trace] = deque(maxlen=buffer_size)
+        self._export_lock = threading.Lock()
+        self.completed = 0
+    
+    # Spans
+    
+    def current_trace_id(self) -> Optional[str]:
+        span = self._current.get()
+        return span.trace.trace_id if span is not None else None
+    
+    def start_span(self, name: str, **attributes: Any) -> Optional[Span]:
+        """A child of the current span that is not made current; end it with `end_span`."""
+        parent = self._current.get()
+        if parent is None:
+            return None
+        return self._open(parent.trace, parent.span_id, name, attributes)
+    
+    def end_span(self, span: Optional[Span], error: Optional[BaseException] = None) -> None:
+        if span is None or span.end is not None:
+            return
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"[:300]
+        span.end = time.perf_counter()
+        trace = span.trace
+        trace.open -= 1
+        if trace.open == 0:
+            self._complete(trace)
+    
+    def _open(self, trace: Trace, parent_id: Optional[int], name: str, attributes: Dict[str, Any]) -> Optional[Span]:
+        if len(trace.spans) >= self.max_spans:
+            trace.dropped += 1
+            return None
+        span = Span(trace, len(trace.spans) + 1, parent_id, name, attributes)
+        trace.spans.append(span)
+        trace.open += 1
+        return span
+    
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """Child span of the current one for the enclosed block; a no-op outside a trace."""
+        span = self.start_span(name, **attributes)
+        if span is None:
+            yield NULL_SPAN
+            return
+        
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._current.reset(token)
+            self.end_span(span, e)
+            raise
+        self._current.reset(token)
+        self.end_span(span)
+    
+    @contextmanager
+    def trace(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Any]:
+        """
+        A child span when already inside the trace (e.g. a task spawned by
+        the webhook); otherwise a root span, continuing `trace_id` if given.
+        """
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        
+        parent = self._current.get()
+        if parent is not None and (trace_id is None or parent.trace.trace_id == trace_id):
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+        
+        trace = Trace(trace_id or os.urandom(8).hex(), name)
+        span = self._open(trace, None, name, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._current.reset(token)
+            self.end_span(span, e)
+            raise
+        self._current.reset(token)
+        self.end_span(span)
+    
+    def create_task(self, coro: Awaitable[Any], name: str = "task", **attributes: Any) -> asyncio.Task:
+        """
+        `asyncio.create_task` whose task runs in a span opened now, so
+        the trace stays open until the background work finishes.
+        """
+        span = self.start_span(name, **attributes)
+        if span is None:
+            return asyncio.create_task(coro)
+        
+        context = contextvars.copy_context()
+        context.run(self._current.set, span)
+        task = asyncio.create_task(coro, context=context)
+        task.add_done_callback(
+            lambda done: self.end_span(span, None if done.cancelled() else done.exception())
+        )
+        return task
+    
+    # Finished traces
+    
+    def _complete(self, trace: Trace) -> None:
+        completed = trace.duration_ms is not None
+        trace.duration_ms = round((max(s.end for s in trace.spans) - trace.spans[0].start) * 1000, 3)
+        if completed:
+            # A span opened after the trace had finished; already recorded
+            return
+        self._finished.append(trace)
+        self.completed += 1
+        if self.export_path:
+            self._export(trace)
+    
+    def _export(self, trace: Trace) -> None:
+        origin = trace.spans[0].start
+        lines = b"".join(
+            dumps({"trace_id": trace.trace_id, "trace": trace.name, "started_at": trace.started_at, **span.as_dict(origin)}) + b"\n"
+            for span in trace.spans
+        )
+        try:
+            with self._export_lock:
+                if os.path.exists(self.export_path) and os.path.getsize(self.export_path) > self.export_max_bytes:
+                    os.replace(self.export_path, self.export_path + ".1")
+                with open(self.export_path, "ab") as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"Error exporting trace: {e}")
+    
+    def slowest(self, limit: int = 20, name: Optional[str] = None) -> List[Trace]:
+        traces = [t for t in self._finished if name is None or t.name == name]
+        return sorted(traces, key=lambda t: t.duration_ms or 0.0, reverse=True)[:limit]
+    
+    def find(self, trace_id: str) -> List[Trace]:
+        """All records of a trace in this process, e.g. webhook and a resumed retry."""
+        return [t for t in self._finished if t.trace_id == trace_id]
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "buffered": len(self._finished),
+            "buffer_size": self._finished.maxlen,
+            "completed": self.completed,
+            "export_path": self.export_path or None,
+        }
+    
+    # Instrumentation
+    
+    def instrument_engine(self, engine: Engine) -> None:
+        """Every statement run inside a trace becomes a `db` span."""
+        
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            span = self.start_span("db", statement=" ".join(statement.split())[:200])
+            if context is not None:
+                context._trace_span = span
+        
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            span = getattr(context, "_trace_span", None)
+            if span is not None:
+                span.set(rows=cursor.rowcount)
+                self.end_span(span)
+        
+        @event.listens_for(engine, "handle_error")
+        def _error(exception_context):
+            context = exception_context.execution_context
+            self.end_span(getattr(context, "_trace_span", None), exception_context.original_exception)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """httpx transport recording each request as an `http` span."""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, tracer: Tracer):
+        self._transport = transport
+        self._tracer = tracer
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        span = self._tracer.start_span(
+            "http",
+            method=request.method,
+            host=request.url.host,
+            path=_TOKEN_PATH.sub("/bot<token>", request.url.path)
+        )
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            self._tracer.end_span(span, e)
+            raise
+        if span is not None:
+            span.set(status=response.status_code)
+            self._tracer.end_span(span)
+        return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# Singleton instance
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    buffer_size=settings.tracing_buffer_size,
+    max_spans=settings.tracing_max_spans,
+    export_path=settings.tracing_export_path
+)
+# Queries made while handling an update show up as spans of its trace
+tracer.instrument_engine(engine.sync_engine)
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.bot import TelegramBot
+from app.services.coordination import CoordinationStore, coordination_store
+from app.services.telegram import telegram_service
+
+settings = get_settings()
+
+# Bot columns the reconciler needs
+BOT_COLUMNS = [TelegramBot.id, TelegramBot.name, TelegramBot.token, TelegramBot.is_active]
+
+
+class WebhookReconciler:
+    """
+    Keeps the webhooks Telegram has in line with the bots' is_active flags.
+    
+    `reconcile` asks getWebhookInfo for every bot, `concurrency` calls at
+    a time, and reports drift: an active bot without a webhook or with
+    one pointing elsewhere (e.g. after WEBHOOK_BASE_URL changed), or an
+    inactive bot Telegram still delivers to. With `repair` the webhook is
+    set or deleted to match the flag, read again just before the call.
+    `set_active` fans activation and deactivation of many bots out the
+    same way. Both report each bot's pending_update_count, the updates
+    Telegram is holding for it.
+    
+    The background loop reconciles all bots at startup and then every
+    `interval` seconds; with several API processes a shared lock lets
+    only one of them do it per interval.
+    """
+    
+    LOCK = "webhook_reconcile"
+    # Lets startup and cache warm-up finish before the first pass
+    STARTUP_DELAY = 5.0
+    
+    def __init__(
+        self,
+        concurrency: int = 20,
+        interval: float = 3600.0,
+        shared_store: Optional[CoordinationStore] = None
+    ):
+        self.concurrency = concurrency
+        self.interval = interval
+        self.shared_store = shared_store
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    async def _fan_out(self, bots: Iterable[Any], call: Callable[[Any], Awaitable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """`call` for every bot, at most `concurrency` at a time, in input order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def bounded(bot):
+            async with semaphore:
+                try:
+                    return await call(bot)
+                except Exception as e:
+                    return self._result(bot, "error", error=str(e))
+        
+        return list(await asyncio.gather(*(bounded(bot) for bot in bots)))
+    
+    @staticmethod
+    def _result(
+        bot,
+        state: str,
+        drift: Optional[str] = None,
+        info: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> Dict[str, Any]:
+        info = info or {}
+        last_error_date = info.get("last_error_date")
+        return {
+            "bot_id": bot.id,
+            "name": bot.name,
+            "is_active": bot.is_active,
+            "state": state,
+            "drift": drift,
+            "pending_update_count": info.get("pending_update_count"),
+            "last_error_message": info.get("last_error_message"),
+            "last_error_at": datetime.utcfromtimestamp(last_error_date) if last_error_date else None,
+            "error": error,
+        }
+    
+    @staticmethod
+    def _drift(bot, info: Dict[str, Any]) -> Optional[str]:
+        url = info.get("url") or ""
+        if not bot.is_active:
+            return "unexpected" if url else None
+        if not url:
+            return "missing"
+        expected = telegram_service.webhook_url(bot.token)
+        if expected is not None and url != expected:
+            return "wrong_url"
+        return None
+    
+    async def _apply(self, bot, active: bool) -> bool:
+        if active:
+            return await telegram_service.set_webhook(bot.token, bot.id)
+        return await telegram_service.delete_webhook(bot.token)
+    
+    async def _check(self, bot, repair: bool) -> Dict[str, Any]:
+        info = await telegram_service.get_webhook_info(bot.token)
+        if info is None:
+            return self._result(bot, "error", error="getWebhookInfo failed")
+        
+        drift = self._drift(bot, info)
+        if drift is None:
+            return self._result(bot, "ok", info=info)
+        if not repair:
+            return self._result(bot, "drift", drift, info)
+        
+        # The row may be minutes old by now: an owner who toggled or deleted
+        # the bot meanwhile must not see the webhook flipped back
+        current = await self._reload(bot.id)
+        if current is None:
+            return self._result(bot, "ok", info=info)  # Deleted, its webhook went with it
+        bot = current
+        drift = self._drift(bot, info)
+        if drift is None:
+            return self._result(bot, "ok", info=info)
+        if not await self._apply(bot, bot.is_active):
+            return self._result(bot, "error", drift, info, error="Could not repair the webhook")
+        return self._result(bot, "repaired", drift, info)
+    
+    async def _load(self, user_id: Optional[int] = None, bot_ids: Optional[List[int]] = None) -> List[Any]:
+        query = select(*BOT_COLUMNS).where(TelegramBot.deleted_at.is_(None)).order_by(TelegramBot.id)
+        if user_id is not None:
+            query = query.where(TelegramBot.user_id == user_id)
+        if bot_ids is not None:
+            query = query.where(TelegramBot.id.in_(bot_ids))
+        async with async_session_maker() as db:
+            return (await db.execute(query)).all()
+    
+    async def _reload(self, bot_id: int) -> Optional[Any]:
+        bots = await self._load(bot_ids=[bot_id])
+        return bots[0] if bots else None
+    
+    async def reconcile(
+        self,
+        user_id: Optional[int] = None,
+        bot_ids: Optional[List[int]] = None,
+        repair: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Check (and with `repair` fix) the webhooks of all, or the given, bots."""
+        started = time.monotonic()
+        bots = await self._load(user_id, bot_ids)
+        results = await self._fan_out(bots, lambda bot: self._check(bot, repair))
+        if user_id is not None or bot_ids is not None:
+            return results
+        
+        self.runs += 1
+        self.last_run = {
+            "finished_at": datetime.utcnow(),
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "checked": len(results),
+            **{state: sum(r["state"] == state for r in results) for state in ("ok", "drift", "repaired", "error")},
+            "pending_updates": sum(r["pending_update_count"] or 0 for r in results),
+        }
+        return results
+    
+    async def set_active(self, bots: List[Any], active: bool) -> List[Dict[str, Any]]:
+        """
+        Set or delete the webhooks of `bots` (rows of BOT_COLUMNS) in
+        parallel; the caller updates is_active from the results.
+        """
+        async def call(bot):
+            if not await self._apply(bot, active):
+                action = "setWebhook" if active else "deleteWebhook"
+                return self._result(bot, "error", error=f"{action} failed")
+            # The backlog Telegram holds: delivered now, or kept for a later activation
+            info = await telegram_service.get_webhook_info(bot.token)
+            return self._result(bot, "ok", info=info)
+        
+        return await self._fan_out(bots, call)
+    
+    def start(self) -> None:
+        if self._task is None and settings.webhook_base_url:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        await asyncio.sleep(self.STARTUP_DELAY)
+        while True:
+            try:
+                await self._run_once()
+            except Exception as e:
+                print(f"Error reconciling webhooks: {e}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+    
+    async def _run_once(self) -> None:
+        if self.shared_store is not None:
+            # Held for the whole interval: the other API processes skip this pass
+            ttl = self.interval if self.interval > 0 else 60.0
+            if not await self.shared_store.try_lock(self.LOCK, f"{os.getpid()}:{id(self)}", ttl=ttl):
+                return
+        
+        await self.reconcile()
+        run = self.last_run
+        if run["drift"] or run["repaired"] or run["error"]:
+            print(
+                f"Webhooks of {run['checked']} bots checked: {run['repaired']} repaired, "
+                f"{run['error']} failed, {run['pending_updates']} updates pending"
+            )
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "concurrency": self.concurrency,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+
+# Singleton instance
+webhook_reconciler = WebhookReconciler(
+    concurrency=settings.webhook_concurrency,
+    interval=settings.webhook_reconcile_interval,
+    shared_store=coordination_store if settings.app_role != "all" else None
+)
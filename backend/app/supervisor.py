@@ -0,0 +1,157 @@
+"""
+Runs API workers and ingest workers as separate processes.
+
+API workers (uvicorn, APP_ROLE=api) answer HTTP and queue webhook
+updates. Ingest workers (APP_ROLE=ingest) own shards of bots assigned by
+consistent hashing and send the replies. Crashed children are restarted;
+SIGTERM is forwarded so every child drains before exiting.
+
+Usage:
+    python -m app.supervisor --api-workers 2 --ingest-workers 4 [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Restart backoff for children that keep crashing
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+STABLE_AFTER = 60.0  # Seconds of uptime that reset the backoff
+
+
+class Child:
+    """A supervised process and its restart state."""
+    
+    def __init__(self, name: str, args: List[str], role: str):
+        self.name = name
+        self.args = args
+        self.role = role
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.backoff = MIN_BACKOFF
+        self.restart_at = 0.0
+        self.restarts = 0
+    
+    def start(self) -> None:
+        env = dict(os.environ, APP_ROLE=self.role)
+        self.process = subprocess.Popen(self.args, env=env)
+        self.started_at = time.monotonic()
+        print(f"Started {self.name} (pid {self.process.pid})")
+
+
+class Supervisor:
+    def __init__(self, children: List[Child]):
+        self.children = children
+        self._stopping = False
+    
+    def stop(self, *_) -> None:
+        self._stopping = True
+    
+    def _check(self, child: Child) -> None:
+        now = time.monotonic()
+        if child.process is None:
+            if now >= child.restart_at:
+                child.start()
+            return
+        
+        code = child.process.poll()
+        if code is None:
+            if now - child.started_at > STABLE_AFTER:
+                child.backoff = MIN_BACKOFF
+            return
+        
+        print(f"{child.name} exited with code {code}; restarting in {child.backoff:.0f}s")
+        child.process = None
+        child.restarts += 1
+        child.restart_at = now + child.backoff
+        child.backoff = min(child.backoff * 2, MAX_BACKOFF)
+    
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        for child in self.children:
+            child.start()
+        
+        while not self._stopping:
+            for child in self.children:
+                self._check(child)
+            time.sleep(0.5)
+        
+        self.shutdown()
+    
+    def shutdown(self) -> None:
+        running = [c for c in self.children if c.process is not None and c.process.poll() is None]
+        for child in running:
+            child.process.send_signal(signal.SIGTERM)
+        
+        # Children drain for up to SHUTDOWN_DRAIN_SECONDS before saving their work
+        deadline = time.monotonic() + settings.shutdown_drain_seconds + 10
+        for child in running:
+            try:
+                child.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                print(f"{child.name} did not stop in time; killing")
+                child.process.kill()
+                child.process.wait()
+
+
+def build_children(args: argparse.Namespace) -> List[Child]:
+    children = [
+        Child(
+            "api",
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", args.host,
+                "--port", str(args.port),
+                "--workers", str(args.api_workers),
+                "--timeout-graceful-shutdown", str(int(settings.shutdown_drain_seconds)),
+            ],
+            role="api"
+        )
+    ]
+    for index in range(args.ingest_workers):
+        worker_id = f"ingest-{index}"
+        children.append(Child(
+            worker_id,
+            [sys.executable, "-m", "app.worker", "--worker-id", worker_id],
+            role="ingest"
+        ))
+    return children
+
+
+async def _prepare() -> None:
+    """Create tables and indexes once, before children race to do it."""
+    from app.database import init_db, engine
+    from app.services.search import search_service
+    from app.services.knowledge import knowledge_service
+    
+    await init_db()
+    await search_service.ensure_index()
+    await knowledge_service.ensure_index()
+    await engine.dispose()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.supervisor", description="Businessly process supervisor")
+    parser.add_argument("--api-workers", type=int, default=2)
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    
+    asyncio.run(_prepare())
+    Supervisor(build_children(args)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Ingest worker: processes queued webhook updates of the shards it owns.
+
+Usage (normally started by `python -m app.supervisor`):
+    APP_ROLE=ingest python -m app.worker --worker-id ingest-0
+"""
+import argparse
+import asyncio
+import signal
+
+from app.runtime import startup, warm_up, shutdown
+from app.routers.telegram import process_queued_update
+from app.services.coordination import coordination_store
+from app.services.conversation_cache import conversation_cache
+from app.services.lifecycle import lifecycle
+from app.services.sharding import IngestionWorker
+
+
+async def run(worker_id: str) -> None:
+    await startup(process_messages=True)
+    
+    worker = IngestionWorker(worker_id, coordination_store, handler=process_queued_update)
+    # Close hooks run in reverse order, so claims are released before the engine closes
+    lifecycle.on_close(worker.release)
+    
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    
+    try:
+        await warm_up(process_messages=True)
+    except Exception as e:
+        print(f"Error during warm-up: {e}")
+    
+    print(f"Ingest worker {worker_id} started")
+    await worker.run()
+    
+    print(f"Ingest worker {worker_id} draining ({lifecycle.in_flight} in flight), conversation cache: {conversation_cache.snapshot()}")
+    await shutdown()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Businessly ingest worker")
+    parser.add_argument("--worker-id", required=True, help="Stable id; reuse it when restarting the worker")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.worker_id))
+
+
+if __name__ == "__main__":
+    main()
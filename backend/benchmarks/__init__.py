@@ -0,0 +1 @@
+# Businessly micro-benchmarks of hot code paths
@@ -0,0 +1,163 @@
+"""
+Read endpoint benchmark: SQL queries, allocations and latency per request.
+
+Seeds a temporary SQLite database, then calls each list and detail
+endpoint in-process (no server, no background services) and reports
+the number of statements executed, the peak memory traced while the
+request runs and the median latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.read_paths [--bots 5] [--conversations 200] [--messages 10] [--repeat 30]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+_workdir = tempfile.mkdtemp(prefix="businessly-bench-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/bench.db"
+os.environ["ARCHIVE_DIR"] = os.path.join(_workdir, "archive")
+
+import httpx
+from sqlalchemy import event, insert
+
+from app.main import app
+from app.database import engine, init_db
+from app.models import User, TelegramBot, Conversation, Message, KnowledgeDocument, CannedAnswer
+from app.security import create_access_token
+from app.services.search import search_service
+
+
+async def seed(bots: int, conversations: int, messages: int) -> Tuple[int, int, int]:
+    """Returns (user_id, bot_id, conversation_id) of rows to request."""
+    await init_db()
+    await search_service.ensure_index()
+    started = datetime(2024, 1, 1)
+    description = "Пиццерия у дома: доставка по городу, самовывоз, банкеты. " * 40
+    async with engine.begin() as conn:
+        user_id = (await conn.execute(
+            insert(User).values(email="bench@example.com", password_hash="x", name="Bench", created_at=started)
+        )).inserted_primary_key[0]
+        conversation_ids = []
+        for bot_index in range(bots):
+            bot_id = (await conn.execute(
+                insert(TelegramBot).values(
+                    user_id=user_id,
+                    token=f"{bot_index}:" + "x" * 40,
+                    name=f"Bot {bot_index}",
+                    business_description=description,
+                    is_active=True,
+                    created_at=started
+                )
+            )).inserted_primary_key[0]
+            await conn.execute(insert(KnowledgeDocument), [
+                {"bot_id": bot_id, "title": f"Doc {i}", "source": "upload", "content": description,
+                 "content_hash": str(i), "created_at": started, "updated_at": started}
+                for i in range(20)
+            ])
+            await conn.execute(insert(CannedAnswer), [
+                {"bot_id": bot_id, "question": f"Вопрос {i}?", "answer": description[:200], "created_at": started}
+                for i in range(20)
+            ])
+            for chat in range(conversations):
+                conversation_id = (await conn.execute(
+                    insert(Conversation).values(
+                        bot_id=bot_id,
+                        telegram_chat_id=chat,
+                        telegram_username=f"user{chat}",
+                        telegram_first_name="Иван",
+                        created_at=started,
+                        updated_at=started + timedelta(minutes=chat)
+                    )
+                )).inserted_primary_key[0]
+                conversation_ids.append((bot_id, conversation_id))
+                await conn.execute(insert(Message), [
+                    {"conversation_id": conversation_id, "role": "user" if i % 2 == 0 else "assistant",
+                     "content": f"Сколько стоит доставка пиццы номер {i}? " + description[:300],
+                     "created_at": started + timedelta(minutes=chat, seconds=i)}
+                    for i in range(messages)
+                ])
+    bot_id, conversation_id = conversation_ids[0]
+    return user_id, bot_id, conversation_id
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+    
+    def _count(self, *args) -> None:
+        self.count += 1
+
+
+async def measure(client: httpx.AsyncClient, counter: QueryCounter, url: str, repeat: int) -> Tuple[int, float, float]:
+    """(queries per request, peak KiB traced per request, median ms)."""
+    response = await client.get(url)
+    assert response.status_code == 200, (url, response.status_code, response.text)
+    
+    counter.count = 0
+    await client.get(url)
+    queries = counter.count
+    
+    tracemalloc.start()
+    await client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+    return queries, peak / 1024, statistics.median(samples)
+
+
+async def run(bots: int, conversations: int, messages: int, repeat: int) -> List[tuple]:
+    user_id, bot_id, conversation_id = await seed(bots, conversations, messages)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    counter = QueryCounter()
+    
+    endpoints = [
+        "/api/auth/me",
+        "/api/bots/",
+        f"/api/bots/{bot_id}",
+        "/api/conversations/",
+        f"/api/conversations/?bot_id={bot_id}",
+        f"/api/conversations/{conversation_id}",
+        f"/api/conversations/{conversation_id}/messages?limit=50",
+        f"/api/knowledge/bots/{bot_id}/documents",
+        f"/api/knowledge/bots/{bot_id}/canned",
+        "/api/search/messages?q=доставка&limit=20",
+        f"/api/analytics/bots/{bot_id}",
+    ]
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        results = []
+        for url in endpoints:
+            results.append((url, *await measure(client, counter, url, repeat)))
+    await engine.dispose()
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.read_paths", description=__doc__.split("\n")[1])
+    parser.add_argument("--bots", type=int, default=5)
+    parser.add_argument("--conversations", type=int, default=200, help="Per bot")
+    parser.add_argument("--messages", type=int, default=10, help="Per conversation")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args(argv)
+    
+    results = asyncio.run(run(args.bots, args.conversations, args.messages, args.repeat))
+    print(f"{'endpoint':<52} {'queries':>8} {'peak KiB':>9} {'median ms':>10}")
+    for url, queries, peak, median in results:
+        print(f"{url:<52} {queries:>8} {peak:>9.0f} {median:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+JSON serialization benchmark: 1k-row list responses and webhook parsing.
+
+Compares the previous path (a Pydantic model per row, validated and
+dumped the way FastAPI does for `response_model`, then JSONResponse)
+with the orjson path the list endpoints use now.
+
+Usage (from the backend directory):
+    python -m benchmarks.serialization [--rows 1000] [--repeat 200]
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas.conversation import ConversationListResponse
+from app.schemas.message import MessageResponse
+from app.schemas.telegram import IncomingMessage
+from app.serialization import project, loads
+
+MESSAGE_FIELDS = tuple(MessageResponse.model_fields)
+CONVERSATION_FIELDS = tuple(ConversationListResponse.model_fields)
+
+
+def make_messages(count: int) -> List[SimpleNamespace]:
+    started = datetime(2024, 1, 1, 9, 0, 0, 123456)
+    return [
+        SimpleNamespace(
+            id=index,
+            role="user" if index % 2 == 0 else "assistant",
+            content=f"Сколько стоит доставка пиццы на улицу Ленина, дом {index}?",
+            telegram_message_id=index,
+            created_at=started + timedelta(seconds=index)
+        )
+        for index in range(count)
+    ]
+
+
+def make_conversations(count: int) -> List[SimpleNamespace]:
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    return [
+        SimpleNamespace(
+            id=index,
+            telegram_username=f"user{index}",
+            telegram_first_name="Иван",
+            is_ai_controlled=index % 3 != 0,
+            last_message="Спасибо, жду заказ!",
+            last_message_at=started + timedelta(minutes=index),
+            unread_count=0
+        )
+        for index in range(count)
+    ]
+
+
+def pydantic_list(model, fields, rows) -> bytes:
+    """Per-row models, then validation and dump as FastAPI does for a response_model."""
+    adapter = TypeAdapter(List[model])
+    content = [model(**{field: getattr(row, field) for field in fields}) for row in rows]
+    return JSONResponse(adapter.dump_python(adapter.validate_python(content), mode="json")).body
+
+
+def orjson_list(fields, rows) -> bytes:
+    return ORJSONResponse(project(rows, fields)).body
+
+
+def make_update(seq: int) -> bytes:
+    return json.dumps({
+        "update_id": seq,
+        "message": {
+            "message_id": seq,
+            "date": 1700000000,
+            "chat": {"id": 100000 + seq, "type": "private", "first_name": "Иван", "username": "ivan"},
+            "from": {"id": 100000 + seq, "is_bot": False, "first_name": "Иван", "username": "ivan", "language_code": "ru"},
+            "text": "Сколько стоит доставка?",
+            "entities": [],
+        }
+    }, ensure_ascii=False).encode("utf-8")
+
+
+def parse_update_json(body: bytes) -> dict:
+    """The previous webhook path: stdlib json and dict lookups."""
+    update = json.loads(body)
+    message = update["message"]
+    return {
+        "chat_id": message["chat"]["id"],
+        "user_message": message["text"],
+        "message_id": message["message_id"],
+        "user_info": message.get("from", {}),
+        "update_id": update.get("update_id"),
+    }
+
+
+def parse_update_orjson(body: bytes) -> dict:
+    return IncomingMessage.from_update(loads(body)).payload("token")
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Median milliseconds per call."""
+    func()  # Warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(rows: int, repeat: int) -> List[tuple]:
+    messages = make_messages(rows)
+    conversations = make_conversations(rows)
+    updates = [make_update(seq) for seq in range(rows)]
+    
+    # Both paths must produce the same document
+    assert json.loads(pydantic_list(MessageResponse, MESSAGE_FIELDS, messages)) == json.loads(orjson_list(MESSAGE_FIELDS, messages))
+    
+    return [
+        (
+            f"messages list ({rows} rows)",
+            measure(lambda: pydantic_list(MessageResponse, MESSAGE_FIELDS, messages), repeat),
+            measure(lambda: orjson_list(MESSAGE_FIELDS, messages), repeat),
+        ),
+        (
+            f"conversations list ({rows} rows)",
+            measure(lambda: pydantic_list(ConversationListResponse, CONVERSATION_FIELDS, conversations), repeat),
+            measure(lambda: orjson_list(CONVERSATION_FIELDS, conversations), repeat),
+        ),
+        (
+            f"webhook parse ({rows} updates)",
+            measure(lambda: [parse_update_json(body) for body in updates], repeat),
+            measure(lambda: [parse_update_orjson(body) for body in updates], repeat),
+        ),
+    ]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization", description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+    
+    print(f"{'case':<34} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, before, after in run(args.rows, args.repeat):
+        print(f"{name:<34} {before:>10.3f} {after:>10.3f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
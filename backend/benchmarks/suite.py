@@ -0,0 +1,611 @@
+"""
+Benchmark suite with a tracked baseline: hot functions and every read query.
+
+Components: input sanitizing, reply confidence scoring, prompt
+construction and JWT issue/verify, timed per call.
+
+Read paths: every GET endpoint of the API routers, called in-process
+against a seeded SQLite database that grows through the requested
+sizes (10k, 100k, 1M messages). Per endpoint it records the number of
+statements a request runs (an N+1 shows up as a count growing with
+the data), the tables SQLite reads in full according to EXPLAIN QUERY
+PLAN, and the median latency.
+
+The seeded data has other owners' bots, broadcasts and documents and
+attachments on some messages, so plans match a shared production
+database rather than the shortcuts SQLite takes on one-row tables.
+
+Results are compared with benchmarks/baseline.json: more statements
+than the baseline is a regression, and so is any full scan not listed
+with its reason in KNOWN_SCANS. With --times, a time above the baseline
+by more than --tolerance is one too, where both sides have at least
+MIN_TIME_SAMPLES samples. Times depend on the machine; refresh the
+baseline with --update-baseline on the machine that runs --check.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite [--sizes 10k,100k] [--only components|queries] [--repeat 20]
+    python -m benchmarks.suite --sizes 10k,100k,1m --check [--times]
+    python -m benchmarks.suite --update-baseline
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_workdir = tempfile.mkdtemp(prefix="businessly-bench-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/bench.db"
+os.environ["ARCHIVE_DIR"] = os.path.join(_workdir, "archive")
+os.environ["MEDIA_DIR"] = os.path.join(_workdir, "media")
+os.environ.setdefault("LLM_PROVIDER", "mock")
+
+import httpx
+from sqlalchemy import event, func, insert, literal, select
+
+from app.main import app
+from app.database import async_session_maker, engine, init_db
+from app.models import (
+    User, TelegramBot, Conversation, Message, CannedAnswer, BotDeletion, Broadcast, MediaFile, MessageAttachment
+)
+from app.security import create_access_token, verify_token, sanitize_input, sanitize_html
+from app.services.gigachat import GigaChatService
+from app.services.knowledge import knowledge_service
+from app.services.prompts import PromptCache, render_system_prompt
+from app.services.search import search_service
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+BOTS = 5
+MESSAGES_PER_CONVERSATION = 20
+# Share of all messages in one long conversation, for message pagination
+LONG_CONVERSATION_SHARE = 0.01
+SEED_BATCH = 10_000
+# Other owners, each with a bot, broadcasts and documents, so that lookups
+# by owner or bot have rows to skip as in production
+OTHER_TENANTS = 20
+BROADCASTS_PER_BOT = 5
+DOCUMENTS_PER_BOT = 3
+# One message in this many carries one of MEDIA_FILES stored photos
+ATTACHMENT_EVERY = 50
+MEDIA_FILES = 20
+ATTACHMENT = {"kind": "photo", "telegram_file_id": "x", "mime_type": "image/jpeg", "status": "stored", "attempts": 0}
+
+# Slower than the baseline by less than this is noise, whatever the ratio
+MIN_DELTA_MS = 0.5
+# Times are compared (with --times) only when both sides have this many samples
+MIN_TIME_SAMPLES = 10
+
+# Full scans accepted after review, as {endpoint name: {table: why}}. Any
+# other scan fails --check, whatever the baseline recorded.
+KNOWN_SCANS: Dict[str, Dict[str, str]] = {}
+
+DESCRIPTION = "Пиццерия у дома: доставка по городу, самовывоз, банкеты. Работаем с 10 до 23. " * 20
+PHRASES = [
+    "Сколько стоит доставка пиццы на улицу Ленина?",
+    "Можно заказать банкет на 20 человек в субботу?",
+    "Спасибо, жду заказ!",
+    "Доставка занимает около часа, оплата картой или наличными.",
+    "Какие у вас есть вегетарианские блюда?",
+    "Заказ передан курьеру, он позвонит за 10 минут.",
+]
+
+# GET routes of the API routers, as (name, url): `name` is the route path
+# plus fixed query, `url` is filled in with the ids of the seeded rows.
+ENDPOINTS = [
+    ("/api/auth/me", "/api/auth/me"),
+    ("/api/bots/", "/api/bots/"),
+    ("/api/bots/{bot_id}", "/api/bots/{bot_id}"),
+    ("/api/bots/{bot_id}/export?format=ndjson", "/api/bots/{bot_id}/export?format=ndjson"),
+    ("/api/bots/{bot_id}/retention", "/api/bots/{bot_id}/retention"),
+    ("/api/bots/{bot_id}/broadcasts", "/api/bots/{bot_id}/broadcasts"),
+    ("/api/bots/{bot_id}/broadcasts/{broadcast_id}", "/api/bots/{bot_id}/broadcasts/{broadcast_id}"),
+    ("/api/bots/{bot_id}/deletion", "/api/bots/{deleted_bot_id}/deletion"),
+    ("/api/conversations/", "/api/conversations/"),
+    ("/api/conversations/?bot_id=", "/api/conversations/?bot_id={bot_id}"),
+    ("/api/conversations/{conversation_id}", "/api/conversations/{conversation_id}"),
+    ("/api/conversations/{conversation_id}/messages?limit=50",
+     "/api/conversations/{conversation_id}/messages?limit=50"),
+    ("/api/conversations/{conversation_id}/messages?limit=50&before_id=",
+     "/api/conversations/{conversation_id}/messages?limit=50&before_id={before_id}"),
+    ("/api/conversations/{conversation_id}/attachments/{attachment_id}",
+     "/api/conversations/{conversation_id}/attachments/{attachment_id}"),
+    ("/api/search/messages?q=", "/api/search/messages?q=доставка&limit=20"),
+    ("/api/search/messages?q=&bot_id=", "/api/search/messages?q=банкет&bot_id={bot_id}&limit=20"),
+    ("/api/analytics/bots/{bot_id}", "/api/analytics/bots/{bot_id}"),
+    ("/api/analytics/bots/{bot_id}?granularity=hour", "/api/analytics/bots/{bot_id}?granularity=hour"),
+    ("/api/knowledge/bots/{bot_id}/documents", "/api/knowledge/bots/{bot_id}/documents"),
+    ("/api/knowledge/bots/{bot_id}/search?q=", "/api/knowledge/bots/{bot_id}/search?q=доставка"),
+    ("/api/knowledge/bots/{bot_id}/canned", "/api/knowledge/bots/{bot_id}/canned"),
+    ("/api/knowledge/bots/{bot_id}/route?q=", "/api/knowledge/bots/{bot_id}/route?q=Сколько стоит доставка?"),
+]
+
+# GET routes without database reads of their own
+UNBENCHMARKED_PREFIXES = ("/api/admin/",)
+
+
+def uncovered_routes() -> List[str]:
+    """GET routes of the API missing from ENDPOINTS, so new routes are not left out."""
+    covered = {name.split("?")[0] for name, _ in ENDPOINTS}
+    return sorted(
+        route.path for route in app.routes
+        if "GET" in (getattr(route, "methods", None) or ())
+        and route.path.startswith("/api/")
+        and not route.path.startswith(UNBENCHMARKED_PREFIXES)
+        and route.path not in covered
+    )
+
+
+# Components
+
+def component_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    message = "Здравствуйте! <script>alert(1)</script> Сколько стоит <b>доставка</b> на Ленина, 5?"
+    long_text = (message + " ") * 50
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": PHRASES[i % len(PHRASES)]}
+        for i in range(20)
+    ]
+    chunks = [DESCRIPTION[:500]] * 3
+    prompt = render_system_prompt(DESCRIPTION)
+    cache = PromptCache()
+    cache.get(1, DESCRIPTION)
+    token = create_access_token({"sub": "1"})
+    unsure = "[UNSURE] Возможно, доставка в ваш район платная, лучше спросить менеджера."
+    sure = "Доставка по городу бесплатная от 1000 рублей, привезём за час. " * 3
+    
+    return [
+        ("sanitize_input", lambda: sanitize_input(message)),
+        ("sanitize_input 4k", lambda: sanitize_input(long_text)),
+        ("sanitize_html", lambda: sanitize_html(message)),
+        ("score_confidence sure", lambda: GigaChatService.score_confidence(sure)),
+        ("score_confidence unsure", lambda: GigaChatService.score_confidence(unsure)),
+        ("render_system_prompt", lambda: render_system_prompt(DESCRIPTION)),
+        ("PromptCache.get hit", lambda: cache.get(1, DESCRIPTION)),
+        ("build_messages", lambda: GigaChatService.build_messages(message, prompt, history, chunks)),
+        ("create_access_token", lambda: create_access_token({"sub": "1"})),
+        ("verify_token", lambda: verify_token(token)),
+    ]
+
+
+def run_components(repeat: int) -> Dict[str, Dict[str, float]]:
+    """Median microseconds per call, over `repeat` samples of about 40 ms."""
+    results = {}
+    for name, call in component_cases():
+        timer = timeit.Timer(call)
+        number, _ = timer.autorange()
+        number = max(number // 5, 1)
+        samples = timer.repeat(repeat=repeat, number=number)
+        results[name] = {"us": round(statistics.median(samples) / number * 1e6, 3), "samples": repeat}
+    return results
+
+
+# Read paths
+
+class Dataset:
+    """The seeded database, grown in place from one size to the next."""
+    
+    def __init__(self):
+        self.messages = 0
+        self.ids: Dict[str, int] = {}
+        self.user_id: Optional[int] = None
+        self.bot_ids: List[int] = []
+        self._next_conversation_id = 1
+        self._next_chat_id = 1
+        self._started = datetime(2024, 1, 1)
+        self._long_messages = 0
+        self._media_ids: List[int] = []
+        self._attached_up_to = 0
+    
+    def _message_rows(self, conversation_id: int, first: int, count: int) -> List[dict]:
+        return [
+            {
+                "conversation_id": conversation_id,
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"{PHRASES[i % len(PHRASES)]} #{i}",
+                "created_at": self._started + timedelta(minutes=conversation_id % 129_600, seconds=i),
+            }
+            for i in range(first, first + count)
+        ]
+    
+    async def _setup(self) -> None:
+        await init_db()
+        await search_service.ensure_index()
+        await knowledge_service.ensure_index()
+        async with engine.begin() as conn:
+            self.user_id = (await conn.execute(
+                insert(User).values(email="bench@example.com", password_hash="x", name="Bench", created_at=self._started)
+            )).inserted_primary_key[0]
+            for index in range(BOTS):
+                bot_id = (await conn.execute(
+                    insert(TelegramBot).values(
+                        user_id=self.user_id,
+                        token=f"{index}:" + "x" * 40,
+                        name=f"Bot {index}",
+                        business_description=DESCRIPTION,
+                        is_active=True,
+                        created_at=self._started
+                    )
+                )).inserted_primary_key[0]
+                self.bot_ids.append(bot_id)
+                await conn.execute(insert(CannedAnswer), [
+                    {"bot_id": bot_id, "question": f"{PHRASES[i % len(PHRASES)]} {i}", "answer": DESCRIPTION[:200],
+                     "created_at": self._started}
+                    for i in range(20)
+                ])
+            
+            bot_id = self.bot_ids[0]
+            self.ids["bot_id"] = bot_id
+            self.ids["conversation_id"] = await self._add_conversations(conn, bot_id, 1)
+            self.ids["deleted_bot_id"] = 10_000 + bot_id
+            await conn.execute(insert(BotDeletion).values(
+                bot_id=self.ids["deleted_bot_id"], user_id=self.user_id, bot_name="Old bot", status="done",
+                total_rows=1000, deleted_rows=1000, created_at=self._started, finished_at=self._started
+            ))
+            
+            other_bot_ids = []
+            for index in range(OTHER_TENANTS):
+                user_id = (await conn.execute(insert(User).values(
+                    email=f"owner{index}@example.com", password_hash="x", name=f"Owner {index}", created_at=self._started
+                ))).inserted_primary_key[0]
+                other_bot_ids.append((await conn.execute(insert(TelegramBot).values(
+                    user_id=user_id, token=f"{BOTS + index}:" + "x" * 40, name=f"Other bot {index}",
+                    business_description=DESCRIPTION, is_active=True, created_at=self._started
+                ))).inserted_primary_key[0])
+            
+            owners = await conn.execute(select(TelegramBot.id, TelegramBot.user_id))
+            await conn.execute(insert(Broadcast), [
+                {"bot_id": owner_bot_id, "user_id": owner_id, "content": PHRASES[3], "status": "done",
+                 "total": 100, "sent": 98, "failed": 2, "created_at": self._started, "finished_at": self._started}
+                for owner_bot_id, owner_id in owners.all()
+                for _ in range(BROADCASTS_PER_BOT)
+            ])
+            self.ids["broadcast_id"] = (await conn.execute(
+                select(Broadcast.id).where(Broadcast.bot_id == bot_id).order_by(Broadcast.id.desc()).limit(1)
+            )).scalar_one()
+        
+        async with async_session_maker() as db:
+            document_bot_ids = [bot_id] * 10 + [other for other in other_bot_ids for _ in range(DOCUMENTS_PER_BOT)]
+            for index, document_bot_id in enumerate(document_bot_ids):
+                await knowledge_service.save_document(
+                    db, document_bot_id, f"Doc {index}", DESCRIPTION + PHRASES[index % len(PHRASES)]
+                )
+            await db.commit()
+        
+        await self._add_attachment()
+    
+    async def _add_conversations(self, conn, bot_id: int, count: int) -> int:
+        """Insert `count` conversations with explicit ids; returns the first id."""
+        first = self._next_conversation_id
+        await conn.execute(insert(Conversation), [
+            {
+                "id": first + i,
+                "bot_id": bot_id,
+                "telegram_chat_id": self._next_chat_id + i,
+                "telegram_username": f"user{self._next_chat_id + i}",
+                "telegram_first_name": "Иван",
+                "is_active": True,
+                "created_at": self._started,
+                "updated_at": self._started + timedelta(minutes=(first + i) % 129_600),
+            }
+            for i in range(count)
+        ])
+        self._next_conversation_id += count
+        self._next_chat_id += count
+        return first
+    
+    async def _add_media(self) -> List[int]:
+        """Store MEDIA_FILES distinct photos, the first 256 KiB and the rest small; returns their ids."""
+        rows = []
+        for index in range(MEDIA_FILES):
+            content = os.urandom(256 * 1024 if index == 0 else 16 * 1024)
+            sha256 = hashlib.sha256(content).hexdigest()
+            relative_path = os.path.join(sha256[:2], sha256)
+            path = os.path.join(os.environ["MEDIA_DIR"], relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+            rows.append({"sha256": sha256, "path": relative_path, "size_bytes": len(content)})
+        
+        async with engine.begin() as conn:
+            await conn.execute(insert(MediaFile), rows)
+            result = await conn.execute(select(MediaFile.id).order_by(MediaFile.id))
+            return result.scalars().all()
+    
+    async def _add_attachment(self) -> None:
+        self._media_ids = await self._add_media()
+        conversation_id = self.ids["conversation_id"]
+        async with engine.begin() as conn:
+            message_id = (await conn.execute(insert(Message).values(
+                conversation_id=conversation_id, role="user", content="[Фото]", created_at=self._started
+            ))).inserted_primary_key[0]
+            self.ids["attachment_id"] = (await conn.execute(insert(MessageAttachment).values(
+                bot_id=self.ids["bot_id"], conversation_id=conversation_id, message_id=message_id,
+                media_file_id=self._media_ids[0], size_bytes=256 * 1024, **ATTACHMENT
+            ))).inserted_primary_key[0]
+            self._attached_up_to = message_id
+        self.messages += 1
+        self._long_messages = 1
+    
+    async def _add_attachments(self, conn) -> None:
+        """Attach a stored photo to one new message in ATTACHMENT_EVERY."""
+        first = self._media_ids[0]
+        rows = (
+            select(
+                Conversation.bot_id, Message.conversation_id, Message.id, Message.created_at,
+                (first + 1 + Message.id % (len(self._media_ids) - 1)).label("media_file_id"),
+                literal(16 * 1024).label("size_bytes"),
+                *(literal(value).label(name) for name, value in ATTACHMENT.items())
+            )
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .where(Message.id > self._attached_up_to, Message.id % ATTACHMENT_EVERY == 0)
+        )
+        columns = ["bot_id", "conversation_id", "message_id", "created_at", "media_file_id", "size_bytes", *ATTACHMENT]
+        await conn.execute(insert(MessageAttachment).from_select(columns, rows))
+        self._attached_up_to = (await conn.execute(select(func.max(Message.id)))).scalar_one()
+    
+    async def grow(self, target: int) -> None:
+        """Add conversations and messages until the database holds `target` messages."""
+        if self.user_id is None:
+            await self._setup()
+        
+        long_target = int(target * LONG_CONVERSATION_SHARE)
+        async with engine.begin() as conn:
+            if long_target > self._long_messages:
+                rows = self._message_rows(self.ids["conversation_id"], self._long_messages, long_target - self._long_messages)
+                for offset in range(0, len(rows), SEED_BATCH):
+                    await conn.execute(insert(Message), rows[offset:offset + SEED_BATCH])
+                self.messages += len(rows)
+                self._long_messages = long_target
+            
+            conversations = max(target - self.messages, 0) // (MESSAGES_PER_CONVERSATION * BOTS)
+            for bot_id in self.bot_ids:
+                first = await self._add_conversations(conn, bot_id, conversations)
+                rows = []
+                for conversation_id in range(first, first + conversations):
+                    rows.extend(self._message_rows(conversation_id, 0, MESSAGES_PER_CONVERSATION))
+                    if len(rows) >= SEED_BATCH:
+                        await conn.execute(insert(Message), rows)
+                        rows = []
+                if rows:
+                    await conn.execute(insert(Message), rows)
+                self.messages += conversations * MESSAGES_PER_CONVERSATION
+            await self._add_attachments(conn)
+            
+            # A page in the middle of the long conversation
+            self.ids["before_id"] = (await conn.execute(
+                select(Message.id)
+                .where(Message.conversation_id == self.ids["conversation_id"])
+                .order_by(Message.id)
+                .offset(self._long_messages // 2)
+                .limit(1)
+            )).scalar_one()
+        
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("ANALYZE")
+
+
+class StatementRecorder:
+    """Counts the statements run, and keeps them while `capturing`."""
+    
+    def __init__(self):
+        self.count = 0
+        self.capturing = False
+        self.statements: List[Tuple[str, Any]] = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self._record)
+    
+    def _record(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.count += 1
+        if self.capturing and not executemany:
+            self.statements.append((statement, parameters))
+
+
+def full_scans(plan: List[tuple]) -> List[str]:
+    """Tables EXPLAIN QUERY PLAN reads row by row without an index."""
+    tables = []
+    for row in plan:
+        detail = row[-1]
+        if not detail.startswith("SCAN ") or " USING " in detail or "VIRTUAL TABLE" in detail:
+            continue
+        name = detail[len("SCAN "):].removeprefix("TABLE ").split()[0]
+        if not name.startswith("(") and name != "CONSTANT":
+            tables.append(name)
+    return tables
+
+
+async def explain(statements: List[Tuple[str, Any]]) -> List[str]:
+    scans = set()
+    async with engine.connect() as conn:
+        for statement, parameters in dict.fromkeys((s, tuple(p or ())) for s, p in statements):
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            scans.update(full_scans(result.all()))
+    return sorted(scans)
+
+
+async def measure(client: httpx.AsyncClient, recorder: StatementRecorder, url: str, repeat: int, budget: float) -> Dict[str, Any]:
+    response = await client.get(url)
+    assert response.status_code == 200, (url, response.status_code, response.text[:200])
+    
+    recorder.count = 0
+    recorder.statements = []
+    recorder.capturing = True
+    await client.get(url)
+    recorder.capturing = False
+    queries = recorder.count
+    scans = await explain(recorder.statements)
+    
+    # Up to `repeat` samples, fewer for endpoints slower than `budget` seconds in total
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (len(samples) < 3 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        await client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"queries": queries, "scans": scans, "ms": round(statistics.median(samples), 3), "samples": len(samples)}
+
+
+async def run_queries(sizes: List[str], repeat: int, budget: float) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    dataset = Dataset()
+    recorder = StatementRecorder()
+    results = {}
+    try:
+        for size in sorted(sizes, key=SIZES.get):
+            started = time.perf_counter()
+            await dataset.grow(SIZES[size])
+            print(f"Seeded {dataset.messages} messages in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': str(dataset.user_id)})}"}
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+                results[size] = {
+                    name: await measure(client, recorder, url.format(**dataset.ids), repeat, budget)
+                    for name, url in ENDPOINTS
+                }
+    finally:
+        await engine.dispose()
+    return results
+
+
+# Baseline
+
+def enough_samples(current: Dict[str, Any], base: Dict[str, Any]) -> bool:
+    return min(current.get("samples", 0), base.get("samples", 0)) >= MIN_TIME_SAMPLES
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, times: bool = False) -> List[str]:
+    """
+    Regressions of `results`, one line each.
+    
+    More statements than the baseline and any full scan missing from
+    KNOWN_SCANS always count. Times only with `times`, and only where
+    both sides have MIN_TIME_SAMPLES samples: fewer are too noisy.
+    """
+    regressions = []
+    for name, current in results.get("components", {}).items():
+        base = baseline.get("components", {}).get(name)
+        if times and base and enough_samples(current, base) and current["us"] > base["us"] * tolerance:
+            regressions.append(f"{name}: {base['us']} -> {current['us']} us")
+    
+    for size, endpoints in results.get("queries", {}).items():
+        for name, current in endpoints.items():
+            label = f"{size} {name}"
+            unknown_scans = [table for table in current["scans"] if table not in KNOWN_SCANS.get(name, {})]
+            if unknown_scans:
+                regressions.append(f"{label}: full scan of {', '.join(unknown_scans)} (fix it or add it to KNOWN_SCANS)")
+            
+            base = baseline.get("queries", {}).get(size, {}).get(name)
+            if not base:
+                continue
+            if current["queries"] > base["queries"]:
+                regressions.append(f"{label}: {base['queries']} -> {current['queries']} statements")
+            if (
+                times and enough_samples(current, base)
+                and current["ms"] > base["ms"] * tolerance and current["ms"] - base["ms"] > MIN_DELTA_MS
+            ):
+                regressions.append(f"{label}: {base['ms']} -> {current['ms']} ms")
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Replace what was measured; sizes and sections not run this time are kept."""
+    merged = {
+        "machine": f"{platform.machine()} {platform.system()}, Python {platform.python_version()}",
+        "updated_at": datetime.utcnow().replace(microsecond=0).isoformat(),
+        "components": results.get("components") or baseline.get("components", {}),
+        "queries": {**baseline.get("queries", {}), **results.get("queries", {})},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def change(current: float, base: Optional[float]) -> str:
+    return f"{(current / base - 1) * 100:+.0f}%" if base else ""
+
+
+def report(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    if "components" in results:
+        print(f"{'component':<28} {'us/call':>10} {'baseline':>10} {'change':>7}")
+        for name, current in results["components"].items():
+            base = baseline.get("components", {}).get(name, {}).get("us")
+            print(f"{name:<28} {current['us']:>10.2f} {base or '':>10} {change(current['us'], base):>7}")
+        print()
+    
+    for size, endpoints in results.get("queries", {}).items():
+        print(f"{size + ' messages':<70} {'queries':>7} {'ms':>9} {'baseline':>9} {'change':>7}  full scans")
+        for name, current in endpoints.items():
+            base = baseline.get("queries", {}).get(size, {}).get(name, {})
+            print(
+                f"{name:<70} {current['queries']:>7} {current['ms']:>9.2f} {base.get('ms', ''):>9} "
+                f"{change(current['ms'], base.get('ms')):>7}  {', '.join(current['scans'])}"
+            )
+        print()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="10k,100k", help=f"Comma-separated, of {', '.join(SIZES)}")
+    parser.add_argument("--only", choices=["components", "queries"])
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per component and endpoint")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds of samples per endpoint at most")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed time ratio to the baseline")
+    parser.add_argument(
+        "--times", action="store_true",
+        help=f"Compare times too, where both sides have {MIN_TIME_SAMPLES}+ samples"
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="Exit 1 on regressions")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    
+    sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown size: {', '.join(unknown)}")
+    
+    results = {}
+    if args.only != "queries":
+        results["components"] = run_components(args.repeat)
+    if args.only != "components":
+        results["queries"] = asyncio.run(run_queries(sizes, args.repeat, args.budget))
+    
+    baseline = load_baseline(args.baseline)
+    report(results, baseline)
+    
+    regressions = compare(results, baseline, args.tolerance, args.times)
+    missing = uncovered_routes() if args.only != "components" else []
+    for path in missing:
+        regressions.append(f"{path}: GET route not in the suite (add it to ENDPOINTS)")
+    
+    if args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        if args.check:
+            sys.exit(1)
+    elif baseline:
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
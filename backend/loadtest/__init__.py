@@ -0,0 +1 @@
+# Businessly load testing: local Telegram/GigaChat stubs and a webhook driver
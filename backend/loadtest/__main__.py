@@ -0,0 +1,40 @@
+"""
+End-to-end webhook load test.
+
+Usage (from the backend directory):
+    python -m loadtest --spawn-app --bots 10 --rps 50 --duration 60
+
+Without --spawn-app the backend at --app-url must already be running with
+TELEGRAM_API_URL, GIGACHAT_OAUTH_URL, GIGACHAT_API_URL and WEBHOOK_BASE_URL
+pointing at the stubs (the driver prints the values to use).
+"""
+import argparse
+import asyncio
+import json
+from dataclasses import fields
+
+from loadtest.driver import LoadTestConfig, LoadTestDriver, add_config_arguments
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Businessly webhook load test")
+    add_config_arguments(parser, LoadTestConfig)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+    
+    config = LoadTestConfig(**{f.name: getattr(args, f.name) for f in fields(LoadTestConfig)})
+    if config.spawn_app:
+        config.app_url = f"http://127.0.0.1:{config.app_port}"
+    
+    driver = LoadTestDriver(config)
+    if not config.spawn_app:
+        print("Backend must run with:")
+        for key, value in driver.stub_env.items():
+            print(f"  {key}={value}")
+    
+    report = asyncio.run(driver.run())
+    print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+
+
+if __name__ == "__main__":
+    main()
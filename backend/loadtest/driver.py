@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field, fields, asdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from loadtest.stubs import TelegramStub, GigaChatStub, UpstreamBehavior, create_server
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class LoadTestConfig:
+    app_url: str = "http://127.0.0.1:8000"
+    spawn_app: bool = False
+    app_port: int = 8000
+    ingest_workers: int = 0  # With --spawn-app, > 0 runs the app under app.supervisor
+    api_workers: int = 2
+    stub_host: str = "127.0.0.1"
+    telegram_port: int = 8081
+    gigachat_port: int = 8082
+    bots: int = 5
+    chats_per_bot: int = 50
+    rps: float = 20.0
+    duration: float = 30.0
+    drain_timeout: float = 30.0
+    llm_latency_ms: float = 800.0
+    llm_jitter_ms: float = 300.0
+    llm_error_rate: float = 0.0
+    telegram_latency_ms: float = 30.0
+    telegram_error_rate: float = 0.0
+    seed: int = 0
+
+
+def add_config_arguments(parser: argparse.ArgumentParser, config_class, skip=()) -> None:
+    """One option per field of a config dataclass."""
+    for config_field in fields(config_class):
+        if config_field.name in skip:
+            continue
+        flag = "--" + config_field.name.replace("_", "-")
+        if config_field.type is bool:
+            parser.add_argument(flag, action="store_true")
+        else:
+            parser.add_argument(flag, type=type(config_field.default), default=config_field.default)
+
+
+@dataclass
+class LoadTestReport:
+    updates_sent: int = 0
+    webhook_errors: int = 0
+    replies_received: int = 0
+    dropped_replies: int = 0
+    duration_s: float = 0.0
+    achieved_rps: float = 0.0
+    reply_throughput: float = 0.0
+    webhook_ack_ms: Dict[str, float] = field(default_factory=dict)
+    reply_latency_ms: Dict[str, float] = field(default_factory=dict)
+    llm_calls: int = 0
+    llm_errors: int = 0
+    oauth_calls: int = 0
+    db_lock_errors: Optional[int] = None
+    
+    def as_dict(self) -> dict:
+        return asdict(self)
+    
+    def format(self) -> str:
+        def fmt(stats: Dict[str, float]) -> str:
+            return "  ".join(f"{k}={v:.1f}" for k, v in stats.items()) or "n/a"
+        
+        lines = [
+            f"Updates sent:        {self.updates_sent} ({self.achieved_rps:.1f}/s over {self.duration_s:.1f}s)",
+            f"Webhook errors:      {self.webhook_errors}",
+            f"Webhook ack (ms):    {fmt(self.webhook_ack_ms)}",
+            f"Replies received:    {self.replies_received} ({self.reply_throughput:.1f}/s)",
+            f"Dropped replies:     {self.dropped_replies}",
+            f"Reply latency (ms):  {fmt(self.reply_latency_ms)}",
+            f"LLM calls / errors:  {self.llm_calls} / {self.llm_errors}",
+            f"OAuth calls:         {self.oauth_calls}",
+            f"DB lock errors:      {self.db_lock_errors if self.db_lock_errors is not None else 'n/a (app not spawned)'}",
+        ]
+        return "\n".join(lines)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles of a list of samples."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    
+    def pick(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+    
+    return {
+        "p50": pick(50),
+        "p90": pick(90),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": ordered[-1],
+    }
+
+
+class LoadTestDriver:
+    """Posts synthetic Telegram updates at a target rate and measures replies."""
+    
+    def __init__(self, config: LoadTestConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.telegram = TelegramStub(UpstreamBehavior(
+            latency_ms=config.telegram_latency_ms,
+            error_rate=config.telegram_error_rate
+        ))
+        self.gigachat = GigaChatStub(UpstreamBehavior(
+            latency_ms=config.llm_latency_ms,
+            jitter_ms=config.llm_jitter_ms,
+            error_rate=config.llm_error_rate
+        ))
+        self.bot_tokens: List[str] = []
+        self.sent_at: Dict[int, float] = {}
+        self.ack_ms: List[float] = []
+        self.webhook_errors = 0
+        self._app_process: Optional[subprocess.Popen] = None
+        self._app_log = None
+    
+    @property
+    def stub_env(self) -> Dict[str, str]:
+        host = self.config.stub_host
+        return {
+            "TELEGRAM_API_URL": f"http://{host}:{self.config.telegram_port}",
+            "GIGACHAT_OAUTH_URL": f"http://{host}:{self.config.gigachat_port}/oauth",
+            "GIGACHAT_API_URL": f"http://{host}:{self.config.gigachat_port}/api/v1",
+            "WEBHOOK_BASE_URL": self.config.app_url,
+        }
+    
+    def app_env(self, workdir: str) -> Dict[str, str]:
+        """Extra environment of the spawned backend."""
+        return {}
+    
+    async def _start_app(self) -> None:
+        workdir = tempfile.mkdtemp(prefix="businessly-loadtest-")
+        env = {
+            **os.environ,
+            **self.stub_env,
+            **self.app_env(workdir),
+            "DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/loadtest.db",
+        }
+        self._app_log = open(os.path.join(workdir, "app.log"), "w+")
+        if self.config.ingest_workers > 0:
+            env["COORDINATION_DB_PATH"] = os.path.join(workdir, "coordination.db")
+            command = [
+                sys.executable, "-m", "app.supervisor",
+                "--host", "127.0.0.1",
+                "--port", str(self.config.app_port),
+                "--api-workers", str(self.config.api_workers),
+                "--ingest-workers", str(self.config.ingest_workers),
+            ]
+        else:
+            command = [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--port", str(self.config.app_port), "--log-level", "warning"
+            ]
+        self._app_process = subprocess.Popen(
+            command,
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=self._app_log,
+            stderr=subprocess.STDOUT
+        )
+        
+        async with httpx.AsyncClient() as client:
+            for _ in range(300):
+                try:
+                    response = await client.get(f"{self.config.app_url}/health")
+                    if response.status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Backend did not become healthy")
+    
+    def _stop_app(self) -> Optional[int]:
+        """Stop the spawned backend and return the number of DB lock errors it logged."""
+        if self._app_process is None:
+            return None
+        self._app_process.terminate()
+        try:
+            self._app_process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self._app_process.kill()
+        
+        self._app_log.seek(0)
+        log = self._app_log.read()
+        self._app_log.close()
+        return log.count("database is locked")
+    
+    async def _seed(self, client: httpx.AsyncClient) -> None:
+        """Register an owner and create and activate the bots through the public API."""
+        email = f"loadtest-{uuid.uuid4().hex[:8]}@example.com"
+        password = uuid.uuid4().hex
+        
+        response = await client.post("/api/auth/register", json={"email": email, "password": password})
+        response.raise_for_status()
+        response = await client.post("/api/auth/login", data={"username": email, "password": password})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        
+        for index in range(self.config.bots):
+            token = f"{7000000 + index}:{uuid.uuid4().hex}{'A' * 8}"
+            response = await client.post("/api/bots/", json={
+                "token": token,
+                "name": f"Load bot {index}",
+                "business_description": "Пиццерия с доставкой по городу, работаем с 9 до 21."
+            })
+            response.raise_for_status()
+            bot_id = response.json()["id"]
+            
+            response = await client.put(f"/api/bots/{bot_id}/toggle")
+            response.raise_for_status()
+            self.bot_tokens.append(token)
+        
+        client.headers.pop("Authorization")
+    
+    def _build_update(self, seq: int) -> tuple:
+        token = self.random.choice(self.bot_tokens)
+        chat_id = 100000 + self.random.randrange(self.config.chats_per_bot)
+        update = {
+            "update_id": seq,
+            "message": {
+                "message_id": seq,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+                "text": f"Сколько стоит доставка? [lt:{seq}]"
+            }
+        }
+        return token, update
+    
+    async def _post_update(self, client: httpx.AsyncClient, seq: int) -> None:
+        token, update = self._build_update(seq)
+        started = time.perf_counter()
+        self.sent_at[seq] = started
+        try:
+            response = await client.post(f"/api/telegram/webhook/{token}", json=update)
+            if response.status_code != 200:
+                self.webhook_errors += 1
+        except httpx.HTTPError:
+            self.webhook_errors += 1
+        self.ack_ms.append((time.perf_counter() - started) * 1000)
+    
+    def _reply_times(self) -> Dict[int, float]:
+        replies: Dict[int, float] = {}
+        for sent in self.telegram.sent_messages:
+            match = GigaChatStub.TAG_PATTERN.search(sent["text"])
+            if match:
+                seq = int(match.group(0)[4:-1])
+                replies.setdefault(seq, sent["received_at"])
+        return replies
+    
+    async def run(self) -> LoadTestReport:
+        servers = [
+            create_server(self.telegram.app, self.config.stub_host, self.config.telegram_port),
+            create_server(self.gigachat.app, self.config.stub_host, self.config.gigachat_port),
+        ]
+        server_tasks = [asyncio.create_task(server.serve()) for server in servers]
+        while not all(server.started for server in servers):
+            await asyncio.sleep(0.05)
+        
+        db_lock_errors = None
+        try:
+            if self.config.spawn_app:
+                await self._start_app()
+            
+            limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+            async with httpx.AsyncClient(base_url=self.config.app_url, limits=limits, timeout=30.0) as client:
+                await self._seed(client)
+                
+                total = int(self.config.rps * self.config.duration)
+                interval = 1.0 / self.config.rps
+                started = time.perf_counter()
+                tasks = []
+                
+                for seq in range(total):
+                    # Open-loop schedule: a slow backend must not lower the offered load
+                    delay = started + seq * interval - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(self._post_update(client, seq)))
+                
+                await asyncio.gather(*tasks)
+                send_duration = time.perf_counter() - started
+                
+                deadline = time.perf_counter() + self.config.drain_timeout
+                while time.perf_counter() < deadline and len(self._reply_times()) < total:
+                    await asyncio.sleep(0.2)
+                finished = time.perf_counter()
+        finally:
+            db_lock_errors = self._stop_app()
+            for server in servers:
+                server.should_exit = True
+            await asyncio.gather(*server_tasks, return_exceptions=True)
+        
+        replies = self._reply_times()
+        latencies = [(replies[seq] - self.sent_at[seq]) * 1000 for seq in replies if seq in self.sent_at]
+        
+        return LoadTestReport(
+            updates_sent=total,
+            webhook_errors=self.webhook_errors,
+            replies_received=len(latencies),
+            dropped_replies=total - len(latencies),
+            duration_s=send_duration,
+            achieved_rps=total / send_duration if send_duration else 0.0,
+            reply_throughput=len(latencies) / (finished - started) if finished > started else 0.0,
+            webhook_ack_ms=percentiles(self.ack_ms),
+            reply_latency_ms=percentiles(latencies),
+            llm_calls=self.gigachat.completion_calls,
+            llm_errors=self.gigachat.completion_errors,
+            oauth_calls=self.gigachat.oauth_calls,
+            db_lock_errors=db_lock_errors
+        )
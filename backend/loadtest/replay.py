@@ -0,0 +1,296 @@
+"""
+Replay of captured webhook traffic (CAPTURE_ENABLED, see app.services.capture).
+
+Creates one bot per bot in the capture and posts its updates to the
+backend with their original spacing, `--speed` times faster, or with
+`--speed 0` as fast as `--max-in-flight` allows, against the Telegram and
+GigaChat stubs. Reports reply latency, LLM calls and, with --spawn-app,
+the time spent in the database according to the backend's trace export.
+
+Usage (from the backend directory):
+    python -m loadtest.replay captures/updates.jsonl.gz --spawn-app [--speed 1] [--json > a.json]
+    python -m loadtest.replay captures/updates.jsonl.gz --spawn-app --compare a.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass, field, asdict, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest.driver import LoadTestConfig, LoadTestDriver, add_config_arguments, percentiles
+from loadtest.stubs import GigaChatStub, create_server
+
+# Options of the synthetic load test that a replay takes from the capture
+CAPTURE_DEFINED = ("bots", "chats_per_bot", "rps", "duration", "seed")
+
+
+@dataclass
+class ReplayConfig(LoadTestConfig):
+    capture: str = ""
+    speed: float = 1.0  # 1 keeps the recorded spacing, 10 is ten times faster, 0 as fast as possible
+    max_in_flight: int = 100  # Concurrent webhook requests with --speed 0
+    idle_timeout: float = 5.0  # Stop waiting for replies after this long without upstream calls
+    trace_file: str = ""  # Without --spawn-app: the backend's TRACING_EXPORT_PATH, for DB time
+
+
+@dataclass
+class ReplayReport:
+    updates_replayed: int = 0
+    bots: int = 0
+    capture_span_s: float = 0.0
+    duration_s: float = 0.0
+    webhook_errors: int = 0
+    webhook_ack_ms: Dict[str, float] = field(default_factory=dict)
+    messages: int = 0  # Updates with text or a caption, which can be answered
+    replies_received: int = 0
+    unanswered: int = 0
+    reply_latency_ms: Dict[str, float] = field(default_factory=dict)
+    llm_calls: int = 0
+    llm_errors: int = 0
+    db_statements: Optional[int] = None
+    db_time_ms: Optional[float] = None
+    db_lock_errors: Optional[int] = None
+    
+    def as_dict(self) -> dict:
+        return asdict(self)
+    
+    def format(self) -> str:
+        def fmt(stats: Dict[str, float]) -> str:
+            return "  ".join(f"{k}={v:.1f}" for k, v in stats.items()) or "n/a"
+        
+        db_time = "n/a (no trace export)"
+        if self.db_time_ms is not None:
+            db_time = f"{self.db_time_ms:.1f} in {self.db_statements} statements"
+        lines = [
+            f"Updates replayed:    {self.updates_replayed} for {self.bots} bots "
+            f"({self.capture_span_s:.1f}s recorded, replayed in {self.duration_s:.1f}s)",
+            f"Webhook errors:      {self.webhook_errors}",
+            f"Webhook ack (ms):    {fmt(self.webhook_ack_ms)}",
+            f"Replies received:    {self.replies_received} of {self.messages} messages ({self.unanswered} unanswered)",
+            f"Reply latency (ms):  {fmt(self.reply_latency_ms)}",
+            f"LLM calls / errors:  {self.llm_calls} / {self.llm_errors}",
+            f"DB time (ms):        {db_time}",
+            f"DB lock errors:      {self.db_lock_errors if self.db_lock_errors is not None else 'n/a (app not spawned)'}",
+        ]
+        return "\n".join(lines)
+    
+    def compare(self, other: Dict[str, Any]) -> str:
+        """This run next to an earlier report (as_dict) of the same capture."""
+        rows = [
+            ("Reply p50 (ms)", self.reply_latency_ms.get("p50"), other["reply_latency_ms"].get("p50")),
+            ("Reply p95 (ms)", self.reply_latency_ms.get("p95"), other["reply_latency_ms"].get("p95")),
+            ("Reply p99 (ms)", self.reply_latency_ms.get("p99"), other["reply_latency_ms"].get("p99")),
+            ("Webhook ack p95 (ms)", self.webhook_ack_ms.get("p95"), other["webhook_ack_ms"].get("p95")),
+            ("Replies", self.replies_received, other["replies_received"]),
+            ("LLM calls", self.llm_calls, other["llm_calls"]),
+            ("DB statements", self.db_statements, other["db_statements"]),
+            ("DB time (ms)", self.db_time_ms, other["db_time_ms"]),
+            ("DB lock errors", self.db_lock_errors, other["db_lock_errors"]),
+        ]
+        lines = [f"{'':<22} {'this run':>12} {'compared':>12} {'change':>8}"]
+        for name, current, previous in rows:
+            change = ""
+            if current is not None and previous:
+                change = f"{(current / previous - 1) * 100:+.0f}%"
+            lines.append(f"{name:<22} {_cell(current):>12} {_cell(previous):>12} {change:>8}")
+        return "\n".join(lines)
+
+
+def _cell(value: Optional[float]) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+
+def read_capture(path: str) -> List[Dict[str, Any]]:
+    """Records of a capture file in arrival order; several processes may have appended to it."""
+    with gzip.open(path, "rb") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def tag_update(update: Dict[str, Any], seq: int) -> bool:
+    """Append the load-test tag the GigaChat stub echoes; False for updates without text."""
+    message = update.get("message")
+    if not isinstance(message, dict):
+        return False
+    for key in ("text", "caption"):
+        if isinstance(message.get(key), str):
+            # A capture of a load test carries the tags of that run
+            text = GigaChatStub.TAG_PATTERN.sub("", message[key]).rstrip()
+            message[key] = f"{text} [lt:{seq}]"
+            return True
+    return False
+
+
+def db_time(trace_path: str) -> Tuple[Optional[int], Optional[float]]:
+    """(statements, total ms) of the `db` spans in a trace export and its rotated file."""
+    statements, total_ms, found = 0, 0.0, False
+    for path in (trace_path + ".1", trace_path):
+        if not os.path.exists(path):
+            continue
+        found = True
+        with open(path, "rb") as f:
+            for line in f:
+                span = json.loads(line)
+                if span.get("name") == "db" and span.get("duration_ms") is not None:
+                    statements += 1
+                    total_ms += span["duration_ms"]
+    return (statements, round(total_ms, 1)) if found else (None, None)
+
+
+class ReplayDriver(LoadTestDriver):
+    """Posts the updates of a capture instead of synthetic ones."""
+    
+    def __init__(self, config: ReplayConfig):
+        super().__init__(config)
+        self.records = read_capture(config.capture)
+        self.bot_keys = list(dict.fromkeys(record["bot"] for record in self.records))
+        self.config.bots = len(self.bot_keys)
+        self.messages = 0
+        self._trace_path = config.trace_file
+    
+    def app_env(self, workdir: str) -> Dict[str, str]:
+        self._trace_path = os.path.join(workdir, "traces.jsonl")
+        return {"TRACING_ENABLED": "true", "TRACING_EXPORT_PATH": self._trace_path, "CAPTURE_ENABLED": "false"}
+    
+    async def _post(self, client: httpx.AsyncClient, seq: int, token: str, update: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        self.sent_at[seq] = started
+        try:
+            response = await client.post(f"/api/telegram/webhook/{token}", json=update)
+            if response.status_code != 200:
+                self.webhook_errors += 1
+        except httpx.HTTPError:
+            self.webhook_errors += 1
+        self.ack_ms.append((time.perf_counter() - started) * 1000)
+    
+    async def _replay(self, client: httpx.AsyncClient) -> None:
+        tokens = dict(zip(self.bot_keys, self.bot_tokens))
+        first = self.records[0]["t"]
+        speed = self.config.speed
+        semaphore = asyncio.Semaphore(self.config.max_in_flight)
+        started = time.perf_counter()
+        tasks = []
+        
+        async def bounded(*args):
+            async with semaphore:
+                await self._post(*args)
+        
+        for seq, record in enumerate(self.records):
+            update = record["update"]
+            if tag_update(update, seq):
+                self.messages += 1
+            args = (client, seq, tokens[record["bot"]], update)
+            if speed > 0:
+                # Open-loop schedule, as recorded: a slow backend must not thin out the bursts
+                delay = started + (record["t"] - first) / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self._post(*args)))
+            else:
+                tasks.append(asyncio.create_task(bounded(*args)))
+        await asyncio.gather(*tasks)
+    
+    async def _wait_for_replies(self) -> None:
+        deadline = time.perf_counter() + self.config.drain_timeout
+        last_activity, last_change = None, time.perf_counter()
+        while time.perf_counter() < deadline and len(self._reply_times()) < self.messages:
+            activity = (len(self.telegram.sent_messages), self.gigachat.completion_calls)
+            if activity != last_activity:
+                last_activity, last_change = activity, time.perf_counter()
+            elif time.perf_counter() - last_change > self.config.idle_timeout:
+                # Escalated or canned-answered messages get no tagged reply
+                return
+            await asyncio.sleep(0.2)
+    
+    async def run(self) -> ReplayReport:
+        servers = [
+            create_server(self.telegram.app, self.config.stub_host, self.config.telegram_port),
+            create_server(self.gigachat.app, self.config.stub_host, self.config.gigachat_port),
+        ]
+        server_tasks = [asyncio.create_task(server.serve()) for server in servers]
+        while not all(server.started for server in servers):
+            await asyncio.sleep(0.05)
+        
+        try:
+            if self.config.spawn_app:
+                await self._start_app()
+            
+            limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+            async with httpx.AsyncClient(base_url=self.config.app_url, limits=limits, timeout=30.0) as client:
+                await self._seed(client)
+                started = time.perf_counter()
+                await self._replay(client)
+                duration = time.perf_counter() - started
+                await self._wait_for_replies()
+        finally:
+            # Stopping the backend also exports its last traces
+            db_lock_errors = self._stop_app()
+            for server in servers:
+                server.should_exit = True
+            await asyncio.gather(*server_tasks, return_exceptions=True)
+        
+        replies = self._reply_times()
+        latencies = [(replies[seq] - self.sent_at[seq]) * 1000 for seq in replies if seq in self.sent_at]
+        statements, db_ms = db_time(self._trace_path) if self._trace_path else (None, None)
+        
+        return ReplayReport(
+            updates_replayed=len(self.records),
+            bots=len(self.bot_keys),
+            capture_span_s=self.records[-1]["t"] - self.records[0]["t"],
+            duration_s=duration,
+            webhook_errors=self.webhook_errors,
+            webhook_ack_ms=percentiles(self.ack_ms),
+            messages=self.messages,
+            replies_received=len(latencies),
+            unanswered=self.messages - len(latencies),
+            reply_latency_ms=percentiles(latencies),
+            llm_calls=self.gigachat.completion_calls,
+            llm_errors=self.gigachat.completion_errors,
+            db_statements=statements,
+            db_time_ms=db_ms,
+            db_lock_errors=db_lock_errors
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m loadtest.replay", description="Replay captured webhook traffic")
+    parser.add_argument("capture", help="Capture file written by the backend (CAPTURE_PATH)")
+    add_config_arguments(parser, ReplayConfig, skip=("capture",) + CAPTURE_DEFINED)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--compare", metavar="REPORT", help="JSON report of an earlier replay to compare with")
+    args = parser.parse_args(argv)
+    
+    values = {f.name: getattr(args, f.name) for f in fields(ReplayConfig) if f.name not in CAPTURE_DEFINED}
+    config = ReplayConfig(**values)
+    if config.spawn_app:
+        config.app_url = f"http://127.0.0.1:{config.app_port}"
+    
+    driver = ReplayDriver(config)
+    if not driver.records:
+        parser.error("The capture is empty")
+    if not config.spawn_app:
+        print("Backend must run with:")
+        for key, value in driver.stub_env.items():
+            print(f"  {key}={value}")
+    
+    report = asyncio.run(driver.run())
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+        return
+    print(report.format())
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print(report.compare(json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
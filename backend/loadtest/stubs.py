@@ -0,0 +1,177 @@
+import asyncio
+import random
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class UpstreamBehavior:
+    """Latency and failure profile of a stubbed upstream."""
+    
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+    
+    async def apply(self) -> bool:
+        """Sleep for the configured latency. Returns False if this call should fail."""
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        return random.random() >= self.error_rate
+
+
+class TelegramStub:
+    """
+    Mimics the parts of the Telegram Bot API the backend uses.
+    
+    Every sendMessage call is recorded with its arrival time so the
+    driver can match replies to the updates that caused them.
+    """
+    
+    def __init__(self, behavior: Optional[UpstreamBehavior] = None):
+        self.behavior = behavior or UpstreamBehavior()
+        self.sent_messages: List[Dict] = []
+        self.chat_actions = 0
+        self.webhooks: Dict[str, str] = {}
+        self._message_id = 0
+        self.app = self._build_app()
+    
+    @staticmethod
+    def bot_id_from_token(token: str) -> int:
+        return int(token.split(":", 1)[0])
+    
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Telegram Bot API stub")
+        
+        @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+        async def bot_method(token: str, method: str, request: Request):
+            body = {}
+            if request.method == "POST" and await request.body():
+                body = await request.json()
+            
+            if not await self.behavior.apply():
+                return JSONResponse(
+                    {"ok": False, "error_code": 500, "description": "Stub failure"},
+                    status_code=500
+                )
+            
+            if method == "getMe":
+                bot_id = self.bot_id_from_token(token)
+                return {"ok": True, "result": {
+                    "id": bot_id,
+                    "is_bot": True,
+                    "first_name": f"Load bot {bot_id}",
+                    "username": f"load_{bot_id}_bot"
+                }}
+            
+            if method == "setWebhook":
+                self.webhooks[token] = body.get("url", "")
+                return {"ok": True, "result": True}
+            
+            if method == "deleteWebhook":
+                self.webhooks.pop(token, None)
+                return {"ok": True, "result": True}
+            
+            if method == "getWebhookInfo":
+                return {"ok": True, "result": {
+                    "url": self.webhooks.get(token, ""),
+                    "pending_update_count": 0
+                }}
+            
+            if method == "sendChatAction":
+                self.chat_actions += 1
+                return {"ok": True, "result": True}
+            
+            if method == "sendMessage":
+                self._message_id += 1
+                self.sent_messages.append({
+                    "token": token,
+                    "chat_id": body.get("chat_id"),
+                    "text": body.get("text", ""),
+                    "received_at": time.perf_counter()
+                })
+                return {"ok": True, "result": {
+                    "message_id": self._message_id,
+                    "chat": {"id": body.get("chat_id")},
+                    "text": body.get("text", "")
+                }}
+            
+            return JSONResponse(
+                {"ok": False, "error_code": 404, "description": "Not Found"},
+                status_code=404
+            )
+        
+        return app
+
+
+class GigaChatStub:
+    """
+    Mimics GigaChat OAuth and chat/completions.
+    
+    The completion echoes the load-test tag found in the last user message
+    so the reply that reaches Telegram can be traced back to its update.
+    """
+    
+    TAG_PATTERN = re.compile(r"\[lt:\d+\]")
+    
+    def __init__(self, behavior: Optional[UpstreamBehavior] = None, oauth_latency_ms: float = 0.0):
+        self.behavior = behavior or UpstreamBehavior()
+        self.oauth_latency_ms = oauth_latency_ms
+        self.oauth_calls = 0
+        self.completion_calls = 0
+        self.completion_errors = 0
+        self.app = self._build_app()
+    
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="GigaChat stub")
+        
+        @app.post("/oauth")
+        async def oauth():
+            self.oauth_calls += 1
+            if self.oauth_latency_ms:
+                await asyncio.sleep(self.oauth_latency_ms / 1000)
+            return {
+                "access_token": uuid.uuid4().hex,
+                "expires_at": int((time.time() + 1800) * 1000)
+            }
+        
+        @app.get("/api/v1/models")
+        async def models():
+            return {"object": "list", "data": [{"id": "GigaChat", "object": "model"}]}
+        
+        @app.post("/api/v1/chat/completions")
+        async def chat_completions(request: Request):
+            self.completion_calls += 1
+            payload = await request.json()
+            
+            if not await self.behavior.apply():
+                self.completion_errors += 1
+                return JSONResponse({"status": 500, "message": "Stub failure"}, status_code=500)
+            
+            last_user = next(
+                (m["content"] for m in reversed(payload.get("messages", [])) if m["role"] == "user"),
+                ""
+            )
+            match = self.TAG_PATTERN.search(last_user)
+            tag = match.group(0) if match else ""
+            content = f"Спасибо за вопрос! Мы работаем ежедневно с 9 до 21. {tag}".strip()
+            
+            return {
+                "choices": [{"message": {"role": "assistant", "content": content}, "index": 0}],
+                "usage": {"prompt_tokens": 200, "completion_tokens": 20, "total_tokens": 220},
+                "model": payload.get("model", "GigaChat")
+            }
+        
+        return app
+
+
+def create_server(app: FastAPI, host: str, port: int) -> uvicorn.Server:
+    """Build a uvicorn server for running a stub inside an existing event loop."""
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False)
+    return uvicorn.Server(config)
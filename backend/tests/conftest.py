@@ -0,0 +1,64 @@
+"""
+Tests run the app in-process against a throwaway SQLite database and
+archive and media directories, configured before `app` is imported.
+Tests are plain functions: async code runs on the TestClient's event
+loop through `run`.
+"""
+import os
+import tempfile
+import uuid
+
+_workdir = tempfile.mkdtemp(prefix="businessly-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/test.db"
+os.environ["ARCHIVE_DIR"] = os.path.join(_workdir, "archive")
+os.environ["MEDIA_DIR"] = os.path.join(_workdir, "media")
+# Several segments per conversation, so paging crosses segment boundaries
+os.environ["ARCHIVE_BATCH_SIZE"] = "7"
+os.environ["LLM_PROVIDER"] = "mock"
+os.environ["WEBHOOK_BASE_URL"] = ""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import async_session_maker
+from app.models import User, TelegramBot
+from app.security import create_access_token
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(client):
+    """Call an async function on the app's event loop and return its result."""
+    def call(func, *args):
+        return client.portal.call(func, *args)
+    return call
+
+
+@pytest.fixture
+def owner(run):
+    """A new user with one inactive bot: (auth headers, bot id)."""
+    async def create():
+        async with async_session_maker() as db:
+            user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x", name="Owner")
+            db.add(user)
+            await db.flush()
+            bot = TelegramBot(
+                user_id=user.id,
+                token=f"{uuid.uuid4().int % 10**9}:{uuid.uuid4().hex}",
+                name="Pizza",
+                business_description="Пиццерия у дома",
+                is_active=False
+            )
+            db.add(bot)
+            await db.commit()
+            return user.id, bot.id
+    
+    user_id, bot_id = run(create)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    return headers, bot_id
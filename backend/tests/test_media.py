@@ -0,0 +1,47 @@
+import pytest
+
+from app.services.media import MediaService
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=0-0", (0, 0)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=999-", (999, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-1", (999, 999)),
+    # Past the end: clamped to the file
+    ("bytes=0-5000", (0, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes= 10-20", (10, 20)),
+])
+def test_parse_range(header, expected):
+    assert MediaService.parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-99",
+    "bytes=0-99,200-299",  # Several ranges: the whole file
+    "bytes=abc-",
+    "bytes=0-x",
+    "bytes=-",
+])
+def test_parse_range_whole_file(header):
+    assert MediaService.parse_range(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", SIZE),
+    ("bytes=5000-6000", SIZE),
+    ("bytes=500-100", SIZE),
+    ("bytes=-0", SIZE),
+    ("bytes=0-", 0),
+    ("bytes=-10", 0),
+])
+def test_parse_range_not_satisfiable(header, size):
+    with pytest.raises(ValueError):
+        MediaService.parse_range(header, size)
@@ -0,0 +1,214 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import database
+from app.database import async_session_maker, init_db
+from app.models import ArchiveSegment, Conversation, Message, RetentionPolicy
+from app.services import retention as retention_module
+from app.services.retention import retention_service
+from app.serialization import loads
+
+OLD_MESSAGES = 25
+NEW_MESSAGES = 5
+
+
+@pytest.fixture
+def archived(run, owner):
+    """
+    A conversation of OLD_MESSAGES messages from 100 days ago, archived
+    by a 30-day policy, then NEW_MESSAGES live ones: (headers, bot id,
+    conversation id, every message oldest first as (id, content)).
+    """
+    headers, bot_id = owner
+    old = datetime.utcnow() - timedelta(days=100)
+    
+    async def seed():
+        async with async_session_maker() as db:
+            conversation = Conversation(bot_id=bot_id, telegram_chat_id=bot_id * 1000, telegram_username="ivan")
+            db.add(conversation)
+            await db.flush()
+            for i in range(OLD_MESSAGES):
+                db.add(Message(
+                    conversation_id=conversation.id, role="user" if i % 2 == 0 else "assistant",
+                    content=f"old {i}", created_at=old + timedelta(minutes=i)
+                ))
+            await db.flush()
+            policy = RetentionPolicy(bot_id=bot_id, archive_after_days=30, enabled=True)
+            db.add(policy)
+            await db.commit()
+            return conversation.id, policy.id
+    
+    async def add_new(conversation_id):
+        async with async_session_maker() as db:
+            for i in range(NEW_MESSAGES):
+                db.add(Message(conversation_id=conversation_id, role="user", content=f"new {i}"))
+            await db.commit()
+            result = await db.execute(
+                select(Message.id, Message.content)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.id)
+            )
+            return [tuple(row) for row in result.all()]
+    
+    conversation_id, policy_id = run(seed)
+    assert run(retention_service.run_policy, policy_id, True) == OLD_MESSAGES
+    live = run(add_new, conversation_id)
+    assert len(live) == NEW_MESSAGES
+    
+    async def segments():
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(ArchiveSegment.first_message_id, ArchiveSegment.last_message_id)
+                .where(ArchiveSegment.conversation_id == conversation_id)
+                .order_by(ArchiveSegment.first_message_id)
+            )
+            return result.all()
+    
+    ranges = run(segments)
+    assert len(ranges) > 1  # ARCHIVE_BATCH_SIZE splits them
+    first_id = ranges[0].first_message_id
+    messages = [(first_id + i, f"old {i}") for i in range(OLD_MESSAGES)] + live
+    return headers, bot_id, conversation_id, messages
+
+
+def test_get_messages_reads_archive(run, archived):
+    _, _, conversation_id, messages = archived
+    
+    async def read(before_id, limit):
+        async with async_session_maker() as db:
+            return await retention_service.get_messages(db, conversation_id, before_id, limit)
+    
+    rows, has_more = run(read, None, 100)
+    assert [(m["id"], m["content"]) for m in rows] == messages[:OLD_MESSAGES]
+    assert not has_more
+    
+    # Across a segment boundary, newest `limit` below before_id
+    before_id = messages[20][0]
+    rows, has_more = run(read, before_id, 10)
+    assert [m["id"] for m in rows] == [m[0] for m in messages[10:20]]
+    assert has_more
+    
+    rows, has_more = run(read, messages[0][0], 10)
+    assert rows == [] and not has_more
+
+
+def test_messages_endpoint_scrolls_into_archive(client, archived):
+    headers, _, conversation_id, messages = archived
+    url = f"/api/conversations/{conversation_id}/messages"
+    
+    pages, before_id = [], None
+    while True:
+        params = {"limit": 8, **({"before_id": before_id} if before_id else {})}
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        pages.insert(0, page["messages"])
+        if not page["has_more"]:
+            break
+        before_id = page["messages"][0]["id"]
+    
+    got = [(m["id"], m["content"]) for page in pages for m in page]
+    assert got == messages
+    assert len(pages) == -(-len(messages) // 8)
+
+
+def test_export_includes_archived_messages(client, archived):
+    headers, bot_id, conversation_id, messages = archived
+    
+    response = client.get(f"/api/bots/{bot_id}/export", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    rows = [loads(line) for line in response.text.splitlines()]
+    assert [(row["message_id"], row["content"]) for row in rows] == messages
+    assert {row["conversation_id"] for row in rows} == {conversation_id}
+    assert rows[0]["telegram_username"] == "ivan"
+    
+    response = client.get(f"/api/bots/{bot_id}/export", params={"format": "csv"}, headers=headers)
+    assert len(response.text.splitlines()) == len(messages) + 1  # Header row
+
+
+def test_export_updated_since_filters_archive(client, archived):
+    headers, bot_id, _, messages = archived
+    since = datetime.utcnow() - timedelta(days=50)
+    
+    response = client.get(
+        f"/api/bots/{bot_id}/export", params={"updated_since": since.isoformat()}, headers=headers
+    )
+    rows = [loads(line) for line in response.text.splitlines()]
+    assert [row["message_id"] for row in rows] == [m[0] for m in messages[OLD_MESSAGES:]]
+
+
+def test_archived_ids_not_reused_after_rebuild(run, monkeypatch, tmp_path):
+    """
+    A messages table from before AUTOINCREMENT, whose newest rows were
+    archived, is rebuilt at startup; new messages get ids above the archive.
+    """
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL PRIMARY KEY,
+            conversation_id INTEGER NOT NULL,
+            role VARCHAR(20) NOT NULL,
+            content TEXT NOT NULL,
+            telegram_message_id INTEGER,
+            created_at DATETIME
+        );
+        INSERT INTO messages (id, conversation_id, role, content) VALUES (1, 1, 'user', 'kept 1'), (2, 1, 'user', 'kept 2');
+    """)
+    conn.close()
+    
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(database, "engine", legacy)
+    monkeypatch.setattr(retention_module, "engine", legacy)
+    
+    async def start():
+        await init_db()
+        async with legacy.begin() as conn:
+            # Ids 3..50 went to the archive before the upgrade
+            await conn.execute(insert(ArchiveSegment).values(
+                bot_id=1, conversation_id=1, path="1/1/1.ndjson.gz", message_count=48,
+                first_message_id=3, last_message_id=50, size_bytes=1
+            ))
+        await retention_service.reserve_archived_ids()
+        await retention_service.reserve_archived_ids()  # Each startup; no effect the second time
+    
+    async def add_message():
+        async with legacy.begin() as conn:
+            result = await conn.execute(
+                insert(Message).values(conversation_id=1, role="user", content="new").returning(Message.id)
+            )
+            return result.scalar_one()
+    
+    async def table():
+        async with legacy.connect() as conn:
+            sql = await conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'"))
+            rows = (await conn.execute(select(Message.id, Message.content).order_by(Message.id))).all()
+            indexes = await conn.scalar(
+                text("SELECT count(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages'")
+            )
+            return sql, [tuple(row) for row in rows], indexes
+    
+    async def delete_newest():
+        async with legacy.begin() as conn:
+            await conn.execute(Message.__table__.delete().where(Message.id == select(func.max(Message.id)).scalar_subquery()))
+    
+    try:
+        run(start)
+        sql, rows, indexes = run(table)
+        assert "AUTOINCREMENT" in sql.upper()
+        assert rows == [(1, "kept 1"), (2, "kept 2")]
+        assert indexes >= len(Message.__table__.indexes)
+        
+        assert run(add_message) == 51
+        run(delete_newest)
+        assert run(add_message) == 52
+        
+        # A second startup leaves the rebuilt table alone
+        run(init_db)
+        assert run(table)[1] == [(1, "kept 1"), (2, "kept 2"), (52, "new")]
+    finally:
+        run(legacy.dispose)